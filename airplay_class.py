@@ -25,6 +25,7 @@ import configparser
 import socket
 
 from log_class import Log
+from command_runner_class import runner
 from config_class import Configuration
 
 # Airplay (shairport-sync) pipe and files
@@ -184,9 +185,8 @@ class AirplayReceiver:
         return interrupt
 
     # Execute system command
-    def execCommand(self,cmd):
-        p = os.popen(cmd)
-        return  p.readline().rstrip('\n')
+    def execCommand(self,cmd,wait=True):
+        return runner.execCommand(cmd, wait=wait)
 
 # End of class
 
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""Define a native ALSA mixer control and a volume ramp.
+
+:meth:`.Volume.set` used to run ``sudo amixer cset numid=N X%`` at every step
+of the volume knob, and it reset the mixer preset with another ``amixer`` in
+MPD mode. :class:`AlsaMixer` keeps the control open through ``libasound``
+(ctypes, no binding to install) and writes the value directly; ``amixer`` is
+only used when the library or the control is not available.
+
+:class:`VolumeRamp` takes the volume wanted by the knob and applies it from a
+background thread, at most once per ``interval``: a fast turn of the knob
+coalesces into a few writes of the latest target.
+
+"""
+import ctypes
+import ctypes.util
+import threading
+import time
+from collections.abc import Callable
+
+from command_runner_class import runner
+from log_class import Log
+
+log = Log()
+
+SND_CTL_ELEM_IFACE_MIXER = 2
+SND_CTL_ELEM_TYPE_INTEGER = 2
+
+
+def _loadLibrary() -> ctypes.CDLL | None:
+    """Load libasound and declare the functions used; None if missing."""
+    name = ctypes.util.find_library("asound") or "libasound.so.2"
+    try:
+        lib = ctypes.CDLL(name)
+    except OSError:
+        return None
+
+    p = ctypes.c_void_p
+    pp = ctypes.POINTER(ctypes.c_void_p)
+    for function, argtypes, restype in (
+        ("snd_ctl_open", [pp, ctypes.c_char_p, ctypes.c_int], ctypes.c_int),
+        ("snd_ctl_close", [p], ctypes.c_int),
+        ("snd_ctl_elem_id_malloc", [pp], ctypes.c_int),
+        ("snd_ctl_elem_id_free", [p], None),
+        ("snd_ctl_elem_id_set_interface", [p, ctypes.c_int], None),
+        ("snd_ctl_elem_id_set_numid", [p, ctypes.c_uint], None),
+        ("snd_ctl_elem_info_malloc", [pp], ctypes.c_int),
+        ("snd_ctl_elem_info_free", [p], None),
+        ("snd_ctl_elem_info_set_id", [p, p], None),
+        ("snd_ctl_elem_info", [p, p], ctypes.c_int),
+        ("snd_ctl_elem_info_get_type", [p], ctypes.c_int),
+        ("snd_ctl_elem_info_get_count", [p], ctypes.c_uint),
+        ("snd_ctl_elem_info_get_min", [p], ctypes.c_long),
+        ("snd_ctl_elem_info_get_max", [p], ctypes.c_long),
+        ("snd_ctl_elem_value_malloc", [pp], ctypes.c_int),
+        ("snd_ctl_elem_value_free", [p], None),
+        ("snd_ctl_elem_value_set_id", [p, p], None),
+        ("snd_ctl_elem_value_set_integer", [p, ctypes.c_uint, ctypes.c_long], None),
+        ("snd_ctl_elem_value_get_integer", [p, ctypes.c_uint], ctypes.c_long),
+        ("snd_ctl_elem_read", [p, p], ctypes.c_int),
+        ("snd_ctl_elem_write", [p, p], ctypes.c_int),
+        ("snd_strerror", [ctypes.c_int], ctypes.c_char_p),
+    ):
+        getattr(lib, function).argtypes = argtypes
+        getattr(lib, function).restype = restype
+    return lib
+
+
+class AlsaMixer:
+    """Write an ALSA mixer control by numid, like ``amixer cset``."""
+
+    _lib: ctypes.CDLL | None = None
+    _lib_loaded = False
+
+    def __init__(self, numid: int, device: str = "") -> None:
+        """Open the control.
+
+        Parameters
+        ----------
+        numid : int
+            Control number, as in ``/var/lib/radiod/mixer_volume_id``.
+        device : str, optional
+            amixer device option, ``""`` for the default device or
+            ``"-D bluealsa"``.
+
+        """
+        if len(log.getName()) < 1:
+            log.init("radio")
+        self.numid = numid
+        self.device = device
+        self.native = False
+        self._percent: int | None = None  # Last value written
+        # The value buffer and _percent are shared by the ramp and main threads
+        self._lock = threading.Lock()
+        self._ctl = ctypes.c_void_p()
+        self._value = ctypes.c_void_p()
+        self._min = 0
+        self._max = 100
+        self._count = 1
+        self._open()
+
+    def _open(self) -> None:
+        """Open the control with libasound, or stay on amixer."""
+        if not AlsaMixer._lib_loaded:
+            AlsaMixer._lib = _loadLibrary()
+            AlsaMixer._lib_loaded = True
+        lib = AlsaMixer._lib
+        if self.numid < 1:
+            return  # No mixer volume control
+        if lib is None:
+            log.message("alsa_mixer: libasound not available, using amixer", log.INFO)
+            return
+
+        name = self.device.replace("-D", "").strip() or "default"
+        elem_id = ctypes.c_void_p()
+        info = ctypes.c_void_p()
+        try:
+            self._check(lib.snd_ctl_open(ctypes.byref(self._ctl), name.encode(), 0))
+            self._check(lib.snd_ctl_elem_id_malloc(ctypes.byref(elem_id)))
+            lib.snd_ctl_elem_id_set_interface(elem_id, SND_CTL_ELEM_IFACE_MIXER)
+            lib.snd_ctl_elem_id_set_numid(elem_id, self.numid)
+
+            self._check(lib.snd_ctl_elem_info_malloc(ctypes.byref(info)))
+            lib.snd_ctl_elem_info_set_id(info, elem_id)
+            self._check(lib.snd_ctl_elem_info(self._ctl, info))
+            if lib.snd_ctl_elem_info_get_type(info) != SND_CTL_ELEM_TYPE_INTEGER:
+                raise OSError(f"numid={self.numid} is not an integer control")
+            self._min = lib.snd_ctl_elem_info_get_min(info)
+            self._max = lib.snd_ctl_elem_info_get_max(info)
+            self._count = lib.snd_ctl_elem_info_get_count(info)
+
+            self._check(lib.snd_ctl_elem_value_malloc(ctypes.byref(self._value)))
+            lib.snd_ctl_elem_value_set_id(self._value, elem_id)
+            self.native = True
+            log.message(
+                f"alsa_mixer: {name} numid={self.numid} range {self._min}-{self._max}",
+                log.DEBUG,
+            )
+        except OSError as e:
+            log.message(f"alsa_mixer: {e}, using amixer", log.ERROR)
+            self._close()
+        finally:
+            if elem_id:
+                lib.snd_ctl_elem_id_free(elem_id)
+            if info:
+                lib.snd_ctl_elem_info_free(info)
+
+    @staticmethod
+    def _check(result: int) -> None:
+        """Raise OSError for a negative libasound result."""
+        if result < 0:
+            raise OSError(AlsaMixer._lib.snd_strerror(result).decode())
+
+    def close(self) -> None:
+        """Release the control."""
+        with self._lock:
+            self._close()
+
+    def _close(self) -> None:
+        """Release the control, with the lock held or while opening."""
+        lib = AlsaMixer._lib
+        if self._value:
+            lib.snd_ctl_elem_value_free(self._value)
+            self._value = ctypes.c_void_p()
+        if self._ctl:
+            lib.snd_ctl_close(self._ctl)
+            self._ctl = ctypes.c_void_p()
+        self.native = False
+
+    def setPercent(self, percent: int) -> None:
+        """Set all the channels of the control to ``percent``.
+
+        Nothing is done if the control, read back, already has this value:
+        ``alsactl restore`` or amixer may have changed it behind us. With
+        amixer, the value is always written.
+
+        """
+        with self._lock:
+            self._setPercent(percent)
+
+    def _setPercent(self, percent: int) -> None:
+        """Write ``percent``, with the lock held."""
+        if self.native:
+            # Same conversion as amixer for X%
+            raw = self._min + round(percent * (self._max - self._min) * 0.01)
+            if self._read() == raw:
+                self._percent = percent
+                return
+            for index in range(self._count):
+                AlsaMixer._lib.snd_ctl_elem_value_set_integer(self._value, index, raw)
+            result = AlsaMixer._lib.snd_ctl_elem_write(self._ctl, self._value)
+            if result < 0:
+                log.message(
+                    f"alsa_mixer: write failed: {AlsaMixer._lib.snd_strerror(result).decode()}",
+                    log.ERROR,
+                )
+                return
+        elif self.numid > 0:
+            # Waits, so that two values cannot be written out of order
+            cmd = f"sudo amixer {self.device} cset numid={self.numid} {percent}%"
+            runner.execCommand(cmd)
+        self._percent = percent
+
+    def getPercent(self) -> int | None:
+        """Read the control back, in percent; None if not native."""
+        with self._lock:
+            if not self.native:
+                return self._percent
+            raw = self._read()
+        if raw is None:
+            return None
+        if self._max == self._min:
+            return 0
+        return round((raw - self._min) * 100 / (self._max - self._min))
+
+    def _read(self) -> int | None:
+        """Read the raw value of the first channel, with the lock held."""
+        if AlsaMixer._lib.snd_ctl_elem_read(self._ctl, self._value) < 0:
+            return None
+        return AlsaMixer._lib.snd_ctl_elem_value_get_integer(self._value, 0)
+
+
+class VolumeRamp:
+    """Apply the latest volume target at a bounded rate."""
+
+    def __init__(
+        self,
+        apply: Callable[[int], None],
+        interval: float = 0.05,
+        max_step: int | None = None,
+    ) -> None:
+        """Start the ramp thread.
+
+        Parameters
+        ----------
+        apply : Callable[[int], None]
+            Writes a volume (mixer and/or MPD); called from the ramp thread.
+        interval : float, optional
+            Minimum time in seconds between two calls of ``apply``.
+        max_step : int | None, optional
+            Largest change per call, to fade between two levels; None jumps
+            straight to the target.
+
+        """
+        if len(log.getName()) < 1:
+            log.init("radio")
+        self.apply = apply
+        self.interval = interval
+        self.max_step = max_step
+
+        self._lock = threading.Lock()
+        # Held from the choice of a step to the end of its apply, so that a
+        # flush (mute) is never overwritten by an older step of the thread
+        self._apply_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._target: int | None = None
+        self._current: int | None = None
+        self._last_apply = 0.0
+        self.applied = 0  # Number of calls of apply
+        self.requested = 0  # Number of targets set
+        threading.Thread(target=self._run, name="volume_ramp", daemon=True).start()
+
+    def set(self, volume: int) -> None:
+        """Ask for ``volume``; returns at once."""
+        with self._lock:
+            self._target = volume
+            self.requested += 1
+        self._wakeup.set()
+
+    def pending(self) -> bool:
+        """Tell if the target has not been applied yet."""
+        with self._lock:
+            return self._target is not None and self._target != self._current
+
+    def flush(self) -> None:
+        """Apply the target now, in the calling thread (eg before a pause)."""
+        while self._step():
+            pass
+
+    def _step(self) -> bool:
+        """Apply one step toward the target; False when there is nothing to do."""
+        with self._apply_lock:
+            with self._lock:
+                target = self._target
+                current = self._current
+                if target is None or target == current:
+                    return False
+                volume = target
+                if self.max_step is not None and current is not None:
+                    step = max(-self.max_step, min(self.max_step, target - current))
+                    volume = current + step
+                self._current = volume
+                self._last_apply = time.monotonic()
+                self.applied += 1
+            try:
+                self.apply(volume)
+            except Exception as e:
+                log.message(f"volume_ramp: {e}", log.ERROR)
+            return True
+
+    def _run(self) -> None:
+        """Wait for a target, then apply it no faster than the interval."""
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            while True:
+                delay = self._last_apply + self.interval - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                if not self._step():
+                    break
+
+
+if __name__ == "__main__":
+    import sys
+
+    written = []
+    ramp = VolumeRamp(written.append, interval=0.05)
+    for volume in range(40, 80):  # A fast turn of the knob
+        ramp.set(volume)
+        time.sleep(0.002)
+    time.sleep(0.2)
+    print(f"{ramp.requested} steps, {ramp.applied} writes: {written}")
+    assert written[-1] == 79 and ramp.applied < 10
+
+    fade = []
+    ramp = VolumeRamp(fade.append, interval=0.001, max_step=10)
+    ramp.set(0)
+    ramp.flush()
+    ramp.set(35)
+    ramp.flush()
+    print(f"Fade: {fade}")
+    assert fade == [0, 10, 20, 30, 35]
+
+    # A mute flushed while the thread writes a slow step stays the last write
+    slow = []
+    ramp = VolumeRamp(
+        lambda volume: (time.sleep(0.05 if volume else 0), slow.append(volume)), interval=0
+    )
+    ramp.set(60)
+    time.sleep(0.01)  # The thread is writing 60
+    ramp.set(0)
+    ramp.flush()
+    time.sleep(0.1)
+    print(f"Mute during a write: {slow}")
+    assert slow == [60, 0]
+
+    if len(sys.argv) > 1:
+        mixer = AlsaMixer(int(sys.argv[1]))
+        start = time.perf_counter()
+        for percent in range(50, 100):
+            mixer.setPercent(percent)
+        print(f"native={mixer.native} {(time.perf_counter() - start) / 50 * 1e6:.0f}us/set")
+        print(f"Mixer at {mixer.getPercent()}%")
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""Define the cache of the code pages chosen and compiled by Translate.
+
+Every :class:`.Translate` (a dozen per radio) changed the working directory,
+listed ``codes/*.py``, imported the font modules in a loop to choose the
+primary and secondary code pages of the language and controller, then
+compiled their tables (:class:`.CodeTable`).
+
+:class:`CodePageCache` keeps the result for each (language, controller,
+romanize) in one JSON file: the chosen code pages and the stages of their
+compiled tables. It is valid as long as the modification times of its
+sources have not changed: the code modules used, the ``codes`` directory
+(a code page added or removed) and the modules that choose and compile the
+tables. A later start reads the file and checks a few ``stat`` instead of
+scanning and importing; in the same process the tables are shared.
+
+"""
+import json
+import os
+import threading
+
+from code_table_class import CodeTable
+from log_class import Log
+
+log = Log()
+
+RADIO_LIB_DIR = "/var/lib/radiod"
+CACHE_FILE = "code_pages.json"
+VERSION = 1
+
+_directory = os.path.dirname(os.path.abspath(__file__))
+CODES_DIR = os.path.join(_directory, "codes")
+
+# Sources of every entry: the choice and the compilation of the tables
+SOURCES = (
+    CODES_DIR,
+    os.path.join(_directory, "translate_class.py"),
+    os.path.join(_directory, "code_table_class.py"),
+    os.path.abspath(__file__),
+)
+
+
+class CodePage:
+    """Font table of ``codes/<name>.py``, without importing the module."""
+
+    def __init__(
+        self,
+        module: str,
+        name: str,
+        controller: str,
+        codepage: int,
+        codes: dict[str, str],
+        romanized: dict[str, str],
+    ) -> None:
+        """Create the code page.
+
+        Parameters
+        ----------
+        module : str
+            Name of the module, such as ``codes.European``.
+        name : str
+            Language of the table, as the ``language`` parameter.
+        controller : str
+            LCD controller of the table.
+        codepage : int
+            Font code page of the LCD, 0 to 2.
+        codes : dict[str, str]
+            Escape codes translated to the LCD font.
+        romanized : dict[str, str]
+            Escape codes translated to Latin characters.
+
+        """
+        self.__name__ = module
+        self.name = name
+        self.controller = controller
+        self.codepage = codepage
+        self.codes = codes
+        self.romanized = romanized
+
+    @classmethod
+    def fromModule(cls, module) -> "CodePage":
+        """Create the code page of an imported ``codes`` module."""
+        return cls(
+            module.__name__,
+            module.name,
+            module.controller,
+            module.codepage,
+            dict(module.codes),
+            dict(module.romanized),
+        )
+
+    def toDict(self) -> dict:
+        """Give the code page as JSON data."""
+        return {
+            "module": self.__name__,
+            "name": self.name,
+            "controller": self.controller,
+            "codepage": self.codepage,
+            "codes": self.codes,
+            "romanized": self.romanized,
+        }
+
+    @classmethod
+    def fromDict(cls, data: dict) -> "CodePage":
+        """Create a code page from :meth:`toDict` data."""
+        return cls(
+            data["module"],
+            data["name"],
+            data["controller"],
+            data["codepage"],
+            data["codes"],
+            data["romanized"],
+        )
+
+
+# Code pages, English page, compiled page tables and English table
+CodePageSet = tuple[list[CodePage], CodePage, list[CodeTable], CodeTable]
+
+
+class CodePageCache:
+    """Keep the chosen and compiled code pages in a file."""
+
+    def __init__(
+        self, directory: str = RADIO_LIB_DIR, sources: tuple[str, ...] = SOURCES
+    ) -> None:
+        """Create the cache; the file is read at the first :meth:`get`.
+
+        Parameters
+        ----------
+        directory : str, optional
+            Directory of the cache file.
+        sources : tuple[str, ...], optional
+            Sources of every entry, :data:`SOURCES` by default.
+
+        """
+        if len(log.getName()) < 1:
+            log.init("radio")
+        self.path = os.path.join(directory, CACHE_FILE)
+        self.sources = sources
+        self._lock = threading.Lock()
+        self._data: dict | None = None
+        # Entries already built in this process, by key
+        self._sets: dict[str, CodePageSet] = {}
+
+    @staticmethod
+    def _key(language: str, controller: str, romanize: bool) -> str:
+        """Give the key of an entry."""
+        return f"{language}|{controller}|{int(bool(romanize))}"
+
+    def get(self, language: str, controller: str, romanize: bool) -> CodePageSet | None:
+        """Give the code pages and tables, None if missing or out of date."""
+        key = self._key(language, controller, romanize)
+        with self._lock:
+            entry = self._read().get("entries", {}).get(key)
+            if entry is None or not self._valid(entry.get("sources", {})):
+                self._sets.pop(key, None)
+                return None
+            if key not in self._sets:
+                try:
+                    self._sets[key] = self._load(entry)
+                except (KeyError, TypeError, ValueError) as e:
+                    log.message(f"code_page_cache: invalid entry {key}: {e}", log.ERROR)
+                    return None
+            return self._sets[key]
+
+    def put(
+        self,
+        language: str,
+        controller: str,
+        romanize: bool,
+        code_set: CodePageSet,
+        sources: list[str],
+    ) -> None:
+        """Store the code pages and tables built from ``sources``.
+
+        Parameters
+        ----------
+        language, controller, romanize
+            Parameters the code pages were chosen for.
+        code_set : CodePageSet
+            Code pages, English page, compiled page tables and English
+            table.
+        sources : list[str]
+            Files of the code modules used; :attr:`sources` are added.
+
+        """
+        key = self._key(language, controller, romanize)
+        pages, english, tables, english_table = code_set
+        entry = {
+            "sources": self._times(list(self.sources) + [os.path.abspath(s) for s in sources]),
+            "pages": [page.toDict() for page in pages],
+            "english": english.toDict(),
+            "tables": [self._tableData(table) for table in tables],
+            "english_table": self._tableData(english_table),
+        }
+        with self._lock:
+            data = self._read()
+            data.setdefault("entries", {})[key] = entry
+            self._sets[key] = code_set
+            tmp = self.path + ".tmp"
+            try:
+                with open(tmp, "w") as f:
+                    json.dump(data, f, separators=(",", ":"))
+                os.replace(tmp, self.path)
+            except OSError as e:
+                log.message(f"code_page_cache: cannot write {self.path}: {e}", log.INFO)
+                return
+        log.message("code_page_cache: %s saved", log.DEBUG, key)
+
+    @staticmethod
+    def _times(paths: list[str]) -> dict[str, int]:
+        """Give the modification times of ``paths``, -1 if missing."""
+        times = {}
+        for path in paths:
+            try:
+                times[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                times[path] = -1
+        return times
+
+    def _valid(self, sources: dict[str, int]) -> bool:
+        """Tell if none of the sources has changed."""
+        return bool(sources) and self._times(list(sources)) == sources
+
+    @staticmethod
+    def _tableData(table: CodeTable) -> dict:
+        """Give a compiled table as JSON data."""
+        return {"codes": dict(table.codes), "stages": table.stages}
+
+    @staticmethod
+    def _load(entry: dict) -> CodePageSet:
+        """Create the code pages and tables of an entry."""
+        pages = [CodePage.fromDict(page) for page in entry["pages"]]
+        tables = [CodeTable(t["codes"], stages=t["stages"]) for t in entry["tables"]]
+        english_table = entry["english_table"]
+        return (
+            pages,
+            CodePage.fromDict(entry["english"]),
+            tables,
+            CodeTable(english_table["codes"], stages=english_table["stages"]),
+        )
+
+    def _read(self) -> dict:
+        """Give the content of the file, read once."""
+        if self._data is None:
+            try:
+                with open(self.path) as f:
+                    self._data = json.load(f)
+            except FileNotFoundError:
+                self._data = {}
+            except (OSError, ValueError) as e:
+                log.message(f"code_page_cache: cannot read {self.path}: {e}", log.ERROR)
+                self._data = {}
+            if not isinstance(self._data, dict) or self._data.get("version") != VERSION:
+                self._data = {"version": VERSION, "entries": {}}
+        return self._data
+
+
+# Shared by all the Translate objects
+code_page_cache = CodePageCache()
+
+
+if __name__ == "__main__":
+    import importlib
+    import shutil
+    import sys
+    import tempfile
+    import time
+
+    sys.path.insert(0, _directory)
+    with tempfile.TemporaryDirectory() as directory:
+        # A copy of the codes directory, which the test changes
+        codes = shutil.copytree(CODES_DIR, os.path.join(directory, "codes"))
+        sources = (codes,) + SOURCES[1:]
+        cache = CodePageCache(directory, sources)
+        assert cache.get("European", "HD44780U", True) is None
+
+        start = time.perf_counter()
+        modules = [importlib.import_module("codes." + name) for name in ("European", "English")]
+        pages = [CodePage.fromModule(modules[0])]
+        english = CodePage.fromModule(modules[1])
+        tables = [CodeTable(pages[0].romanized)]
+        english_table = CodeTable(english.romanized)
+        built = time.perf_counter() - start
+        cache.put(
+            "European",
+            "HD44780U",
+            True,
+            (pages, english, tables, english_table),
+            [module.__file__ for module in modules],
+        )
+
+        start = time.perf_counter()
+        cached = CodePageCache(directory, sources).get("European", "HD44780U", True)
+        loaded = time.perf_counter() - start
+        assert cached is not None
+        assert cached[0][0].romanized == pages[0].romanized
+        assert cached[2][0].stages == tables[0].stages
+        text = "Caf\\xc3\\xa9 \\xe2\\x80\\x9cJazz\\xe2\\x80\\x9d"
+        assert cached[3].translate(text) == english_table.translate(text)
+        print(f"Import and compile {built * 1000:.1f}ms, cache {loaded * 1000:.1f}ms")
+
+        # A new code page in the directory invalidates the entries
+        time.sleep(0.01)
+        open(os.path.join(codes, "_test.py"), "w").close()
+        assert CodePageCache(directory, sources).get("European", "HD44780U", True) is None
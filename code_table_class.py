@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""Define the compiled form of a character translation table.
+
+:meth:`.Translate.all` used to apply a code table (``codes/*.py``) with one
+``str.replace`` per key, over the whole string, for every table and for every
+string shown on the display: a few thousand scans of each title.
+
+:class:`CodeTable` compiles a table once into a few regular expressions, each
+an alternation of keys with a dict lookup of the replacement, so that the
+string is scanned once per expression instead of once per key. The keys are
+grouped in *stages* of consecutive keys that give exactly the same result as
+the sequential replacements. A key starts a new stage when, in the current
+stage:
+
+* it contains an earlier key after its first character, or one of its
+  suffixes is a prefix of an earlier key (the earlier key is replaced first
+  by ``str.replace`` but the later one would win the leftmost match);
+* it may overlap the replacement of an earlier key (``str.replace`` would
+  translate the replacement again), or an earlier key is deleted (its
+  neighbours join).
+
+The expression of a stage is factored as a trie (``\\xc3\\x(?:a4|a5...)``)
+when no key is a prefix of another one, as then only one key can match at a
+given place and the order of the alternatives does not matter. Consecutive
+stages whose keys start with the same characters (``\\``) are skipped
+together when the text has none of them, as most strings have no escape code
+at all.
+
+"""
+import re
+from types import MappingProxyType
+
+from log_class import Log
+
+log = Log()
+
+
+def _overlaps(first: str, second: str) -> bool:
+    """Tell if a proper suffix of ``first`` is a proper prefix of ``second``."""
+    for length in range(1, min(len(first), len(second))):
+        if first[-length:] == second[:length]:
+            return True
+    return False
+
+
+def _trie(keys: list[str]) -> str:
+    """Give the expression matching ``keys``, none of them a prefix of another."""
+    root: dict = {}
+    for key in keys:
+        node = root
+        for char in key:
+            node = node.setdefault(char, {})
+
+    def expression(node: dict) -> str:
+        branches = [re.escape(char) + expression(child) for char, child in node.items()]
+        if len(branches) == 1:
+            return branches[0]
+        return "(?:" + "|".join(branches) + ")" if branches else ""
+
+    return expression(root)
+
+
+def _hasPrefix(keys: list[str]) -> bool:
+    """Tell if one of ``keys`` is a prefix of another one."""
+    ordered = sorted(keys)
+    return any(b.startswith(a) for a, b in zip(ordered, ordered[1:]))
+
+
+def _conflicts(key: str, earlier_key: str, earlier_value: str) -> bool:
+    """Tell if ``key`` cannot share a stage with an earlier key."""
+    # Matches that str.replace and the leftmost alternation order differently
+    if key.find(earlier_key, 1) != -1 or _overlaps(key, earlier_key):
+        return True
+    # Matches in or around the replacement of the earlier key
+    if earlier_value == "":
+        return len(key) > 1
+    return (
+        earlier_value in key
+        or key in earlier_value
+        or _overlaps(earlier_value, key)
+        or _overlaps(key, earlier_value)
+    )
+
+
+class CodeTable:
+    """Replace the keys of a code table like successive ``str.replace``."""
+
+    def __init__(self, codes: dict[str, str], stages: list[list[str]] | None = None) -> None:
+        """Compile the table.
+
+        Parameters
+        ----------
+        codes : dict[str, str]
+            Keys replaced by their value, in the order of the dict.
+        stages : list[list[str]] | None, optional
+            :attr:`stages` of a previous compilation of the same table, as
+            kept by :class:`.CodePageCache`, to skip their analysis.
+
+        """
+        if len(log.getName()) < 1:
+            log.init("radio")
+        self.codes = MappingProxyType(dict(codes))  # Read-only copy
+        self.stages = self._stages(self.codes) if stages is None else stages
+
+        # Blocks of (first characters, [(expression, replacements)])
+        self._blocks: list[tuple[str, list]] = []
+        for keys in self.stages:
+            first = "".join(sorted({key[0] for key in keys}))
+            if _hasPrefix(keys):
+                pattern = re.compile("|".join(map(re.escape, keys)))
+            else:
+                pattern = re.compile(_trie(keys))
+            replacements = {key: self.codes[key] for key in keys}
+            block = self._blocks[-1] if self._blocks else None
+            if block is None or block[0] != first or self._produces(block, first):
+                self._blocks.append((first, []))
+            self._blocks[-1][1].append(
+                (pattern, replacements, lambda m, r=replacements: r[m.group()])
+            )
+
+    @staticmethod
+    def _produces(block: tuple[str, list], first: str) -> bool:
+        """Tell if the replacements of a block may bring one of ``first``."""
+        return any(
+            char in value
+            for _, replacements, _ in block[1]
+            for value in replacements.values()
+            for char in first
+        )
+
+    @staticmethod
+    def _stages(codes: MappingProxyType) -> list[list[str]]:
+        """Group the keys in stages of independent consecutive keys."""
+        stages: list[list[str]] = []
+        stage: list[str] = []
+        for key in codes:
+            if not key:
+                continue  # str.replace of "" would insert the value everywhere
+            if any(_conflicts(key, earlier, codes[earlier]) for earlier in stage):
+                stages.append(stage)
+                stage = []
+            stage.append(key)
+        if stage:
+            stages.append(stage)
+        return stages
+
+    def translate(self, text: str) -> str:
+        """Give ``text`` with the keys replaced."""
+        for first, stages in self._blocks:
+            if len(first) == 1:
+                if first not in text:
+                    continue
+            elif not any(char in text for char in first):
+                continue
+            for pattern, _, replace in stages:
+                text = pattern.sub(replace, text)
+        return text
+
+
+if __name__ == "__main__":
+    import importlib
+    import os
+    import random
+    import sys
+    import time
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    def sequential(codes: dict[str, str], text: str) -> str:
+        for key in codes:
+            text = text.replace(key, codes[key])
+        return text
+
+    tables = {}
+    for name in ("English", "European", "European_HD44780", "Russian", "Russian_HD44780"):
+        module = importlib.import_module("codes." + name)
+        tables[name + ".codes"] = module.codes
+        tables[name + ".romanized"] = module.romanized
+
+    rng = random.Random(1)
+    for name, codes in tables.items():
+        table = CodeTable(codes)
+        pieces = list(codes) + list(codes.values()) + ["\\", "x", "a", " ", "/", "'"]
+        for _ in range(3000):
+            text = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 8)))
+            assert table.translate(text) == sequential(codes, text), (name, text)
+        print(
+            f"{name}: {len(codes)} keys in {len(table.stages)} stages, "
+            f"{len(table._blocks)} blocks"
+        )
+
+    codes = tables["English.romanized"]
+    table = CodeTable(codes)
+    for title in ("BBC Radio 4 - The Archers", "Fréquence Plus – Café “Jazz” №1"):
+        text = str(title.encode("utf-8")).lstrip("b")
+        count = 2000
+        start = time.perf_counter()
+        for _ in range(count):
+            sequential(codes, text)
+        before = (time.perf_counter() - start) / count
+        start = time.perf_counter()
+        for _ in range(count):
+            table.translate(text)
+        after = (time.perf_counter() - start) / count
+        print(f"{title}: replace loop {before * 1e6:.1f}us, compiled {after * 1e6:.1f}us")
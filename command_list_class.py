@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Define a batch of MPD commands sent as one command list.
+
+Every MPD command is a round trip to the server. Switching source used to send
+a dozen of them (``random``, ``consume``, ``repeat``, ``single``, ``clear``,
+``load``, ``playlist``...), some through ``mpc`` subprocesses. A
+:class:`CommandList` collects the commands and sends them between
+``command_list_ok_begin`` and ``command_list_end``: MPD answers all of them
+at once.
+
+"""
+import mpd
+from log_class import Log
+
+log = Log()
+
+
+class CommandList:
+    """Collect MPD commands and send them in one round trip."""
+
+    def __init__(self, client: mpd.MPDClient) -> None:
+        """Create an empty batch.
+
+        Parameters
+        ----------
+        client : mpd.MPDClient
+            Connected client that will send the batch.
+
+        """
+        if len(log.getName()) < 1:
+            log.init("radio")
+        self.client = client
+        self._commands: list[tuple[str, tuple]] = []
+
+    def __len__(self) -> int:
+        """Give the number of queued commands."""
+        return len(self._commands)
+
+    def add(self, command: str, *args) -> int:
+        """Queue a command.
+
+        Parameters
+        ----------
+        command : str
+            Name of the :class:`mpd.MPDClient` method, eg ``"random"``.
+        *args
+            Arguments of the command.
+
+        Returns
+        -------
+        int
+            Index of the result of this command in the list returned by
+            :meth:`send`.
+
+        """
+        self._commands.append((command, args))
+        return len(self._commands) - 1
+
+    def send(self) -> list:
+        """Send all the queued commands and empty the batch.
+
+        Returns
+        -------
+        list
+            One result per command, in order.
+
+        Raises
+        ------
+        mpd.CommandError
+            If one command fails. MPD does not run the following commands,
+            but the previous ones have been executed.
+
+        """
+        commands = self._commands
+        self._commands = []
+        if not commands:
+            return []
+
+        names = " ".join(command for command, _ in commands)
+        log.message(f"command_list: {names}", log.DEBUG)
+
+        # Keep other threads from sending commands in the middle of the list
+        lock = getattr(self.client, "lock", None)
+        if lock is None:
+            return self._send(commands)
+        with lock:
+            return self._send(commands)
+
+    def _send(self, commands: list[tuple[str, tuple]]) -> list:
+        """Send the commands between begin and end of a command list."""
+        self.client.command_list_ok_begin()
+        try:
+            for command, args in commands:
+                getattr(self.client, command)(*args)
+        except mpd.ConnectionError:
+            raise
+        except Exception:
+            # Close the list so that the client can be used again
+            self.client.command_list_end()
+            raise
+        return self.client.command_list_end()
+
+
+if __name__ == "__main__":
+    import sys
+
+    client = mpd.MPDClient()
+    client.connect("localhost", int(sys.argv[1]) if len(sys.argv) > 1 else 6600)
+
+    batch = CommandList(client)
+    batch.add("random", 0)
+    batch.add("consume", 0)
+    status = batch.add("status")
+    playlist = batch.add("playlist")
+    results = batch.send()
+    print(f"{results[status] = }")
+    print(f"{len(results[playlist])} entries in the queue")
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""Define the execution of the system commands of the radio.
+
+Every class used to have its own ``execCommand``, an ``os.popen`` whose pipe
+was never closed: a ``/bin/sh`` fork on the main thread even for a ``cat`` of
+a file, an ``echo`` into a file or a ``pidof``. The wrappers keep their name
+but call :func:`execCommand` of this module, which:
+
+* does the trivial commands in Python (``cat``, ``echo > file``, ``pidof``,
+  ``mkdir -p``, ``rm -f``, ``touch``, ``killall``, ``uname``, ``getconf``);
+* runs the other ones (``systemctl``, ``amixer``, ``mpc``, pipes...) with a
+  timeout and a captured exit code, in the calling thread or, when the result
+  is not needed, in a background worker;
+* counts the calls and their latency per command.
+
+"""
+import glob
+import os
+import platform
+import re
+import shlex
+import signal
+import subprocess
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from log_class import Log
+
+log = Log()
+
+# Default timeout of a subprocess in seconds
+TIMEOUT = 30.0
+
+# Characters that need a real shell
+SHELL_CHARS = re.compile(r"[|&;<>()$`\\\n]")
+# Command line leaving its last command in the background (not "&&")
+BACKGROUND = re.compile(r"(?<!&)&\s*$")
+ECHO_TO_FILE = re.compile(r"^echo (?P<text>[^|&;<>()$`\\\n]*?) ?> ?(?P<file>\S+)$")
+
+
+def readLine(path: str) -> str:
+    """Give the first line of a file without its end of line, like cat."""
+    try:
+        with open(path) as f:
+            return f.readline().rstrip("\n")
+    except (OSError, UnicodeDecodeError):
+        return ""
+
+
+def readText(path: str) -> str:
+    """Give the whole content of a file, empty if it cannot be read."""
+    try:
+        with open(path) as f:
+            return f.read()
+    except (OSError, UnicodeDecodeError):
+        return ""
+
+
+def writeFile(path: str, text: str) -> bool:
+    """Write ``text`` and an end of line in a file, like echo; False on error."""
+    try:
+        with open(path, "w") as f:
+            f.write(f"{text}\n")
+        return True
+    except OSError as e:
+        log.message(f"command_runner: cannot write {path}: {e}", log.ERROR)
+        return False
+
+
+def pidof(name: str) -> list[int]:
+    """Give the process IDs of the program ``name``, from /proc."""
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/comm") as f:
+                comm = f.read().rstrip("\n")
+            if comm != name[:15]:
+                with open(f"/proc/{entry}/cmdline", "rb") as f:
+                    argv0 = f.read().split(b"\0")[0].decode(errors="replace")
+                if os.path.basename(argv0) != name:
+                    continue
+            pids.append(int(entry))
+        except OSError:
+            continue  # The process is gone
+    return sorted(pids, reverse=True)
+
+
+def killall(name: str, sig: int = signal.SIGTERM) -> int:
+    """Send ``sig`` to all the processes ``name``; give the number killed."""
+    killed = 0
+    for pid in pidof(name):
+        try:
+            os.kill(pid, sig)
+            killed += 1
+        except OSError:
+            pass
+    return killed
+
+
+class CommandRunner:
+    """Run the system commands and keep their statistics."""
+
+    def __init__(self, workers: int = 2) -> None:
+        """Create the runner.
+
+        Parameters
+        ----------
+        workers : int, optional
+            Number of background commands that can run at the same time.
+
+        """
+        if len(log.getName()) < 1:
+            log.init("radio")
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="command_runner"
+        )
+        self._lock = threading.Lock()
+        # Command name -> [calls, failures, total seconds, max seconds]
+        self._metrics: dict[str, list] = {}
+        self._root = os.geteuid() == 0
+
+    def execCommand(
+        self, cmd: str, timeout: float = TIMEOUT, wait: bool = True
+    ) -> str:
+        """Run ``cmd`` and give the first line of its output.
+
+        Parameters
+        ----------
+        cmd : str
+            Shell command line, as given to ``os.popen`` before.
+        timeout : float, optional
+            The command is killed after this time in seconds.
+        wait : bool, optional
+            If False, the command runs in the background and an empty string
+            is returned at once; for commands whose output is not used.
+
+        """
+        if not wait:
+            self.submit(cmd, timeout)
+            return ""
+        start = time.monotonic()
+        try:
+            result = self._native(cmd)
+            success = True
+        except OSError as e:
+            log.message(f"command_runner: {cmd}: {e}", log.ERROR)
+            result, success = "", False
+        if result is not None:
+            self._record("native " + self._name(cmd), success, start)
+            return result
+        return self.run(cmd, timeout)[1]
+
+    def submit(self, cmd: str, timeout: float = TIMEOUT) -> Future:
+        """Run ``cmd`` in a background worker; the future gives its exit code.
+
+        The output is not used, so it is not captured.
+
+        """
+        return self._executor.submit(self.run, cmd, timeout, False)
+
+    def run(
+        self, cmd: str, timeout: float = TIMEOUT, capture: bool = True
+    ) -> tuple[int, str]:
+        """Run ``cmd`` in a shell; give its exit code and first output line.
+
+        The exit code is -1 when the command timed out or could not start.
+        The output goes to ``/dev/null`` (empty line given) if ``capture`` is
+        False or if the command line ends with ``&``: a program left in the
+        background would hold the pipe open until the timeout.
+
+        """
+        capture = capture and not BACKGROUND.search(cmd)
+        start = time.monotonic()
+        try:
+            completed = subprocess.run(
+                cmd,
+                shell=True,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE if capture else subprocess.DEVNULL,
+                timeout=timeout,
+                text=True,
+                errors="replace",
+            )
+            code = completed.returncode
+            output = completed.stdout.split("\n", 1)[0] if capture else ""
+        except subprocess.TimeoutExpired:
+            log.message(f"command_runner: timeout after {timeout}s: {cmd}", log.ERROR)
+            code, output = -1, ""
+        except OSError as e:
+            log.message(f"command_runner: {cmd}: {e}", log.ERROR)
+            code, output = -1, ""
+
+        elapsed = self._record(self._name(cmd), code == 0, start)
+        log.message(
+            f"command_runner: {cmd} exit {code} in {elapsed * 1000:.0f}ms", log.DEBUG
+        )
+        return code, output
+
+    def getMetrics(self) -> dict[str, dict]:
+        """Give calls, failures, average and max latency in ms per command."""
+        with self._lock:
+            return {
+                name: {
+                    "calls": calls,
+                    "failures": failures,
+                    "average": total / calls * 1000,
+                    "max": maximum * 1000,
+                }
+                for name, (calls, failures, total, maximum) in self._metrics.items()
+            }
+
+    def logMetrics(self) -> None:
+        """Log the statistics of the commands, slowest first."""
+        metrics = self.getMetrics()
+        for name in sorted(metrics, key=lambda name: -metrics[name]["max"]):
+            m = metrics[name]
+            log.message(
+                f"command_runner: {name}: {m['calls']} calls, {m['failures']} failed, "
+                f"avg {m['average']:.1f}ms, max {m['max']:.1f}ms",
+                log.INFO,
+            )
+
+    def _record(self, name: str, success: bool, start: float) -> float:
+        """Count one call of ``name`` started at ``start``; give its duration."""
+        elapsed = time.monotonic() - start
+        with self._lock:
+            metrics = self._metrics.setdefault(name, [0, 0, 0.0, 0.0])
+            metrics[0] += 1
+            metrics[1] += 0 if success else 1
+            metrics[2] += elapsed
+            metrics[3] = max(metrics[3], elapsed)
+        return elapsed
+
+    def _name(self, cmd: str) -> str:
+        """Give the program name of a command line, without sudo or path."""
+        words = cmd.split()
+        if len(words) > 1 and words[0] == "sudo":
+            words = words[1:]
+        return os.path.basename(words[0]) if words else ""
+
+    def _native(self, cmd: str) -> str | None:
+        """Do the command in Python if it is a trivial one, else give None."""
+        cmd = cmd.strip()
+        if cmd.startswith("sudo ") and self._root:
+            cmd = cmd[5:].lstrip()
+
+        match = ECHO_TO_FILE.match(cmd)
+        if match:
+            writeFile(match["file"], match["text"])
+            return ""
+        if SHELL_CHARS.search(cmd):
+            return None
+        try:
+            words = shlex.split(cmd)
+        except ValueError:
+            return None
+        if not words:
+            return ""
+
+        program, args = words[0], words[1:]
+        if program == "cat" and len(args) == 1:
+            return readLine(args[0])
+        if program == "pidof" and len(args) == 1:
+            return " ".join(str(pid) for pid in pidof(args[0]))
+        if program == "mkdir" and len(args) == 2 and args[0] == "-p":
+            os.makedirs(args[1], exist_ok=True)
+            return ""
+        if program == "rm" and args and args[0] == "-f":
+            for pattern in args[1:]:
+                for path in glob.glob(pattern) if glob.has_magic(pattern) else [pattern]:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+            return ""
+        if program == "touch" and len(args) == 1:
+            with open(args[0], "a"):
+                os.utime(args[0])
+            return ""
+        if program == "killall" and args:
+            names = [arg for arg in args if not arg.startswith("-")]
+            if len(names) == 1 and set(args) - set(names) <= {"-q"}:
+                killall(names[0])
+                return ""
+        if cmd == "uname -a":
+            return " ".join(os.uname())
+        if cmd == "getconf LONG_BIT":
+            return "64" if platform.architecture()[0] == "64bit" else "32"
+        return None
+
+
+# Shared by all the classes
+runner = CommandRunner()
+
+
+def execCommand(cmd: str, timeout: float = TIMEOUT, wait: bool = True) -> str:
+    """Run ``cmd`` with the shared runner; see :meth:`CommandRunner.execCommand`."""
+    return runner.execCommand(cmd, timeout, wait)
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "sub", "value")
+        execCommand("mkdir -p " + os.path.dirname(path))
+        execCommand("echo 42 > " + path)
+        assert execCommand("cat " + path) == "42"
+        execCommand("rm -f " + os.path.join(directory, "sub", "*"))
+        assert not os.path.exists(path)
+
+    name = readLine("/proc/self/comm")
+    assert str(os.getpid()) in execCommand("pidof " + name).split()
+    assert execCommand("uname -a") == " ".join(os.uname())
+    assert execCommand("echo hello | tr a-z A-Z") == "HELLO"
+    assert runner.run("exit 3")[0] == 3
+    assert runner.run("sleep 5", timeout=0.2)[0] == -1
+    assert runner.submit("echo background").result() == (0, "")
+    assert runner.run("true && echo and")[1] == "and"
+    # A program left in the background does not hold the command
+    start = time.perf_counter()
+    assert runner.run("sleep 3 &", timeout=1)[0] == 0
+    assert time.perf_counter() - start < 1
+
+    start = time.perf_counter()
+    for _ in range(100):
+        execCommand("cat /proc/uptime")
+    native = (time.perf_counter() - start) / 100
+    start = time.perf_counter()
+    for _ in range(20):
+        os.popen("cat /proc/uptime").readline()
+    popen = (time.perf_counter() - start) / 20
+    print(f"cat: native {native * 1e6:.0f}us, os.popen {popen * 1e6:.0f}us")
+    runner.logMetrics()
+    for name, metrics in runner.getMetrics().items():
+        print(name, metrics)
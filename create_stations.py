@@ -33,6 +33,7 @@ from time import strftime
 from xml.dom.minidom import parseString
 from config_class import Configuration
 from source_class import Source
+from command_runner_class import runner
 
 # Output errors to STDERR
 stderr = sys.stderr.write;
@@ -58,8 +59,7 @@ MEDIA = 1   # Media can have one or more playlists with any name
 
 # Execute system command
 def execCommand(cmd):
-    p = os.popen(cmd)
-    return  p.readline().rstrip('\n')
+    return runner.execCommand(cmd)
 
 # Create the initial list of files
 def createList():
@@ -53,6 +53,7 @@ class Display:
     _mute_line = 4  # OLEDs only. Line to display mute message
     _refresh_volume_bar = False  # If previously muted force display of OLED volume slider
     _no_scrolling = False   # Suppress scrolling during volume display update
+    _scrolled = False   # A line was scrolled since the last call to scrolled()
 
     i2c_bus = 1 # All later RPIs use bus 1 (old RPIs use bus 0)
 
@@ -305,11 +306,22 @@ class Display:
                 self.lines = 2
         return self.lines
 
+    # Set the scroll speed (Displays that scroll text only)
+    def setScrollSpeed(self,speed):
+        if hasattr(screen,'setScrollSpeed'):
+            screen.setScrollSpeed(speed)
+
     # Switch off scrolling when adjusting the volume
     # OnOff is True or False
     def noScrolling(self,OnOff):
         self._no_scrolling = OnOff
 
+    # Check if a line was scrolled since the last call (next scroll is due)
+    def scrolled(self):
+        scrolled = self._scrolled
+        self._scrolled = False
+        return scrolled
+
     # Set font size
     def setFontSize(self,size):
         displayType = config.getDisplayType()
@@ -357,6 +369,7 @@ class Display:
             # Always display messages that need to be scrolled
             if leng > self.width:
                 screen.out(line,message,interrupt)
+                self._scrolled = True
 
             # Only display if this is a different message on this line
             elif message !=  self.lineBuffer[index]:
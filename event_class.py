@@ -18,7 +18,9 @@
 #
 
 import sys
+import threading
 import time
+from collections import deque
 
 from disco_light import DiscoLight
 from log_class import Log
@@ -116,6 +118,12 @@ class Event:
     UNUSED = 29
     DISCO = 30
 
+    # Internet connectivity changed (network_monitor_class)
+    NETWORK_CHANGED = 31
+
+    # Playlist of the resumed station loaded (radio_class completeResume)
+    RESUMED = 32
+
     # Alternate event names (easier to understand code )
     VOLUME_UP = RIGHT_SWITCH
     VOLUME_DOWN = LEFT_SWITCH
@@ -123,7 +131,7 @@ class Event:
     CHANNEL_DOWN = DOWN_SWITCH
 
     event_type = NO_EVENT
-    event_triggered = False
+    _triggered = False
 
     eventNames = [
         "NO_EVENT",
@@ -157,6 +165,8 @@ class Event:
         "SPOTIFY",
         "UNUSED",
         "DISCO",
+        "NETWORK_CHANGED",
+        "RESUMED",
     ]
 
     encoderEventNames = ["NONE", "CLOCKWISE", "ANTICLOCKWISE", "BUTTONDOWN", "BUTTONUP"]
@@ -191,6 +201,9 @@ class Event:
     # Initialisation routine
     def __init__(self, config):
         self.config = config
+        self._wakeup = threading.Event()  # Wakes up the main loop
+        self._lock = threading.Lock()
+        self._pending = deque()  # Events posted while another one is handled
         log.init("event_class", console_output=True)
         self.getConfiguration()
         self.setInterface()
@@ -210,10 +223,10 @@ class Event:
         global volumeknob
         self.event_type = self.NO_EVENT
 
-        encoderEventName = " " + self.getEncoderEventName(event)
-        log.message("Volume event:" + str(event) + encoderEventName, log.DEBUG)
-
-        self.event_triggered = True
+        if log.isEnabledFor(log.DEBUG):
+            log.message(
+                "Volume event:%s %s", log.DEBUG, event, self.getEncoderEventName(event)
+            )
 
         if event == RotaryEncoder.CLOCKWISE:
             self.event_type = self.VOLUME_UP
@@ -227,18 +240,19 @@ class Event:
         elif event == RotaryEncoder.BUTTONUP:
             self.event_type = self.MUTE_BUTTON_UP
 
-        else:
-            self.event_triggered = False
+        # Trigger last so that the main loop never wakes up on a stale type
+        self.event_triggered = self.event_type != self.NO_EVENT
         return
 
     # Call back routine for the tuner control
     def tuner_event(self, event):
         global tunerknob
         self.event_type = self.NO_EVENT
-        self.event_triggered = True
 
-        encoderEventName = " " + self.getEncoderEventName(event)
-        log.message("Tuner event:" + str(event) + encoderEventName, log.DEBUG)
+        if log.isEnabledFor(log.DEBUG):
+            log.message(
+                "Tuner event:%s %s", log.DEBUG, event, self.getEncoderEventName(event)
+            )
 
         if event == RotaryEncoder.CLOCKWISE:
             self.event_type = self.CHANNEL_UP
@@ -248,6 +262,7 @@ class Event:
 
         elif event == RotaryEncoder.BUTTONDOWN:
             self.event_type = self.MENU_BUTTON_DOWN
+            self.event_triggered = True
 
             # Holding the menu button for 3 seconds down shuts down the radio
             count = 15
@@ -262,17 +277,15 @@ class Event:
         elif event == RotaryEncoder.BUTTONUP:
             self.event_type = self.MENU_BUTTON_UP
 
-        else:
-            self.event_triggered = False
-
+        self.event_triggered = self.event_type != self.NO_EVENT
         return self.event_type
 
     # Call back routine button events (Not rotary encoder buttons)
     def button_event(self, event):
         global up_switch, down_switch
 
-        log.message("Button event:" + str(event), log.DEBUG)
-        self.event_triggered = True
+        log.message("Button event:%s", log.DEBUG, event)
+        self.event_type = self.NO_EVENT
 
         # Convert button event to standard events
         if event == self.right_switch:
@@ -292,6 +305,7 @@ class Event:
 
         elif event == self.menu_switch:
             self.event_type = self.MENU_BUTTON_DOWN
+            self.event_triggered = True
 
             # Holding the menu button for 3 seconds down shuts down the radio
             count = 15
@@ -312,8 +326,7 @@ class Event:
         elif event == self.aux_switch3:
             self.event_type = self.AUX_SWITCH3
 
-        else:
-            self.event_triggered = False
+        self.event_triggered = self.event_type != self.NO_EVENT
         return
 
     # Call back routine rotary switch events (Not rotary encoder buttons)
@@ -331,8 +344,8 @@ class Event:
 
     # Set event for radio functions
     def set(self, event):
-        self.event_triggered = True
         self.event_type = event
+        self.event_triggered = True
         return self.event_type
 
     # Play station/track number
@@ -349,19 +362,73 @@ class Event:
     def detected(self):
         return self.event_triggered
 
+    @property
+    def event_triggered(self) -> bool:
+        """Tell if an event is waiting to be handled."""
+        return self._triggered
+
+    @event_triggered.setter
+    def event_triggered(self, triggered: bool) -> None:
+        """Set the event flag, and wake up the main loop if it is set."""
+        self._triggered = triggered
+        if triggered:
+            self._wakeup.set()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Block until an event is set, :meth:`notify` is called or timeout.
+
+        Parameters
+        ----------
+        timeout : float | None, optional
+            Maximum time to wait in seconds. None waits forever.
+
+        Returns
+        -------
+        bool
+            If an event is waiting to be handled.
+
+        """
+        if not self._triggered:
+            self._wakeup.wait(timeout)
+        self._wakeup.clear()
+        return self._triggered
+
+    def notify(self) -> None:
+        """Wake up the main loop without setting an event."""
+        self._wakeup.set()
+
     # Get the event type
     def getType(self):
         return self.event_type
 
-    # Clear event an set triggered to False
+    # Clear event an set triggered to False (or to the next posted event)
     def clear(self):
         if self.event_type != self.NO_EVENT:
             sName = " " + self.getName()
             log.message("Clear event " + str(self.event_type) + sName, log.DEBUG)
-        self.event_triggered = False
-        self.event_type = self.NO_EVENT
+        with self._lock:
+            if self._pending:
+                self.event_type = self._pending.popleft()
+                self.event_triggered = True
+            else:
+                self.event_triggered = False
+                self.event_type = self.NO_EVENT
         return
 
+    def post(self, event_type: int) -> None:
+        """Queue an event from a background thread.
+
+        Unlike :meth:`set`, this never overwrites an event that is being
+        handled: it is delivered by :meth:`clear` instead. An event that is
+        already waiting is not queued twice.
+
+        """
+        with self._lock:
+            if not self._triggered:
+                self.set(event_type)
+            elif event_type != self.event_type and event_type not in self._pending:
+                self._pending.append(event_type)
+
     # Get the event name
     def getName(self):
         return self.eventNames[self.event_type]
@@ -692,8 +759,8 @@ class Event:
         if event_gpio not in self._telefunken_events_types:
             return
 
-        self.event_triggered = True
         self.event_type = self._telefunken_events_types[event_gpio]
+        self.event_triggered = True
 
     def set_telefunken_interface(self) -> None:
         """Create the switches for Telefunken, as well as rotary encoders.
@@ -759,13 +826,11 @@ if __name__ == "__main__":
 
     try:
         while True:
-            if event.detected():
+            if event.wait():
                 type = event.getType()
                 name = event.eventNames[int(type)]
                 print("Event %d %s" % (type, name))
                 event.clear()
-            else:
-                time.sleep(0.01)
 
     except KeyboardInterrupt:
         print(" Stopped")
@@ -49,6 +49,9 @@ import traceback
 from gcontrols_class import *
 from pygame.locals import *
 
+# The images (images/*.png) are found relative to the radio directory
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
 config = Configuration()
 translate = Translate()
 radio = None
@@ -610,6 +613,14 @@ def handleEvent(radio,radioEvent):
         log.message('PLAYLIST_CHANGED event received', log.DEBUG)
         radio.handlePlaylistChange()
 
+    elif event_type == event.RESUMED:
+        log.message('RESUMED event received', log.DEBUG)
+        radio.handleResumed()
+
+    elif event_type == event.NETWORK_CHANGED:
+        log.message('NETWORK_CHANGED event received', log.DEBUG)
+        radio.handleNetworkChange()
+
     radioEvent.clear()
     return
 
@@ -38,6 +38,7 @@ from threading import Timer
 from config_class import Configuration
 from ir_daemon import Daemon
 from log_class import Log
+from command_runner_class import runner
 
 log = Log()
 IR_LED=11   # GPIO 11 pin 23
@@ -341,8 +342,7 @@ class RemoteDaemon(Daemon):
 
 # Execute system command
 def execCommand(cmd):
-    p = os.popen(cmd)
-    return  p.readline().rstrip('\n')
+    return runner.execCommand(cmd)
 
 # Print usage
 def usage():
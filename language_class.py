@@ -19,6 +19,7 @@ import os
 import sys
 import threading
 from log_class import Log
+from command_runner_class import runner
 import configparser
 
 log = Log()
@@ -229,9 +230,8 @@ class Language:
         return
 
     # Execute system command
-    def execCommand(self,cmd):
-        p = os.popen(cmd)
-        return  p.readline().rstrip('\n')
+    def execCommand(self,cmd,wait=True):
+        return runner.execCommand(cmd, wait=wait)
 
 
 # Test Language class
@@ -21,14 +21,48 @@
 #
 #  See https://docs.python.org/2/library/logging.html
 #
+# Each log file has one persistent handler, opened at the first message and
+# rotated by size. Log.message only puts the record in a queue; a listener
+# thread per file formats and writes it, so that the SD card is never
+# accessed from the caller's thread.
+#
 
+import atexit
+import collections
 import configparser
 import logging
+import logging.handlers
+import os
+import queue
 import sys
+import threading
+import time
+import weakref
 
 config = configparser.ConfigParser()
 
 ConfigFile = "/etc/radiod.conf"
+LogDirectory = "/var/log/radiod"
+
+# Size based rotation of the log files
+MAX_BYTES = 1024 * 1024
+BACKUP_COUNT = 2
+
+# Log file path -> (queue handler, file handler, listener)
+_handlers = {}
+_handlers_lock = threading.Lock()
+
+# Diagnostic ring buffer of the last records, shared by all the modules:
+# (time, level, module, message) tuples, the oldest dropped when full
+RING_SIZE = 500
+_ring = collections.deque(maxlen=RING_SIZE)
+_ring_level = None  # Lowest level kept in the buffer, None for the log level
+
+# loglevel option read by getConfig: (configuration file mtime, level)
+_config_cache = None
+
+# Initialised Log instances, updated by reload
+_instances = weakref.WeakSet()
 
 
 class Log:
@@ -43,6 +77,7 @@ class Log:
     module = ""  # Module name for log entries
     loglevel = logging.INFO
     sMessage = ""  # Duplicate message prevention
+    sArgs = ()
 
     def __init__(self):
         return
@@ -51,6 +86,8 @@ class Log:
         """Initialise log and set module name (usually "radio")."""
         self.module = module
         self.loglevel = self.getConfig()
+        self.getBufferConfig()
+        _instances.add(self)
         self._console_output = console_output
         if console_output:
             logger = logging.getLogger("gipiod")
@@ -68,40 +105,92 @@ class Log:
         """Get module name (usually "radio") to check if initialised."""
         return self.module
 
-    def message(self, message: str, level: int) -> None:
-        """Print message."""
-        if level != self.NONE and message != self.sMessage:
-            try:
-                logger = logging.getLogger("gipiod")
-                hdlr = logging.FileHandler("/var/log/radiod/" + self.module + ".log")
-                formatter = logging.Formatter("%(asctime)s %(levelname)s %(message)s")
-                hdlr.setFormatter(formatter)
-                logger.addHandler(hdlr)
-                logger.setLevel(self.loglevel)
-
-                # write to log
-                if level == self.CRITICAL:
-                    logger.critical(message)
-                elif level == self.ERROR:
-                    logger.error(message)
-                elif level == self.WARNING:
-                    logger.warning(message)
-                elif level == self.INFO:
-                    logger.info(message)
-                elif level == self.DEBUG:
-                    logger.debug(message)
-
-                logger.removeHandler(hdlr)
-                hdlr.close()
-                self.sMessage = message
-
-            except Exception as e:
-                print(str(e))
+    def message(self, message: str, level: int, *args) -> None:
+        """Print message.
+
+        With ``args``, ``message`` is a %-format string that is only
+        formatted if the level is enabled, eg:
+        ``log.message("volume.set %d", log.DEBUG, volume)``.
+
+        """
+        if not self.isEnabledFor(level):
+            return
+        if message == self.sMessage and args == self.sArgs:
+            return
+        try:
+            if level >= self._fileLevel():
+                logger = _getLogger(self.module)
+                logger.log(level, message, *args)
+            if level >= self._ringLevel():
+                text = message % args if args else str(message)
+                _ring.append((time.time(), level, self.module, text))
+            self.sMessage = message
+            self.sArgs = args
+
+        except Exception as e:
+            print(str(e))
         return
 
+    def isEnabledFor(self, level: int) -> bool:
+        """Tell if a message of this level would be written or kept."""
+        return level != self.NONE and (
+            level >= self._fileLevel() or level >= self._ringLevel()
+        )
+
+    def _fileLevel(self) -> int:
+        """Give the lowest level written to the log file."""
+        # Level NONE in the configuration leaves the threshold to the root
+        # logger (WARNING), as logger.setLevel(NONE) did
+        return self.loglevel or logging.WARNING
+
+    def _ringLevel(self) -> int:
+        """Give the lowest level kept in the ring buffer."""
+        if not _ring.maxlen:
+            return sys.maxsize  # Buffer disabled
+        if _ring_level is None:
+            return self._fileLevel()
+        return _ring_level
+
+    def dump(self, count: int | None = None, max_bytes: int | None = None) -> str:
+        """Give the last records of the ring buffer, one per line.
+
+        Parameters
+        ----------
+        count : int | None, optional
+            Number of records, all of them if None.
+        max_bytes : int | None, optional
+            The oldest records are left out so that the text fits in this
+            size (eg a UDP datagram).
+
+        """
+        records = list(_ring)
+        if count is not None:
+            records = records[-count:] if count > 0 else []
+        lines = []
+        size = 0
+        for created, level, module, text in reversed(records):
+            line = "%s.%03d %s %s %s" % (
+                time.strftime("%H:%M:%S", time.localtime(created)),
+                int(created * 1000) % 1000,
+                logging.getLevelName(level),
+                module,
+                text,
+            )
+            size += len(line.encode()) + 1
+            if max_bytes is not None and size > max_bytes:
+                break
+            lines.append(line)
+        return "\n".join(reversed(lines))
+
     # Truncate the log file
     def truncate(self):
-        logging.FileHandler("/var/log/radiod/" + self.module + ".log", "w")
+        path = _logPath(self.module)
+        try:
+            # The file handler appends, so it carries on at the new end
+            with open(path, "w"):
+                pass
+        except OSError as e:
+            print(str(e))
         return
 
     # Temporary set log level
@@ -113,13 +202,55 @@ class Log:
     def getLevel(self):
         return self.loglevel
 
+    # Read the log options again after a change of the configuration file
+    # and apply them to all the initialised Log instances
+    def reload(self):
+        loglevel = self.getConfig()
+        self.getBufferConfig()
+        for instance in list(_instances):
+            instance.loglevel = loglevel
+        return
+
+    # Get the ring buffer options, read by getConfig
+    # log_buffer_size is the number of records kept (0 disables the buffer)
+    # log_buffer_level is the lowest level kept, the loglevel if not set
+    def getBufferConfig(self):
+        global _ring, _ring_level
+        section = "RADIOD"
+        size = RING_SIZE
+        level = None
+        try:
+            if config.has_option(section, "log_buffer_size"):
+                size = max(0, config.getint(section, "log_buffer_size"))
+            if config.has_option(section, "log_buffer_level"):
+                level = self._levelOf(config.get(section, "log_buffer_level"))
+                if level == self.NONE:
+                    size = 0
+        except ValueError as e:
+            self.message("log_buffer_size: " + str(e), self.ERROR)
+
+        if size != _ring.maxlen:
+            _ring = collections.deque(_ring, maxlen=size)
+        _ring_level = level
+        return
+
     # Get configuration loglevel option
+    # The file is only read again if it has been modified since the last call
     def getConfig(self):
+        global _config_cache
         section = "RADIOD"
         option = "loglevel"
         strLogLevel = "INFO"
 
+        try:
+            mtime = os.stat(ConfigFile).st_mtime_ns
+        except OSError:
+            mtime = None
+        if _config_cache is not None and _config_cache[0] == mtime:
+            return _config_cache[1]
+
         # Get loglevel option
+        config.clear()
         config.read(ConfigFile)
         try:
             strLogLevel = config.get(section, option)
@@ -128,6 +259,12 @@ class Log:
             msg = configparser.NoSectionError(section), "in", ConfigFile
             self.message(msg, self.ERROR)
 
+        loglevel = self._levelOf(strLogLevel)
+        _config_cache = (mtime, loglevel)
+        return loglevel
+
+    # Convert a level name to its value
+    def _levelOf(self, strLogLevel):
         if strLogLevel == "CRITICAL":
             loglevel = self.CRITICAL
         elif strLogLevel == "ERROR":
@@ -145,6 +282,52 @@ class Log:
         return loglevel
 
 
+def _logPath(module: str) -> str:
+    """Give the log file of a module name."""
+    return LogDirectory + "/" + module + ".log"
+
+
+def _getLogger(module: str) -> logging.Logger:
+    """Give the logger of a module, writing to its file through a queue.
+
+    The messages still propagate to the "gipiod" logger for the console
+    output.
+
+    """
+    logger = logging.getLogger("gipiod." + module)
+    path = _logPath(module)
+    if path in _handlers:
+        return logger
+
+    with _handlers_lock:
+        if path not in _handlers:
+            # Opened here so that an error is reported to the caller
+            file_handler = logging.handlers.RotatingFileHandler(
+                path, maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT
+            )
+            file_handler.setFormatter(
+                logging.Formatter("%(asctime)s %(levelname)s %(message)s")
+            )
+            records = queue.SimpleQueue()
+            queue_handler = logging.handlers.QueueHandler(records)
+            listener = logging.handlers.QueueListener(records, file_handler)
+            listener.start()
+            atexit.register(_stopListener, listener, file_handler)
+
+            logger.setLevel(logging.DEBUG)  # Filtered by Log.message
+            logger.addHandler(queue_handler)
+            _handlers[path] = (queue_handler, file_handler, listener)
+    return logger
+
+
+def _stopListener(
+    listener: logging.handlers.QueueListener, file_handler: logging.Handler
+) -> None:
+    """Write the queued records and close the file, at exit."""
+    listener.stop()
+    file_handler.close()
+
+
 def _console_handler(
     output: str, level: str, color: bool, line_template: str
 ) -> logging.Handler:
@@ -187,3 +370,59 @@ class LogFormatter(logging.Formatter):
             record.color_on = ""
             record.color_off = ""
         return super().format(record, *args, **kwargs)
+
+
+# Micro-benchmark of a DEBUG message on a hot path, with the level at INFO
+if __name__ == "__main__":
+    import tempfile
+    import timeit
+
+    LogDirectory = tempfile.mkdtemp()
+    log = Log()
+    log.module = "benchmark"
+    log.setLevel(Log.INFO)
+    new_id, current_id = 12, 11
+    count = 100000
+
+    eager = timeit.timeit(
+        lambda: log.message(
+            "radio.getCurrentID New ID " + str(new_id) + " id:" + str(current_id),
+            log.DEBUG,
+        ),
+        number=count,
+    )
+    lazy = timeit.timeit(
+        lambda: log.message(
+            "radio.getCurrentID New ID %s id:%s", log.DEBUG, new_id, current_id
+        ),
+        number=count,
+    )
+    guarded = timeit.timeit(
+        lambda: log.isEnabledFor(log.DEBUG)
+        and log.message("Volume event:%s", log.DEBUG, str(new_id)),
+        number=count,
+    )
+    print(f"Concatenated: {eager / count * 1e9:.0f}ns per call")
+    print(f"Deferred:     {lazy / count * 1e9:.0f}ns per call")
+    print(f"Guarded:      {guarded / count * 1e9:.0f}ns per call")
+
+    # DEBUG kept in the ring buffer only, as with log_buffer_level=DEBUG
+    _ring_level = Log.DEBUG
+    for volume in range(RING_SIZE + 10):
+        log.message("volume.set %s store %s", log.DEBUG, volume, True)
+    ids = iter(range(count))  # Every message differs from the previous one
+    buffered = timeit.timeit(
+        lambda: log.message(
+            "radio.getCurrentID New ID %s id:%s", log.DEBUG, next(ids), current_id
+        ),
+        number=count,
+    )
+    print(f"Buffered:     {buffered / count * 1e9:.0f}ns per call")
+    print(log.dump(3))
+    assert log.dump(1).endswith(f"{count - 1} id:11") and len(_ring) == RING_SIZE
+    assert len(log.dump(max_bytes=1000)) <= 1000
+    _ring_level = None
+
+    log.setLevel(Log.DEBUG)
+    log.message("Deferred %s written at %s", log.DEBUG, "message", "DEBUG")
+    print(f"Written to {_logPath(log.module)}")
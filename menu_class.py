@@ -40,6 +40,11 @@ class Menu:
 
     menu_mode = MENU_TIME
 
+    # Search modes in MENU_SEARCH, what the tuner knob does
+    SEARCH_TRACKS = 0   # Step through the tracks or stations
+    SEARCH_LETTERS = 1  # Jump to the next first letter (letter_search)
+    search_mode = SEARCH_TRACKS
+
     # Menu options in MENU_OPTIONS mode
     OPTION_RANDOM = 0
     OPTION_CONSUME = 1
@@ -76,6 +81,7 @@ class Menu:
         self.menu_mode += 1
         if self.menu_mode > self.MENU_LAST:
             self.menu_mode = self.MENU_TIME
+        self.search_mode = self.SEARCH_TRACKS
         return self.menu_mode
 
     # Mode string for debugging
@@ -85,8 +91,17 @@ class Menu:
     # Set menu mode
     def set(self,menu_mode):
         self.menu_mode = menu_mode
+        self.search_mode = self.SEARCH_TRACKS
         return self.menu_mode
 
+    # Get the search mode (SEARCH_TRACKS or SEARCH_LETTERS)
+    def getSearchMode(self):
+        return self.search_mode
+
+    # Set the search mode
+    def setSearchMode(self,search_mode):
+        self.search_mode = search_mode
+
     # get menu mode
     def get(self):
         return self.menu_mode
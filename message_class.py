@@ -164,7 +164,7 @@ class Message:
             self.speech_text = ''
         try: 
             if self.speech and len(text) > 1 and text != self.speech_text:
-                if not self.radio.spotify.isRunning() and not self.radio.airplay.isRunning():
+                if not self.radio.receiverRunning():
                     volume = self.radio.getVolume()/2
                     volume = (volume * config.speech_volume/100)
                     if volume < 5:
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""Define a resilient connection to MPD.
+
+:meth:`.Radio.reconnect` used to throw the client away and sleep on the main
+thread before connecting a new one, and :meth:`.Radio.connect` slept 2.5 s
+per retry; a bad stream could freeze the buttons and the display for seconds.
+
+:class:`MpdConnection` is used like an :class:`mpd.MPDClient`, but it owns a
+background thread that (re)connects with an exponential backoff and checks the
+health of the connection with ``ping``. A command issued while the connection
+is down waits for it for a bounded time, then raises
+:class:`mpd.ConnectionError`; it never blocks the caller longer than that.
+
+"""
+import socket
+import threading
+import time
+
+import mpd
+from log_class import Log
+
+log = Log()
+
+# Errors after which the connection cannot be trusted any more (a timeout in
+# the middle of a response leaves the protocol out of sync)
+CONNECTION_ERRORS = (mpd.ConnectionError, mpd.ProtocolError, OSError, socket.timeout)
+
+
+class Backoff:
+    """Give exponentially growing delays between retries."""
+
+    def __init__(self, initial: float = 0.25, maximum: float = 8.0) -> None:
+        """Create the backoff.
+
+        Parameters
+        ----------
+        initial : float, optional
+            First delay in seconds.
+        maximum : float, optional
+            Delays are doubled until they reach this value.
+
+        """
+        self.initial = initial
+        self.maximum = maximum
+        self._delay = initial
+
+    def next(self) -> float:
+        """Give the next delay and double the following one."""
+        delay = self._delay
+        self._delay = min(self._delay * 2, self.maximum)
+        return delay
+
+    def reset(self) -> None:
+        """Start again from the initial delay, after a success."""
+        self._delay = self.initial
+
+
+class MpdConnection:
+    """Proxy of :class:`mpd.MPDClient` that reconnects in the background."""
+
+    def __init__(
+        self,
+        port: int,
+        host: str = "localhost",
+        timeout: float = 10,
+        wait: float = 1.0,
+        health_interval: float = 15.0,
+    ) -> None:
+        """Create the connection; call :meth:`start` to connect.
+
+        Parameters
+        ----------
+        port : int
+            MPD port.
+        host : str, optional
+            MPD host.
+        timeout : float, optional
+            Socket timeout of the commands in seconds.
+        wait : float, optional
+            Maximum time in seconds that commands wait for a reconnection
+            after the connection was lost. Once this time has passed,
+            commands fail straight away until the connection is back.
+        health_interval : float, optional
+            A ``ping`` is sent when no command was sent for this time.
+
+        """
+        if len(log.getName()) < 1:
+            log.init("radio")
+        self.port = port
+        self.host = host
+        self.timeout = timeout
+        self.wait = wait
+        self.health_interval = health_interval
+
+        #: Serializes the commands; also held for a whole command list
+        self.lock = threading.RLock()
+        self._client = mpd.MPDClient()
+        self._connected = threading.Event()
+        self._wakeup = threading.Event()
+        self._down_since = time.monotonic()
+        self._last_command = 0.0
+        self._backoff = Backoff()
+        self._stopping = False
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        """Start the background thread, which connects straight away."""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="mpd_connection", daemon=True
+            )
+            self._thread.start()
+
+    def close(self) -> None:
+        """Stop the background thread and disconnect.
+
+        Not named ``stop``, which is the MPD command to stop playing.
+
+        """
+        self._stopping = True
+        self._wakeup.set()
+        self._drop()
+
+    def isConnected(self) -> bool:
+        """Tell if the connection is up."""
+        return self._connected.is_set()
+
+    def waitConnected(self, timeout: float | None = None) -> bool:
+        """Block until connected or timeout; give the connection status."""
+        return self._connected.wait(timeout)
+
+    def reconnect(self) -> None:
+        """Drop the connection; it is re-established in the background."""
+        log.message("mpd_connection.reconnect", log.DEBUG)
+        self._drop()
+
+    def disconnect(self) -> None:
+        """Alias of :meth:`reconnect`, for code written for MPDClient."""
+        self.reconnect()
+
+    def __getattr__(self, name: str):
+        """Give the MPD command ``name``, run under the connection lock."""
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if not callable(getattr(mpd.MPDClient, name, None)):
+            raise AttributeError(name)
+
+        def command(*args):
+            self._waitForConnection(name)
+            with self.lock:
+                try:
+                    result = getattr(self._client, name)(*args)
+                except CONNECTION_ERRORS as e:
+                    log.message(f"mpd_connection.{name}: {e}", log.ERROR)
+                    self._drop()
+                    raise mpd.ConnectionError(str(e)) from e
+                self._last_command = time.monotonic()
+                return result
+
+        command.__name__ = name
+        return command
+
+    def _waitForConnection(self, name: str) -> None:
+        """Wait a bounded time for the connection, or raise."""
+        if self._connected.is_set():
+            return
+        remaining = self.wait - (time.monotonic() - self._down_since)
+        if remaining > 0 and self._connected.wait(remaining):
+            return
+        raise mpd.ConnectionError(f"Not connected ({name})")
+
+    def _drop(self) -> None:
+        """Mark the connection as down and close the socket."""
+        with self.lock:
+            if self._connected.is_set():
+                self._connected.clear()
+                self._down_since = time.monotonic()
+            try:
+                self._client.disconnect()
+            except Exception:
+                pass
+        self._wakeup.set()
+
+    def _connect(self) -> None:
+        """Open a new connection."""
+        client = mpd.MPDClient()
+        client.timeout = self.timeout
+        client.idletimeout = None
+        client.connect(self.host, self.port)
+        with self.lock:
+            self._client = client
+            self._last_command = time.monotonic()
+            self._connected.set()
+        self._backoff.reset()
+        log.message(f"Connected to MPD port {self.port}", log.INFO)
+
+    def _run(self) -> None:
+        """Connect with backoff, then check the health of the connection."""
+        while not self._stopping:
+            self._wakeup.clear()
+            if not self._connected.is_set():
+                try:
+                    self._connect()
+                    continue
+                except Exception as e:
+                    delay = self._backoff.next()
+                    log.message(
+                        f"mpd_connection: connect failed: {e}, retry in {delay}s",
+                        log.ERROR,
+                    )
+                    self._wakeup.wait(delay)
+                    continue
+
+            idle_time = time.monotonic() - self._last_command
+            if idle_time >= self.health_interval:
+                try:
+                    with self.lock:
+                        self._client.ping()
+                        self._last_command = time.monotonic()
+                except Exception as e:
+                    log.message(f"mpd_connection: ping failed: {e}", log.ERROR)
+                    self._drop()
+                    continue
+                idle_time = 0.0
+            self._wakeup.wait(self.health_interval - idle_time)
+        log.message("mpd_connection stopped", log.DEBUG)
+
+
+if __name__ == "__main__":
+    import sys
+
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 6600
+    connection = MpdConnection(port, wait=2.0, health_interval=5.0)
+    connection.start()
+    print(f"Connected: {connection.waitConnected(5)}")
+    try:
+        while True:
+            try:
+                print(connection.status().get("state"))
+            except mpd.ConnectionError as e:
+                print(f"Error: {e}")
+            time.sleep(1)
+    except KeyboardInterrupt:
+        connection.close()
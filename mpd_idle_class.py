@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""Define a listener of MPD ``idle`` notifications on its own connection.
+
+The main thread connection is used for commands only (``play``, ``setvol``,
+...) and must never block in ``idle``. :class:`IdleListener` keeps a second
+connection that waits for changes of the ``player``, ``mixer``, ``playlist``,
+``options``, ``update`` and ``output`` subsystems. After each notification it
+refreshes a :class:`PlayerModel`, and posts an event to the main loop when
+the current song or the player state has changed.
+
+"""
+import threading
+import time
+from collections.abc import Callable
+
+import mpd
+from log_class import Log
+from mpd_connection_class import Backoff
+
+log = Log()
+
+SUBSYSTEMS = ("player", "mixer", "playlist", "options", "update", "output")
+
+# Subsystems after which status and currentsong must be fetched again
+STATUS_SUBSYSTEMS = ("player", "mixer", "playlist", "options", "update")
+SONG_SUBSYSTEMS = ("player", "playlist")
+
+
+def _to_int(value: str | None, default: int = 0) -> int:
+    """Convert an MPD value to int."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _to_float(value: str | None, default: float = 0.0) -> float:
+    """Convert an MPD value to float."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class PlayerModel:
+    """In-memory copy of the MPD player state.
+
+    The typed fields are parsed once per idle update. The raw ``status`` and
+    ``currentsong`` dictionaries are also kept, so that they can be handed to
+    the existing getters of :class:`.Radio` (see :class:`.PlayerState`).
+
+    """
+
+    def __init__(self) -> None:
+        """Create an empty model."""
+        self._lock = threading.Lock()
+        self._status: dict = {}
+        self._currentsong: dict = {}
+        self._stamp = time.monotonic()
+        #: Incremented at every refresh of the model
+        self.generation = 0
+
+        #: Player state: ``"play"``, ``"pause"`` or ``"stop"``
+        self.state = "stop"
+        #: Id and position in the queue of the current song
+        self.songid: int | None = None
+        self.song: int | None = None
+        #: MPD volume, -1 if there is no mixer
+        self.volume = -1
+        #: Duration of the current song in seconds, 0 for streams
+        self.duration = 0.0
+        #: Bit rate in kbps
+        self.bitrate = 0
+        #: Error reported by MPD, if any
+        self.error: str | None = None
+        #: The ``random``, ``repeat``, ``single`` and ``consume`` flags
+        self.options = dict.fromkeys(("random", "repeat", "single", "consume"), False)
+        #: Version of the queue, incremented by MPD at every change
+        self.playlist_version = 0
+        #: Number of entries in the queue
+        self.playlist_length = 0
+        #: A database update is running
+        self.updating_db = False
+        #: Title and stream name of the current song
+        self.title = ""
+        self.name = ""
+        self._elapsed = 0.0
+
+    def update(self, status: dict | None, currentsong: dict | None) -> None:
+        """Store new responses; None keeps the previous value."""
+        with self._lock:
+            if status is not None:
+                self._status = status
+                self._stamp = time.monotonic()
+                self._parseStatus(status)
+            if currentsong is not None:
+                self._currentsong = currentsong
+                self.title = currentsong.get("title", "")
+                self.name = currentsong.get("name", "")
+            self.generation += 1
+
+    def _parseStatus(self, status: dict) -> None:
+        """Fill the typed fields of ``status``, with the lock held."""
+        self.state = status.get("state", "stop")
+        songid = status.get("songid")
+        self.songid = None if songid is None else _to_int(songid)
+        song = status.get("song")
+        self.song = None if song is None else _to_int(song)
+        self.volume = _to_int(status.get("volume"), -1)
+        self._elapsed = _to_float(status.get("elapsed"))
+        self.duration = _to_float(status.get("duration"))
+        self.bitrate = _to_int(status.get("bitrate"))
+        self.error = status.get("error")
+        self.options = {
+            option: status.get(option, "0") == "1"
+            for option in ("random", "repeat", "single", "consume")
+        }
+        self.playlist_version = _to_int(status.get("playlist"))
+        self.playlist_length = _to_int(status.get("playlistlength"))
+        self.updating_db = "updating_db" in status
+
+    @property
+    def elapsed(self) -> float:
+        """Elapsed time of the current song in seconds, extrapolated."""
+        with self._lock:
+            elapsed = self._elapsed
+            if self.state == "play":
+                elapsed += time.monotonic() - self._stamp
+        if self.duration > 0:
+            elapsed = min(elapsed, self.duration)
+        return elapsed
+
+    def status(self) -> dict:
+        """Give a copy of ``status`` with the elapsed time extrapolated."""
+        with self._lock:
+            status = dict(self._status)
+            stamp = self._stamp
+
+        if status.get("state") == "play" and "elapsed" in status:
+            elapsed = _to_float(status["elapsed"]) + time.monotonic() - stamp
+            duration = _to_float(status.get("duration"))
+            if duration > 0:
+                elapsed = min(elapsed, duration)
+            status["elapsed"] = "%.3f" % elapsed
+            if "time" in status:
+                total = status["time"].split(":")[-1]
+                status["time"] = "%d:%s" % (int(elapsed), total)
+        return status
+
+    def currentsong(self) -> dict:
+        """Give a copy of ``currentsong``."""
+        with self._lock:
+            return dict(self._currentsong)
+
+
+class IdleListener(threading.Thread):
+    """Wait for MPD changes on a dedicated connection."""
+
+    def __init__(
+        self,
+        port: int,
+        event,
+        playlist_callback: Callable[[mpd.MPDClient, bool], None] | None = None,
+        timeout: float = 10,
+    ) -> None:
+        """Create the listener; call :meth:`start` to run it.
+
+        Parameters
+        ----------
+        port : int
+            MPD port on localhost.
+        event : Event
+            Main loop events; a change of song or player state is posted as
+            ``MPD_CLIENT_CHANGE``.
+        playlist_callback : Callable[[mpd.MPDClient, bool], None] | None, optional
+            Called with the idle connection when the queue changes, and at
+            (re)connection with ``False`` as second argument to take an
+            initial snapshot without reporting a change. It runs in the
+            listener thread and must not use the main connection.
+        timeout : float, optional
+            Socket timeout in seconds for the commands (not for ``idle``).
+
+        """
+        if len(log.getName()) < 1:
+            log.init("radio")
+        super().__init__(name="mpd_idle", daemon=True)
+        self.port = port
+        self.event = event
+        self.playlist_callback = playlist_callback
+        self.timeout = timeout
+        self.model = PlayerModel()
+        self.client: mpd.MPDClient | None = None
+        self._synced = threading.Event()
+        self._stopping = False
+
+    @property
+    def ready(self) -> bool:
+        """Tell if the model is in sync with MPD."""
+        return self._synced.is_set()
+
+    def stop(self) -> None:
+        """Stop listening. A pending ``idle`` is aborted."""
+        self._stopping = True
+        self._synced.clear()
+        client = self.client
+        if client is not None:
+            try:
+                client.disconnect()
+            except Exception:
+                pass
+
+    def run(self) -> None:
+        """Connect, synchronize the model, then wait for changes."""
+        backoff = Backoff(initial=1.0, maximum=30.0)
+        while not self._stopping:
+            try:
+                self._connect()
+                self._refresh(SUBSYSTEMS)
+                self._synced.set()
+                backoff.reset()
+                log.message("mpd_idle: listening to " + ", ".join(SUBSYSTEMS), log.INFO)
+
+                while not self._stopping:
+                    changed = self.client.idle(*SUBSYSTEMS)
+                    self._refresh(changed)
+
+            except Exception as e:
+                self._synced.clear()
+                if self._stopping:
+                    break
+                delay = backoff.next()
+                log.message(f"mpd_idle: {e}, retry in {delay:.0f}s", log.ERROR)
+                self._disconnect()
+                time.sleep(delay)
+
+        self._disconnect()
+
+    def _connect(self) -> None:
+        """Open the idle connection."""
+        self.client = mpd.MPDClient()
+        self.client.timeout = self.timeout
+        self.client.idletimeout = None
+        self.client.connect("localhost", self.port)
+
+    def _disconnect(self) -> None:
+        """Close the idle connection, ignoring errors."""
+        if self.client is None:
+            return
+        try:
+            self.client.disconnect()
+        except Exception:
+            pass
+        self.client = None
+
+    def _refresh(self, changed: list[str] | tuple[str, ...]) -> None:
+        """Update the model after a change and tell the main loop."""
+        status = None
+        currentsong = None
+        songid, state = self.model.songid, self.model.state
+        if any(subsystem in STATUS_SUBSYSTEMS for subsystem in changed):
+            status = self.client.status()
+        if any(subsystem in SONG_SUBSYSTEMS for subsystem in changed):
+            currentsong = self.client.currentsong()
+        self.model.update(status, currentsong)
+
+        log.message("mpd_idle: changed " + ", ".join(changed), log.DEBUG)
+        synced = self._synced.is_set()
+        if "playlist" in changed and self.playlist_callback is not None:
+            self.playlist_callback(self.client, synced)
+        # Not at each volume step: only what the display has to follow
+        if synced and (self.model.songid != songid or self.model.state != state):
+            self.event.post(self.event.MPD_CLIENT_CHANGE)
+
+
+if __name__ == "__main__":
+
+    class _PrintEvent:
+        """Print the posted events."""
+
+        MPD_CLIENT_CHANGE = 14
+
+        def post(self, event_type: int) -> None:
+            print(f"event {event_type}")
+
+    listener = IdleListener(6600, _PrintEvent())
+    listener.start()
+    try:
+        while True:
+            time.sleep(1)
+            model = listener.model
+            print(
+                f"{listener.ready = } {model.state = } {model.volume = } "
+                f"elapsed={model.elapsed:.1f} {model.bitrate = } {model.title = }"
+            )
+    except KeyboardInterrupt:
+        listener.stop()
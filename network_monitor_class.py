@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""Define a background monitor of the Internet connectivity.
+
+:meth:`.Radio.checkInternet` used to open a blocking TCP connection to
+``internet_check_url`` from the main thread every 1.5 s, and to sleep one
+second when it failed. :class:`NetworkMonitor` runs the probe in its own
+thread and publishes the result as a cached boolean; callers never block.
+
+On Linux, the thread listens to netlink route/link/address events, so that a
+cable unplugged or a Wi-Fi reconnection is noticed straight away. The probe
+is also run periodically, as netlink cannot tell about an upstream outage,
+and it is the only mechanism where netlink is not available.
+
+"""
+import select
+import socket
+import threading
+import time
+from collections.abc import Callable
+
+from log_class import Log
+
+log = Log()
+
+# rtnetlink multicast groups (linux/rtnetlink.h)
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV4_ROUTE = 0x40
+RTMGRP_IPV6_IFADDR = 0x100
+RTMGRP_IPV6_ROUTE = 0x400
+NETLINK_GROUPS = (
+    RTMGRP_LINK
+    | RTMGRP_IPV4_IFADDR
+    | RTMGRP_IPV4_ROUTE
+    | RTMGRP_IPV6_IFADDR
+    | RTMGRP_IPV6_ROUTE
+)
+
+
+class NetworkMonitor(threading.Thread):
+    """Probe the Internet connection in the background."""
+
+    def __init__(
+        self,
+        host: str,
+        port: int = 80,
+        timeout: float = 10,
+        callback: Callable[[bool], None] | None = None,
+        online_interval: float = 30.0,
+        offline_interval: float = 3.0,
+    ) -> None:
+        """Create the monitor; call :meth:`start` to run it.
+
+        Parameters
+        ----------
+        host : str
+            Host to connect to. If empty, the connection is always reported as
+            up and no thread is needed.
+        port : int, optional
+            TCP port of ``host``.
+        timeout : float, optional
+            Timeout of one probe in seconds. It only applies to the probe
+            socket, not to the whole process.
+        callback : Callable[[bool], None] | None, optional
+            Called from the monitor thread with the state found by the first
+            probe, then with the new state each time the connectivity
+            changes.
+        online_interval : float, optional
+            Delay between two probes while the connection is up.
+        offline_interval : float, optional
+            Delay between two probes while the connection is down.
+
+        """
+        if len(log.getName()) < 1:
+            log.init("radio")
+        super().__init__(name="network_monitor", daemon=True)
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.callback = callback
+        self.online_interval = online_interval
+        self.offline_interval = offline_interval
+
+        self._online = True  # Optimistic until the first probe says otherwise
+        self._published = False  # The first probe result is always published
+        self._error = ""
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._stopping = False
+
+    def isOnline(self) -> bool:
+        """Give the last known connectivity; never blocks."""
+        return self._online
+
+    def getError(self) -> str:
+        """Give the error of the last failed probe."""
+        return self._error
+
+    def check(self) -> None:
+        """Ask for a probe now, eg after a stream failed to play."""
+        try:
+            self._wakeup_w.send(b"x")
+        except OSError:
+            pass
+
+    def stop(self) -> None:
+        """Stop the monitor thread; it closes its sockets as it ends."""
+        self._stopping = True
+        self.check()
+        if not self.is_alive():
+            self._closeWakeup()
+
+    def _closeWakeup(self) -> None:
+        """Close the sockets used to wake the thread up."""
+        self._wakeup_r.close()
+        self._wakeup_w.close()
+
+    def probe(self) -> bool:
+        """Try to connect to the check host; blocks for ``timeout`` at most."""
+        try:
+            with socket.create_connection((self.host, self.port), self.timeout):
+                pass
+            self._error = ""
+            return True
+        except OSError as e:
+            self._error = str(e)
+            return False
+
+    def run(self) -> None:
+        """Probe, then wait for a netlink event, a check request or timeout."""
+        if len(self.host) < 1:
+            self._closeWakeup()
+            return
+
+        netlink = self._openNetlink()
+        sockets = [self._wakeup_r] + ([netlink] if netlink is not None else [])
+
+        while not self._stopping:
+            self._update(self.probe())
+            interval = self.online_interval if self._online else self.offline_interval
+            readable, _, _ = select.select(sockets, [], [], interval)
+
+            if netlink in readable:
+                self._drain(netlink)
+                # Let DHCP and routes settle after a link change
+                time.sleep(1)
+                self._drain(netlink)
+            if self._wakeup_r in readable:
+                self._drain(self._wakeup_r)
+
+        if netlink is not None:
+            netlink.close()
+        self._closeWakeup()
+
+    def _openNetlink(self) -> socket.socket | None:
+        """Subscribe to the route/link/address changes, if possible."""
+        try:
+            netlink = socket.socket(
+                socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE
+            )
+            netlink.bind((0, NETLINK_GROUPS))
+            netlink.setblocking(False)
+            log.message("network_monitor: using netlink events", log.DEBUG)
+            return netlink
+        except (AttributeError, OSError) as e:
+            log.message(f"network_monitor: no netlink ({e}), probing only", log.INFO)
+            return None
+
+    @staticmethod
+    def _drain(sock: socket.socket) -> None:
+        """Read all the pending data of a non-blocking socket."""
+        try:
+            while sock.recv(65536):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+
+    def _update(self, online: bool) -> None:
+        """Publish the new state, and call the callback if it changed.
+
+        The callback is also called after the first probe, so that a monitor
+        restarted by a configuration reload reports the current state.
+
+        """
+        if online == self._online and self._published:
+            return
+        changed = online != self._online
+        self._online = online
+        self._published = True
+        if online:
+            if changed:
+                log.message("Internet reconnected", log.INFO)
+        else:
+            log.message(f"No Internet connection: {self._error}", log.ERROR)
+            log.message(f"Tried {self.host} port {self.port}", log.ERROR)
+        if self.callback is not None:
+            self.callback(online)
+
+
+if __name__ == "__main__":
+    import sys
+
+    host = sys.argv[1] if len(sys.argv) > 1 else "google.com"
+    monitor = NetworkMonitor(
+        host, callback=lambda online: print(f"Online: {online}"), online_interval=5
+    )
+    monitor.start()
+    try:
+        while True:
+            time.sleep(1)
+            print(f"{monitor.isOnline() = }")
+    except KeyboardInterrupt:
+        monitor.stop()
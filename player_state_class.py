@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""Define a snapshot of the MPD player state shared by all the getters.
+
+Within one pass of the main loop, :class:`.Radio` and :class:`.Volume` used to
+send their own ``status`` or ``currentsong`` command for every value they
+displayed. :class:`PlayerState` fetches each of them at most once, until
+:meth:`PlayerState.invalidate` is called (at every main loop pass of radiod,
+and after commands that change the player). A snapshot is also dropped by
+itself after :data:`MAX_AGE` seconds or when the idle listener reports a
+change, so that the front ends that do not invalidate it (gradio, vgradio)
+still show the current values.
+
+When an :class:`.IdleListener` is attached, the snapshot is taken from its
+model, which MPD keeps up to date through ``idle`` notifications, and no
+command is sent at all on the main connection.
+
+"""
+import time
+
+import mpd
+from log_class import Log
+
+log = Log()
+
+MAX_AGE = 0.5  # Seconds a snapshot is kept without invalidate()
+
+
+class PlayerState:
+    """Cache the MPD ``status`` and ``currentsong`` responses."""
+
+    def __init__(self, client: mpd.MPDClient) -> None:
+        """Create the snapshot.
+
+        Parameters
+        ----------
+        client : mpd.MPDClient
+            The connected client of the main thread.
+
+        """
+        if len(log.getName()) < 1:
+            log.init("radio")
+        self.client = client
+        self.listener = None
+        self._status: dict | None = None
+        self._currentsong: dict | None = None
+        # Time and model generation of the snapshot
+        self._taken = 0.0
+        self._generation = -1
+
+        # Model generation and time of the last command sent by this client:
+        # the model is trusted again once MPD reported a change after it
+        self._command_generation = -1
+        self._command_time = 0.0
+
+        # Number of status/currentsong calls by the getters, and number of
+        # commands really sent to MPD
+        self.requested = 0
+        self.sent = 0
+        self._last_requested = 0
+        self._last_sent = 0
+        self._last_stats_time = time.monotonic()
+
+    def setClient(self, client: mpd.MPDClient) -> None:
+        """Use a new client, after a reconnection."""
+        self.client = client
+        self.invalidate()
+
+    def setListener(self, listener) -> None:
+        """Take the snapshots from the model of an :class:`.IdleListener`."""
+        self.listener = listener
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        """Forget the snapshot; the next getter will fetch it again."""
+        self._status = None
+        self._currentsong = None
+
+    def changed(self) -> None:
+        """Forget the snapshot after a command that changes the player.
+
+        Until the idle listener reports the resulting change (or for one
+        second at most), the snapshot is fetched on the main connection.
+
+        """
+        self.invalidate()
+        if self.listener is not None:
+            self._command_generation = self.listener.model.generation
+            self._command_time = time.monotonic()
+
+    def _expire(self) -> None:
+        """Forget a snapshot that is too old, and date a new one."""
+        generation = self.listener.model.generation if self.listener is not None else -1
+        if self._status is not None or self._currentsong is not None:
+            if generation == self._generation and time.monotonic() - self._taken < MAX_AGE:
+                return
+            self.invalidate()
+        self._taken = time.monotonic()
+        self._generation = generation
+
+    def _useModel(self) -> bool:
+        """Tell if the model of the idle listener is up to date."""
+        if self.listener is None or not self.listener.ready:
+            return False
+        if self.listener.model.generation > self._command_generation:
+            return True
+        return time.monotonic() - self._command_time > 1.0
+
+    def status(self) -> dict:
+        """Give the MPD ``status``, fetched once per snapshot.
+
+        Raises
+        ------
+        mpd.ConnectionError
+            As well as any other exception raised by the MPD client. Nothing
+            is cached in this case, so the next call tries again.
+
+        """
+        self.requested += 1
+        self._expire()
+        if self._status is None:
+            if self._useModel():
+                self._status = self.listener.model.status()
+            else:
+                self.sent += 1
+                self._status = self.client.status()
+        return self._status
+
+    def currentsong(self) -> dict:
+        """Give the MPD ``currentsong``, fetched once per snapshot."""
+        self.requested += 1
+        self._expire()
+        if self._currentsong is None:
+            if self._useModel():
+                self._currentsong = self.listener.model.currentsong()
+            else:
+                self.sent += 1
+                self._currentsong = self.client.currentsong()
+        return self._currentsong
+
+    def getStats(self) -> tuple[float, float]:
+        """Give the status/currentsong rates since the previous call.
+
+        Returns
+        -------
+        tuple[float, float]
+            Commands per second that the getters asked for (what was sent to
+            MPD before the snapshot), and commands per second really sent.
+
+        """
+        now = time.monotonic()
+        elapsed = max(now - self._last_stats_time, 1e-6)
+        requested = (self.requested - self._last_requested) / elapsed
+        sent = (self.sent - self._last_sent) / elapsed
+
+        self._last_stats_time = now
+        self._last_requested = self.requested
+        self._last_sent = self.sent
+        return requested, sent
+
+    def logStats(self) -> None:
+        """Log the MPD commands per second without and with the snapshot."""
+        requested, sent = self.getStats()
+        log.message(
+            f"MPD status/currentsong: {requested:.2f}/s requested, {sent:.2f}/s sent",
+            log.INFO,
+        )
+
+
+if __name__ == "__main__":
+
+    class _FakeClient:
+        """Count the commands instead of talking to MPD."""
+
+        def __init__(self) -> None:
+            self.commands = 0
+
+        def status(self) -> dict:
+            self.commands += 1
+            return {"volume": "50", "time": "12:300", "bitrate": "128"}
+
+        def currentsong(self) -> dict:
+            self.commands += 1
+            return {"pos": "3", "title": "Title", "name": "Station"}
+
+    client = _FakeClient()
+    state = PlayerState(client)
+    for tick in range(10):
+        state.invalidate()
+        # A typical display refresh
+        for _ in range(4):
+            state.status()
+        for _ in range(5):
+            state.currentsong()
+
+    print(f"{state.requested} requested, {state.sent} sent")
+    assert state.requested == 90
+    assert state.sent == client.commands == 20
+
+    # Without invalidate(), the snapshot is fetched again once too old
+    state.status()
+    assert client.commands == 20
+    time.sleep(MAX_AGE)
+    state.status()
+    assert client.commands == 21
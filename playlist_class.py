@@ -19,10 +19,12 @@
 #
 
 import pdb,sys,time
-import threading
 import copy
+from command_list_class import CommandList
+from playlist_index_class import PlaylistIndex
 from translate_class import Translate
 from source_class import Source
+from stream_relay_class import isRelayable, upstreamUrl
 
 translate = Translate()
 source = Source()
@@ -38,12 +40,19 @@ MEDIA = 1
 
 class Playlist:
     config = None
+    relay = None    # Stream relay (stream_relay_class) if enabled
+    store = None    # State store of /var/lib/radiod (state_store_class)
 
     _name = "Radio"  # Default playlist name
     _searchlist = []
     _size = 0   # Playlist size
     _type = 0   # Playlist type RADIO or MEDIA
     _plist = []
+    _version = None # MPD queue version (status 'playlist') of _plist if known
+    _changes = None # Queue positions changed since the search list was created
+                    # None if it must be created again
+    _names = None   # Search names of an MPD stream by queue position
+    _index = None   # Search indexes of the search list (playlist_index_class)
 
     def __init__(self,name,config):
         self.config = config
@@ -75,6 +84,8 @@ class Playlist:
 
     # Update the current playlist. This is called from the top level radio 
     # program in response to a PLAYLIST_CHANGED event
+    # The queue (_plist) is already up to date, see changed(). The search list
+    # of an MPD stream is patched at the changed positions only
     def update(self,client):
         playlist_name = self.getName(CurrentPlaylistName)
         if self._type == RADIO:
@@ -84,7 +95,11 @@ class Playlist:
 
         if len(newlist) > 0:
             self.writePlaylistFile(playlist_name,newlist)
-            self._searchlist = self.createSearchList(client)
+            changes = self._changes
+            if changes is not None and self._names is not None and self._isStream():
+                self._searchlist = self._patchStreamSearchList(self._plist,changes)
+            else:
+                self._searchlist = self.createSearchList(client,self._plist)
         else:
             # Protect playlist file if something goes wrong with client playlist
             print("No records found in new playlist %s" % playlist_name)
@@ -92,6 +107,8 @@ class Playlist:
 
     # Get the current playlist name from the radio lib directory
     def getName(self,filename):
+        if self.store is not None and self.store.keyOf(filename) is not None:
+            return self.store.get(self.store.keyOf(filename))
         f = open(filename,"r")
         playlist_name = f.read()
         f.close()
@@ -120,10 +137,10 @@ class Playlist:
     
                     if '#' in line:
                         x = line.split('#')
-                        url = x[0]
+                        url = upstreamUrl(x[0])
                         name = x[1]
                     else:
-                        url = line 
+                        url = upstreamUrl(line)
                         name = "Radio Station %s" % count
 
                     newlist.append("#EXTM3U")
@@ -136,8 +153,15 @@ class Playlist:
         return newlist
 
     # Write the new RADIO playlist to the MPD playlist directory 
+    # The file is left alone if it has not changed
     def writePlaylistFile(self,playlist_name,newlist):
         playlist_file = PlaylistsDirectory + '/' + playlist_name + '.m3u'
+        try:
+            with open(playlist_file, 'r') as f:
+                if f.read().splitlines() == newlist:
+                    return
+        except Exception:
+            pass
         try:
             with open(playlist_file, 'w') as f:
                 for line in newlist:
@@ -147,30 +171,96 @@ class Playlist:
             print("File update failed: " + str(e))
 
     # Load playlist by name
-    def load(self,client,name):
+    # The clear, load and playlist commands are sent in one command list,
+    # together with the commands already queued in batch if given
+    def load(self,client,name,batch=None):
         try:
             self._name = name
-            client.clear()
-            client.load(name)
-            self._plist = client.playlist()
+            if batch is None:
+                batch = CommandList(client)
+            batch.add("clear")
+            batch.add("load", name)
+            index = batch.add("playlist")
+            status = batch.add("status")
+            results = batch.send()
+            self._plist = results[index]
+            self._version = results[status].get('playlist')
             self._type = self.getType(name)
-            self._searchlist = self.createSearchList(client)
+            if self.relay is not None and self._type == RADIO:
+                self._plist = self.relayPlaylist(client, self._plist)
+            self._searchlist = self.createSearchList(client, self._plist)
             #print("Name=%s Type=%s Size=%s"% (self._name, self._type, self._size))
         except Exception as e:
             print("playlist.load",str(e))
         return self._searchlist
 
+    # Take a radio playlist from the resume cache (resume_cache_class) while
+    # only its current station is in the MPD queue. The queue will be the
+    # entries once the playlist has been loaded behind the station
+    def resume(self,name,entries,searchlist):
+        self._name = name
+        self._type = RADIO
+        self._plist = ['file: ' + entry for entry in entries]
+        self._version = None
+        self._searchlist = list(searchlist)
+        self._size = len(self._searchlist)
+        return self._searchlist
+
+    # The full playlist is in the MPD queue (plist), rebuild the search list
+    # status is the MPD status fetched with plist if known
+    def resumed(self,client,plist,status=None):
+        self._plist = plist
+        self._version = status.get('playlist') if status is not None else None
+        return self.createSearchList(client, plist)
+
+    # Entries of the queue as in the playlist file, for the resume cache
+    @property
+    def entries(self):
+        return [line[len('file: '):] if line.startswith('file: ') else line
+                for line in self._plist]
+
+    # Replace the stations in the MPD queue by their stream relay URLs
+    def relayPlaylist(self,client,plist):
+        batch = CommandList(client)
+        batch.add("clear")
+        urls = []
+        for line in plist:
+            if line.startswith('file: '):
+                line = line[len('file: '):]
+            url = line.split('#')[0]
+            urls.append(url)
+            # Playlists and HLS streams are left to MPD
+            if isRelayable(url):
+                line = line.replace(url, self.relay.url(url), 1)
+            batch.add("add", line)
+        index = batch.add("playlist")
+        status = batch.add("status")
+        results = batch.send()
+        self.relay.setStations(urls)
+        self._version = results[status].get('playlist')
+        return results[index]
+
     # Create search list of tracks or stations
-    def createSearchList(self,client):
-        if self.config.station_names == self.config.STREAM or self._type == source.MEDIA:
-            self._plist = client.playlist()
+    # plist is the client playlist if it has just been fetched
+    def createSearchList(self,client,plist=None):
+        if self._isStream():
+            if plist is None:
+                plist = client.playlist()
+                self._version = None
+            self._plist = plist
             searchlist = self._createStreamSearchList(self._plist)
         else:
+            self._names = None
             searchlist = self._createListSearch()
 
+        self._changes = set()
         self._searchlist = searchlist
         self._size = len(self._searchlist)
         return self._searchlist
+
+    # The search list is made from the MPD stream, not the station list file
+    def _isStream(self):
+        return self.config.station_names == self.config.STREAM or self._type == source.MEDIA
         
     # Create search list from stationlist file
     _name = "Radio"
@@ -197,42 +287,97 @@ class Playlist:
 
     # Create search list from MPD stream
     def _createStreamSearchList(self,plist):
-        searchlist = []
-
-        for line in plist:
-            line = line.strip('file: ')
-            if len(line) < 1:
-                continue
-            if line.startswith("http") and '#' in line:
-                x = line.split('#')
-                url = x[0]
-                name = x[1]
-                name = translate.all(name)
-            else:
-                x = line.split('/')
-                l = len(x)
-                artist = x[1]
-                title = x[l-1]
-                if artist in title:
-                    name = title
-                else:
-                    name = artist + ' - ' + title
-            searchlist.append(name)
+        self._names = [self._streamName(line) for line in plist]
+        searchlist = [name for name in self._names if name is not None]
 
         self._size = len(plist)
 
         return searchlist
 
+    # Patch the search list of the MPD stream after a change of the queue
+    # Only the names at the changed positions are made again
+    def _patchStreamSearchList(self,plist,changes):
+        names = self._names[:len(plist)]
+        for pos in range(len(names),len(plist)):
+            names.append(None)
+            changes.add(pos)
+        for pos in changes:
+            if pos < len(plist):
+                names[pos] = self._streamName(plist[pos])
+        self._names = names
+        self._changes = set()
+        self._size = len(plist)
+        return [name for name in names if name is not None]
+
+    # Get the search name of a queue entry, None if it has none
+    def _streamName(self,line):
+        line = line.strip('file: ')
+        if len(line) < 1:
+            return None
+        if line.startswith("http") and '#' in line:
+            x = line.split('#')
+            url = x[0]
+            name = x[1]
+            name = translate.all(name)
+        else:
+            x = line.split('/')
+            l = len(x)
+            artist = x[1]
+            title = x[l-1]
+            if artist in title:
+                name = title
+            else:
+                name = artist + ' - ' + title
+        return name
+
     # Return searchlist
     @property
     def searchlist(self):
         return self._searchlist
 
+    # Return the search indexes (artists, letters, prefixes) of the searchlist
+    # They are built at the first search in a new searchlist
+    @property
+    def index(self):
+        if self._index is None or self._index.searchlist is not self._searchlist:
+            self._index = PlaylistIndex(self._searchlist)
+        return self._index
+
+    # Return the stream URL of playlist entry index (Starts at 0)
+    def getUrl(self,index):
+        if index < 0 or index >= len(self._plist):
+            return ''
+        line = self._plist[index]
+        if line.startswith('file: '):
+            line = line[len('file: '):]
+        return upstreamUrl(line.split('#')[0])
+
+    # Return the stream URLs of all playlist entries
+    @property
+    def urls(self):
+        return [self.getUrl(index) for index in range(len(self._plist))]
+
     # See if the current playlist has been changed by an external client
-    def changed(self,client):
+    # status is the MPD status just fetched by the caller (idle listener)
+    # Nothing is fetched if the queue version has not changed, only the
+    # entries changed since the version of _plist otherwise (plchanges)
+    def changed(self,client,status=None):
         playlist_changed = False
         try:
-            plist = client.playlist()
+            if status is None:
+                status = client.status()
+            version = status.get('playlist')
+            length = int(status.get('playlistlength', 0))
+            if version is not None and version == self._version \
+                    and length == len(self._plist):
+                return False
+
+            plist,positions = self._fetchChanges(client,length)
+            if positions is None:
+                self._changes = None
+            elif self._changes is not None:
+                self._changes.update(positions)
+            self._version = version
             playlist_size = len(plist)
             if self._size == 0:
                 self._size = playlist_size  # If a clear occured
@@ -252,32 +397,27 @@ class Playlist:
                     
         except Exception as e:
             print("playlist.changed",str(e))
-            sys.exit(1)
+            raise   # Let the idle listener reconnect
 
         return playlist_changed
 
-    # Check for playlist changes and raise event if it changes
-    def _check(self,playlist_callback,client):
-        time.sleep(10) # Prevent spurious events at startup time
-        client.idletimeout = None
-        try:
-            while True:
-                client.idle('playlist')
-                if self.changed(client):
-                    time.sleep(2) # Allow time for MPD_CLIENT_CHANGE to be handled 
-                    self._plist = client.playlist()
-                    playlist_callback()
-        except Exception as e:
-            print("playlist._check error", str(e))
-            #sys.exit(1)
-            pass
-
-    # Callback for playlist size change
-    def callback(self,playlist_callback,client):
-        t = threading.Thread(target=self._check, args=[playlist_callback,client])
-        t.daemon = True  # Important otherwise main thread won't exit
-        t.start()
-        return
+    # Get the MPD queue from _plist and the entries changed since its version
+    # Returns the queue and the changed positions, None if it was all fetched
+    def _fetchChanges(self,client,length):
+        if self._version is None:
+            return client.playlist(), None
+        plist = self._plist[:length]
+        plist += [None] * (length - len(plist))
+        positions = set()
+        for song in client.plchanges(self._version):
+            pos = int(song['pos'])
+            if pos < length:
+                plist[pos] = 'file: ' + song['file']
+                positions.add(pos)
+        if None in plist:
+            # The queue changed again meanwhile, get all of it
+            return client.playlist(), None
+        return plist, positions
 
     # Identify playlist type RADIO or MEDIA 
     def getType(self,playlist_name):
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""Define the indexes used to navigate a large search list.
+
+:meth:`.Radio.findNextArtist` walked the search list one entry at a time and
+split each entry on ``" - "`` until the artist changed, and the search menu
+could only move one entry per step of the tuner knob: a USB library of tens
+of thousands of tracks could hardly be navigated.
+
+:class:`PlaylistIndex` is built once per search list (see
+:attr:`.Playlist.index`) and gives:
+
+* the first entry of each run of consecutive entries of the same artist, for
+  the next and previous artist in O(log n);
+* the entries sorted by name, for the first entry starting with a prefix in
+  O(log n);
+* the first letters of the sorted names with the first entry of each, for the
+  next and previous letter in O(1).
+
+"""
+import unicodedata
+from bisect import bisect_left, bisect_right
+
+from log_class import Log
+
+log = Log()
+
+UNKNOWN_ARTIST = "Unknown artist"
+OTHER = "#"  # Letter of the names that do not start with a letter
+
+
+def artistName(name: str) -> str:
+    """Give the artist of a search list entry ``artist - title``."""
+    sections = name.split(" - ")
+    if len(sections) > 1:
+        return sections[0]
+    return UNKNOWN_ARTIST
+
+
+def sortKey(name: str) -> str:
+    """Give the key of a name in the sorted index: no accent, no case."""
+    name = name.strip().lstrip("\"'")
+    if not name.isascii():
+        name = unicodedata.normalize("NFKD", name)
+        name = "".join(char for char in name if not unicodedata.combining(char))
+    return name.casefold()
+
+
+def firstLetter(key: str) -> str:
+    """Give the letter of a :func:`sortKey`, :data:`OTHER` for a digit..."""
+    if key and key[0].isalpha():
+        return key[0].upper()
+    return OTHER
+
+
+class PlaylistIndex:
+    """Artist runs, sorted names and first letters of a search list."""
+
+    def __init__(self, searchlist: list[str]) -> None:
+        """Build the indexes.
+
+        Parameters
+        ----------
+        searchlist : list[str]
+            Names of the tracks (``artist - title``) or stations, in the
+            order of the playlist. It is not copied and must not change.
+
+        """
+        if len(log.getName()) < 1:
+            log.init("radio")
+        self.searchlist = searchlist
+
+        # First entry of each run of the same artist
+        self._runs: list[int] = []
+        previous = None
+        for index, name in enumerate(searchlist):
+            artist = artistName(name)
+            if artist != previous:
+                self._runs.append(index)
+                previous = artist
+
+        # Entries by sorted name
+        keys = sorted((sortKey(name), index) for index, name in enumerate(searchlist))
+        self._keys = [key for key, _ in keys]
+        self._sorted = [index for _, index in keys]
+
+        # First letters, each with its first position in the sorted names
+        self._letters: list[str] = []
+        self._first: dict[str, int] = {}
+        for position, key in enumerate(self._keys):
+            letter = firstLetter(key)
+            if letter not in self._first:
+                self._first[letter] = position
+                self._letters.append(letter)
+        self._order = {letter: number for number, letter in enumerate(self._letters)}
+        log.message(
+            "playlist_index: %d entries, %d artist runs, %d letters",
+            log.DEBUG,
+            len(searchlist),
+            len(self._runs),
+            len(self._letters),
+        )
+
+    def __len__(self) -> int:
+        """Give the number of entries."""
+        return len(self.searchlist)
+
+    @property
+    def letters(self) -> list[str]:
+        """First letters of the entries, in alphabetical order."""
+        return list(self._letters)
+
+    def artistStart(self, index: int) -> int:
+        """Give the first entry of the artist run of entry ``index``."""
+        return self._runs[bisect_right(self._runs, index) - 1]
+
+    def nextArtist(self, index: int, forward: bool = True) -> int:
+        """Give the first entry of the next or previous artist run.
+
+        The list wraps around. Backwards, the start of the previous run is
+        given even from the middle of the current one.
+
+        """
+        if not self._runs:
+            return index
+        run = bisect_right(self._runs, index) - 1
+        run += 1 if forward else -1
+        return self._runs[run % len(self._runs)]
+
+    def letter(self, index: int) -> str:
+        """Give the first letter of entry ``index``."""
+        return firstLetter(sortKey(self.searchlist[index]))
+
+    def nextLetter(self, index: int, forward: bool = True) -> int:
+        """Give the alphabetically first entry of the next or previous letter.
+
+        The letters wrap around (Z to A) and the letters with no entry are
+        skipped.
+
+        """
+        if not self._letters:
+            return index
+        number = self._order[self.letter(index)]
+        number += 1 if forward else -1
+        letter = self._letters[number % len(self._letters)]
+        return self._sorted[self._first[letter]]
+
+    def find(self, prefix: str) -> int:
+        """Give the alphabetically first entry starting with ``prefix``.
+
+        The accents and the case are ignored. Returns -1 if none.
+
+        """
+        key = sortKey(prefix)
+        position = bisect_left(self._keys, key)
+        if position < len(self._keys) and self._keys[position].startswith(key):
+            return self._sorted[position]
+        return -1
+
+
+if __name__ == "__main__":
+    import random
+    import time
+
+    rng = random.Random(1)
+    artists = ["ABBA", "Émilie Simon", "Beatles", "2Pac", "Björk", "beck", "Zaz", "Air"]
+    searchlist = []
+    for number in range(50000):
+        artist = artists[rng.randrange(len(artists))] if number % 97 else "Track"
+        for _ in range(rng.randint(1, 12)):
+            searchlist.append(f"{artist} - Song {len(searchlist)}")
+    searchlist = searchlist[:50000]
+
+    start = time.perf_counter()
+    index = PlaylistIndex(searchlist)
+    built = time.perf_counter() - start
+    print(f"{len(index)} entries, {len(index._runs)} artist runs, built in {built * 1000:.0f}ms")
+    print("Letters:", " ".join(index.letters))
+
+    def oldFindNextArtist(index: int, forward: bool) -> int:
+        """Removed Radio.findNextArtist, with its wraparound (and no loop guard)."""
+        leng = len(searchlist)
+        current_artist = artistName(searchlist[index])
+        while True:
+            if forward:
+                index = index + 1
+                if index >= leng:
+                    index = 0
+            else:
+                index = index - 1
+                if index < 1:
+                    index = leng - 1
+            new_artist = artistName(searchlist[index])
+            if current_artist != new_artist:
+                break
+        if not forward:
+            while True:
+                index = index - 1
+                if artistName(searchlist[index]) != new_artist:
+                    break
+            index = index + 1
+            if index >= leng:
+                index = leng - 1
+        return index
+
+    # Same results except around the wraparound, where the old walk never
+    # went down to entry 0 (index < 1 wrapped to the last entry)
+    first_run, last_run = index._runs[1], index._runs[-1]
+    for _ in range(2000):
+        position = rng.randrange(first_run, last_run)
+        for forward in (True, False):
+            new = index.nextArtist(position, forward)
+            if forward or position >= index._runs[2]:
+                assert new == oldFindNextArtist(position, forward)
+            else:
+                assert new == 0
+
+    letters = []
+    position = index.find("")
+    for _ in index.letters:
+        letters.append(index.letter(position))
+        position = index.nextLetter(position)
+    assert letters == index.letters and index.letter(position) == index.letters[0]
+    assert index.nextLetter(index.find("b"), False) == index.find("a")
+    assert searchlist[index.find("emil")].startswith("Émilie")
+    assert searchlist[index.find("BJÖ")].startswith("Björk")
+    assert index.find("Queen") == -1
+
+    count = 10000
+    start = time.perf_counter()
+    for _ in range(count):
+        index.nextArtist(position, False)
+        index.nextLetter(position)
+        index.find("be")
+    elapsed = (time.perf_counter() - start) / count
+    print(f"Artist, letter and prefix jumps in {elapsed * 1e6:.1f}us")
@@ -26,6 +26,7 @@ import socket
 import socketserver
 import string
 import sys
+import threading
 import time
 from os import stat
 from pwd import *
@@ -33,17 +34,28 @@ from time import strftime
 
 import mpd
 
-from airplay_class import AirplayReceiver
+from command_list_class import CommandList
+from command_runner_class import runner
 from constants import *
 from constants import __version__
 from language_class import Language
 from log_class import Log
+from mpd_connection_class import MpdConnection
+from mpd_idle_class import IdleListener
+from network_monitor_class import NetworkMonitor
+from player_state_class import PlayerState
 from playlist_class import Playlist
+from playlist_index_class import artistName
+from resume_cache_class import ResumeCache
 from source_class import Source
-from spotify_class import SpotifyReceiver
+from startup_profiler_class import profiler
+from state_store_class import StateStore
+from station_health_class import StationHealth
+from stream_relay_class import StreamRelay
 from switch import Switch
+from task_graph_class import BACKGROUND, CRITICAL, TaskGraph
 from telefunken_buttons import TeleButtons
-from udp_server_class import RequestHandler, UDPServer
+from udp_server_class import MAX_REPLY, RequestHandler, UDPServer
 from volume_class import Volume
 
 # MPD files
@@ -91,7 +103,6 @@ OFF = False
 
 class Radio:
     translate = None  # Translate object
-    spotify = None  # Spotify object
     server = None
 
     client = mpd.MPDClient()
@@ -117,6 +128,8 @@ class Radio:
 
     config = None
     pivumeter = None
+    _airplay = None  # Airplay receiver, see the airplay property
+    _spotify = None  # Spotify receiver, see the spotify property
 
     source = None  # Source (radio,media,spotify and airplay)
     audio_error = False  # No sound device
@@ -152,7 +165,6 @@ class Radio:
     last_direction = UP  # Last search direction
     skipped_bad = True  # Skipped bad channel/track
     mpd_restart_count = 3  # MPD restart count
-    internet_check_delay = 0  # Prevent too many Internet checks
     error_display_delay = 0  # Delay before clearing error messages
     playlist_size = 0  # For checking changes to the playlist
     PL = None  # Playlist class
@@ -190,25 +202,23 @@ class Radio:
     playlists = None
     bluetooth_retry = 3  # Retry count for bluetooth connection
 
-    pingTime = 0  # Reduce amount of pings
-    pingDelay = 15  # Delay between pings in seconds
+    idle_listener = None  # MPD idle listener (mpd_idle_class)
+    network = None  # Internet connectivity monitor (network_monitor_class)
+    health = None  # Dead station cache (station_health_class)
+    relay = None  # Local prebuffering stream relay (stream_relay_class)
+    store = None  # State kept in /var/lib/radiod (state_store_class)
+    resume_cache = None  # Last radio playlist (resume_cache_class)
+    resume_id = None  # Station playing while the playlist loads behind it
+    resume_thread = None  # Thread loading the playlist behind the station
+    resume_replay = 0  # Station to play again once resumed, 0 = none
+    resume_pending = None  # (command, args) asked for while resuming
+    resume_done = False  # The instant resume is only used at start-up
+    tune_target = None  # Station selected by the tuner, not played yet
+    tune_deadline = 0.0  # Time when the tuner target is played
 
     connected = False  # Connection status
 
     # Configuration files in /var/lib/radiod
-    ConfigFiles = {
-        CurrentStationFile: 1,
-        CurrentTrackFile: 1,
-        CurrentSourceFile: 0,
-        SourceNameFile: "Radio",
-        VolumeFile: 75,
-        MixerVolumeFile: 90,
-        TimerFile: 30,
-        AlarmFile: "0:07:00",
-        StreamFile: "off",
-        RandomSettingFile: 0,
-    }
-
     # Error strings
     errorStrings = [
         "No error",
@@ -243,8 +253,6 @@ class Radio:
 
         self.PL = Playlist("Radio", self.config)  # Playlist class
         self.translate = translate
-        self.airplay = AirplayReceiver(translate)
-        self.spotify = SpotifyReceiver(translate)
 
         if getpwuid(os.geteuid()).pw_uid > 0:
             print("This program must be run with sudo or root permissions!")
@@ -276,14 +284,13 @@ class Radio:
     # Set up configuration files
     def setupConfiguration(self):
         # Create directory
-        if not os.path.isfile(CurrentStationFile):
-            self.execCommand("mkdir -p " + RadioLibDir)
+        os.makedirs(RadioLibDir, exist_ok=True)
 
-        # Initialise configuration files from ConfigFiles list
-        for file in self.ConfigFiles:
-            value = self.ConfigFiles[file]
-            if not os.path.isfile(file) or os.path.getsize(file) == 0:
-                self.execCommand("echo " + str(value) + " > " + file)
+        # Load the stored state. The store migrates and creates the files
+        # (current_station, volume, timer...) with their default values
+        self.store = StateStore(RadioLibDir)
+        self.PL.store = self.store
+        self.resume_cache = ResumeCache(RadioLibDir)
 
         # Link /var/lib/mpd/music/media to /media/<user>
         cmd = "rm -f /var/lib/mpd/music/media"
@@ -447,6 +454,17 @@ class Radio:
         elif key == "IR_REMOTE":  # IR Remote test message
             self.event.set(self.event.NO_EVENT)  # To be done
 
+        # Last log records kept in memory, LOG_DUMP or LOG_DUMP:<count>
+        elif key == "LOG_DUMP" or key.startswith("LOG_DUMP:"):
+            count = None
+            if ":" in key:
+                try:
+                    count = int(key.split(":")[1])
+                except ValueError:
+                    pass
+            response = log.dump(count, max_bytes=MAX_REPLY) or "Log buffer empty"
+            set_interrupt = False
+
         else:
             log.message("radio.remoteCallBack invalid IR key " + key, log.DEBUG)
             set_interrupt = False
@@ -463,9 +481,10 @@ class Radio:
         return self.playlistName
 
     # Set up radio configuration and start the MPD daemon
-    def start(self):
-        global language
-
+    # The steps run in parallel as a task graph (task_graph_class), the MPD
+    # connection, source and volume first. If network is True, the network
+    # wait is one of the steps and the IP address is returned
+    def start(self, network=False):
         self.config.display()
         # Get Configuration parameters /etc/radiod.conf
         self.boardrevision = self.getBoardRevision()
@@ -474,55 +493,67 @@ class Radio:
         self.udphost = self.config.remote_listen_host
         self.display_playlist_number = self.config.display_playlist_number
         self.speech = self.config.speech
-        language = Language(self.speech)  # language is a global
 
-        # Log OS version information
-        self.arch = platform.architecture()[0]
-        OSrelease = self.execCommand("cat /etc/os-release | grep NAME")
-        OSrelease = OSrelease.replace("PRETTY_NAME=", "OS release: ")
-        self.OSrelease = OSrelease.replace('"', "")
-        log.message(self.OSrelease + " " + self.arch, log.INFO)
-        (x, self.OSname) = self.OSrelease.split("(")
-        self.OSname = self.OSname.replace(")", "")
-        self.OSname = self.OSname.title()
-        myos = self.execCommand("uname -a")
-        log.message(myos, log.INFO)
-
-        # Connect bluetooth device if configured
-        self.connectBluetoothDevice()
-
-        # Start the MPD socket service
-        self.startMpdSocket()
+        # Is Airplay installed (shairport-sync), is Spotify installed
+        self.airplayInstalled = self.config.airplay
+        self.spotifyInstalled = os.path.isfile("/usr/bin/librespot")
+        log.message("self.airplayInstalled " + str(self.airplayInstalled), log.DEBUG)
 
-        # Connect to MPD
-        self.client = mpd.MPDClient()  # Create the MPD client
-        self.connect(self.mpdport)
+        # Alarm and timer settings
+        self.timeTimer = int(time.time())
+        self.alarmTime = self.getStoredAlarm()
+        sType, sHours, sMinutes = self.alarmTime.split(":")
+        self.alarmType = int(sType)
+        if self.alarmType > self.ALARM_OFF:
+            self.alarmType = self.ALARM_OFF
 
-        # Is Airplay installed (shairport-sync)
-        self.airplayInstalled = self.config.airplay
+        graph = TaskGraph("radio.start")
+        # Critical path to the first sound
+        graph.add("mpd_socket", self.startMpdSocket, priority=CRITICAL)
+        graph.add("mpd_connect", self._startMpd, after=("mpd_socket",), priority=CRITICAL)
+        graph.add("source", self._startSource, after=("mpd_connect",), priority=CRITICAL)
+        graph.add("volume", self._startVolume, after=("source",), priority=CRITICAL)
+        graph.add("idle_listener", self.startIdleListener, after=("source",), priority=CRITICAL)
+        if network:
+            graph.add("network", self.waitForNetwork, priority=CRITICAL)
+
+        # Independent of MPD
+        graph.add("language", self._startLanguage)
+        graph.add("network_monitor", self.startNetworkMonitor)
+        graph.add("health", self._startHealth)
+        graph.add("relay", self._startRelay)
+        graph.add("bluetooth", self.connectBluetoothDevice)
         if self.airplayInstalled:
-            self.stopAirplay()
-        log.message("self.airplayInstalled " + str(self.airplayInstalled), log.DEBUG)
+            graph.add("airplay", self.stopAirplay)
+        graph.add("udp_server", self._startUdpServer, after=("source", "volume"))
+        graph.add("streaming", self._startStreaming, after=("mpd_connect",))
 
-        # Is Spotify installed
-        self.spotifyInstalled = os.path.isfile("/usr/bin/librespot")
+        # Restore alsamixer settings (alsa-state/alsa-store services
+        # not working in Bookworm), once the stored volume is set
+        graph.add("alsactl", self._restoreMixer, after=("volume",))
+        graph.add("audio_device", self._configureAudioDevice, after=("alsactl",))
+        graph.add("mixer_id", self._updateMixerId, after=("audio_device",))
+        graph.add("os_info", self._logOsInfo, priority=BACKGROUND)
+
+        graph.run()
+        return graph.results.get("network", "")
+
+    # Connect to MPD (reconnections are done in the background)
+    def _startMpd(self):
+        self.client = MpdConnection(self.mpdport, timeout=self.config.client_timeout)
+        self.connect(self.mpdport)
+        self.state = PlayerState(self.client)  # Shared status/currentsong
 
+    # Set up source/playlist depending upon startup=<source> in /etc/radiod.conf
+    def _startSource(self):
         self.source = Source(
             client=self.client,
             airplay=self.airplayInstalled,
             spotify=self.spotifyInstalled,
         )
-
-        # Set up source/playlist depending upon startup=<source> in /etc/radiod.conf
         self.getSources()
         sourceType = self.config.source
 
-        # Set up volume controls
-        self.volume = Volume(
-            self.client, self.source, self.spotify, self.airplay, self.config, log
-        )
-        self.volume.setClient(self.client)
-
         startup_playlist = self.config.startup_playlist
         self.PL.name = startup_playlist
         log.message("Startup playlist " + startup_playlist, log.DEBUG)
@@ -551,31 +582,67 @@ class Radio:
         self.current_id = self.getStoredID(self.current_file)
         log.message("radio.start current ID " + str(self.current_id), log.DEBUG)
 
+    # Set up volume controls and restore the stored volume
+    def _startVolume(self):
+        self.volume = Volume(
+            self.client,
+            self.source,
+            self.receiverRunning,
+            self.config,
+            log,
+            state=self.state,
+            store=self.store,
+        )
+        self.volume.setClient(self.client)
         self.volume.set(self.volume.getStoredVolume())
 
-        # Restore alsamixer settings (alsa-state/alsa-store services
-        # not working in Bookworm)
-        # Temporary workaround until above services fixed
+    # Load the language file
+    def _startLanguage(self):
+        global language
+        language = Language(self.speech)  # language is a global
+
+    # Results of the previous station probes
+    def _startHealth(self):
+        self.health = StationHealth(timeout=self.config.internet_timeout)
+
+    # Play the stations through the local prebuffering relay
+    def _startRelay(self):
+        if self.config.stream_relay:
+            relay = StreamRelay(self.config.stream_relay_port)
+            if relay.start():
+                self.relay = relay
+                self.PL.relay = relay
+
+    # Log OS version information
+    def _logOsInfo(self):
+        self.arch = platform.architecture()[0]
+        OSrelease = self.execCommand("cat /etc/os-release | grep NAME")
+        OSrelease = OSrelease.replace("PRETTY_NAME=", "OS release: ")
+        self.OSrelease = OSrelease.replace('"', "")
+        log.message(self.OSrelease + " " + self.arch, log.INFO)
+        (x, self.OSname) = self.OSrelease.split("(")
+        self.OSname = self.OSname.replace(")", "")
+        self.OSname = self.OSname.title()
+        myos = self.execCommand("uname -a")
+        log.message(myos, log.INFO)
+
+    # Restore alsamixer settings
+    # Temporary workaround until alsa-state/alsa-store services fixed
+    def _restoreMixer(self):
         cmd = "/usr/sbin/alsactl restore"
         log.message(cmd, log.DEBUG)
         self.execCommand(cmd)
 
-        # Alarm and timer settings
-        self.timeTimer = int(time.time())
-        self.alarmTime = self.getStoredAlarm()
-        sType, sHours, sMinutes = self.alarmTime.split(":")
-        self.alarmType = int(sType)
-        if self.alarmType > self.ALARM_OFF:
-            self.alarmType = self.ALARM_OFF
-
-        # Icecast Streaming settings
+    # Icecast Streaming settings
+    def _startStreaming(self):
         self.streaming = self.getStoredStreaming()
         if self.streaming:
             self.streamingOn()
         else:
             self.streamingOff()
 
-        # Start the IR remote control listener
+    # Start the IR remote control listener
+    def _startUdpServer(self):
         try:
             self.server = UDPServer((self.udphost, self.udpport), RequestHandler)
             msg = (
@@ -593,58 +660,37 @@ class Radio:
                 log.ERROR,
             )
 
-        # Configure the audio device from audio_out parameter in the configuration
+    # Configure the audio device from audio_out parameter in the configuration
+    def _configureAudioDevice(self):
         audio_out = self.config.audio_out
         if not self.config.audio_config_locked:
             if len(audio_out) > 1 and audio_out != "bluetooth":
                 dir = os.path.dirname(__file__)
                 self.execCommand(dir + "/configure_audio_device.sh 2>&1 >/dev/null")
 
-        # Set up mixer ID file hardware ID in mpd.conf and /etc/asound
-        # Run set_mixer_id.sh script each startup as this might change
-        # when connecting and disconnecting HDMIs. Likewise the card number
+    # Set up mixer ID file hardware ID in mpd.conf and /etc/asound
+    # Run set_mixer_id.sh script each startup as this might change
+    # when connecting and disconnecting HDMIs. Likewise the card number
+    def _updateMixerId(self):
         if self.needMixerUpdate(MixerIdFile):
             self.setMixerId(MixerIdFile)
 
-        # Set-up Playlist callback
-        self.setupPlaylistCallback()
-        return
-
-    # Connect to MPD
+    # Connect to MPD. Waits at most client_timeout seconds, the connection
+    # keeps being retried in the background
     def connect(self, port):
-        connected = False
-        retry = 2
-        while retry > 0:
+        self.client.port = port
+        self.client.start()
+        self.connected = self.client.waitConnected(self.config.client_timeout)
+        if self.connected:
             try:
-                self.client.timeout = self.config.client_timeout
-                self.client.idletimeout = None
-                self.client.connect("localhost", port)
                 # Wait for stations to be loaded before playing
                 self.client.stop()
-                log.message("Connected to MPD port " + str(port), log.INFO)
-                ##if self.volume != None:
-                # self.volume.setClient(self.client)
-                connected = True
-                retry = 0
-
-            except mpd.ConnectionError as e:
-                log.message(
-                    "radio.connection error port " + str(port) + ":" + str(e), log.ERROR
-                )
-                self.setError(MPD_NO_CONNECTION)
-                self.setInterrupt()
-
             except Exception as e:
-                log.message(
-                    "radio.connect failed port " + str(port) + ": " + str(e), log.ERROR
-                )
-                time.sleep(2.5)  # Wait for interrupt in the case of a shutdown
-                if "Already connected" in str(e):
-                    connected = True
-                    retry = 0
-            retry -= 1
-
-        self.connected = connected
+                log.message("radio.connect stop: " + str(e), log.ERROR)
+        else:
+            log.message("radio.connect failed port " + str(port), log.ERROR)
+            self.setError(MPD_NO_CONNECTION)
+            self.setInterrupt()
         return self.connected
 
     # Connect Bluetooth device. Re-pair device if necessary
@@ -768,53 +814,32 @@ class Radio:
 
         return
 
-    # Scroll through tracks by artist
+    # Scroll through tracks by artist, to the first track of the next or
+    # previous artist (artist runs of the playlist index)
     def findNextArtist(self, direction):
         self.setLoadNew(True)
-        index = self.getSearchIndex()
-        playlist = self.getPlayList()
-        current_artist = self.getArtistName(index)
-
-        found = False
-        leng = len(playlist)
-        count = leng
-        while not found:
-            if direction == UP:
-                index = index + 1
-                if index >= leng:
-                    index = 0
-            else:
-                index = index - 1
-                if index < 1:
-                    index = leng - 1
-
-            new_artist = self.getArtistName(index)
-            if current_artist != new_artist:
-                found = True
-
-            count = count - 1
-
-            # Prevent everlasting loop
-            if count < 1:
-                found = True
-                index = self.current_id
-
-        # If a Backward Search find start of this list
-        found = False
-        if direction == DOWN:
-            self.current_artist = new_artist
-            while not found:
-                index = index - 1
-                new_artist = self.getArtistName(index)
-                if self.current_artist != new_artist:
-                    found = True
-            index = index + 1
-            if index >= leng:
-                index = leng - 1
+        if len(self.searchlist) < 1:
+            return
+        index = self.PL.index.nextArtist(self.getSearchIndex(), direction == UP)
+        self.setSearchIndex(index)
+        log.message("radio.findNextArtist index " + str(index), log.DEBUG)
 
+    # Jump to the first track or station (alphabetical order) starting with
+    # the next or previous letter (letter search mode of the tuner knob)
+    def findNextLetter(self, direction):
+        self.last_direction = direction
+        self.setLoadNew(True)
+        if len(self.searchlist) < 1:
+            return
+        index = self.PL.index.nextLetter(self.getSearchIndex(), direction == UP)
         self.setSearchIndex(index)
+        log.message("radio.findNextLetter index " + str(index), log.DEBUG)
 
-        return
+    # Get the first letter of a track or station (# if not a letter)
+    def getSearchLetter(self, index):
+        if index < 0 or index >= len(self.searchlist):
+            return ""
+        return self.PL.index.letter(index)
 
     # Input Source RADIO, NETWORK or MEDIA
     def getSourceType(self):
@@ -980,16 +1005,10 @@ class Radio:
             self.clearError()
         self.volume.unmute()
 
-    # Ping MPD server to keep client connected
+    # Check the MPD connection. The keep alive ping and the reconnection
+    # are done in the background by MpdConnection
     def ping(self):
-        now = time.time()
-        if now > self.pingTime + self.pingDelay:
-            self.pingTime = now
-            try:
-                self.client.ping()
-            except Exception as e:
-                log.message("radio.ping: " + str(e), log.ERROR)
-                pass
+        return self.client.isConnected()
 
     # Return muted state muted = True
     def muted(self):
@@ -1020,7 +1039,7 @@ class Radio:
     def muteMixer(self):
         return self.airplay.muteMixer()
 
-    # Start MPD self.client (Alarm mode) - not used
+    # Start MPD self.client (Alarm mode or Airplay/Spotify failed to start)
     def startMpdClient(self):
         try:
             self.client.play()
@@ -1038,6 +1057,17 @@ class Radio:
 
     # Stop the radio
     def stop(self):
+        if self.idle_listener is not None:
+            self.idle_listener.stop()
+        if self.network is not None:
+            self.network.stop()
+        if isinstance(self.client, MpdConnection):
+            self.client.close()
+        if self.store is not None:
+            self.store.close()  # Write the pending state changes
+        if self.relay is not None:
+            log.message("Stream relay " + str(self.relay.metrics()), log.INFO)
+            self.relay.stop()
         self.execCommand("sudo systemctl stop mpd")
 
         if self.getSourceType() == self.source.AIRPLAY:
@@ -1068,20 +1098,20 @@ class Radio:
     # Store source index value and name
     def storeSource(self, index):
         sname = self.source.current()  # Used by new web interface
-        self.execCommand("echo " + str(index) + " > " + CurrentSourceFile)
-        self.execCommand("echo " + sname + " > " + SourceNameFile)
+        self.store.set("source", index)
+        self.store.set("source_name", sname)
         return
 
     # Set random on or off
-    def setRandom(self, true_false, store=True):
+    # The option setters queue the command in batch (CommandList) if given
+    def setRandom(self, true_false, store=True, batch=None):
         log.message("radio.setRandom " + str(true_false), log.DEBUG)
         try:
             if true_false:
-                self.client.random(1)
                 iValue = 1
             else:
-                self.client.random(0)
                 iValue = 0
+            self._sendOption("random", iValue, batch)
 
             if store:
                 self.storeOptionValue(self.menu.OPTION_RANDOM, iValue)
@@ -1097,12 +1127,9 @@ class Radio:
         return self.random
 
     # Set repeat on or off
-    def setRepeat(self, true_false):
+    def setRepeat(self, true_false, batch=None):
         try:
-            if true_false:
-                self.client.repeat(1)
-            else:
-                self.client.repeat(0)
+            self._sendOption("repeat", int(true_false), batch)
 
         except Exception as e:
             log.message("radio.setRepeat " + str(e), log.ERROR)
@@ -1110,12 +1137,9 @@ class Radio:
         return true_false
 
     # Set consume on or off
-    def setConsume(self, true_false):
+    def setConsume(self, true_false, batch=None):
         try:
-            if true_false:
-                self.client.consume(1)
-            else:
-                self.client.consume(0)
+            self._sendOption("consume", int(true_false), batch)
 
         except Exception as e:
             log.message("radio.setConsume " + str(e), log.ERROR)
@@ -1123,12 +1147,9 @@ class Radio:
         return true_false
 
     # Set single on or off
-    def setSingle(self, true_false):
+    def setSingle(self, true_false, batch=None):
         try:
-            if true_false:
-                self.client.single(1)
-            else:
-                self.client.single(0)
+            self._sendOption("single", int(true_false), batch)
 
         except Exception as e:
             log.message("radio.setSingle " + str(e), log.ERROR)
@@ -1136,6 +1157,13 @@ class Radio:
         self.single = true_false
         return self.single
 
+    # Send an MPD option command (random, repeat...) or queue it in batch
+    def _sendOption(self, option, value, batch=None):
+        if batch is not None:
+            batch.add(option, value)
+        else:
+            getattr(self.client, option)(value)
+
     # Get single on or off
     def getSingle(self):
         return self.single
@@ -1146,14 +1174,14 @@ class Radio:
         value = None
 
         if option_index == self.menu.OPTION_RANDOM:
-            randomValue = int(self.execCommand("cat " + RandomSettingFile))
+            randomValue = int(self.store.get("random"))
             value = self.convertToTrueFalse(randomValue)
 
         elif option_index == self.menu.OPTION_TIMER:
-            value = int(self.execCommand("cat " + TimerFile))
+            value = int(self.store.get("timer"))
 
         elif option_index == self.menu.OPTION_ALARM:
-            value = self.execCommand("cat " + AlarmFile)
+            value = self.store.get("alarm")
 
         if value == None:
             value = False
@@ -1169,16 +1197,8 @@ class Radio:
             + str(value),
             log.DEBUG,
         )
-        file = ""
-
         if option_index == self.menu.OPTION_RANDOM:
-            file = RandomSettingFile
-
-        # Store value in Radio lib file
-        if len(file) != 0:
-            cmd = "echo " + str(value) + " > " + file
-            self.execCommand(cmd)
-            log.message(cmd, log.DEBUG)
+            self.store.set("random", value)
         return value
 
     # Routine to convert true or false to 1(True) or 0(False)
@@ -1271,7 +1291,7 @@ class Radio:
 
     # Store timer time in timer file
     def storeTimer(self, timerValue):
-        self.execCommand("echo " + str(timerValue) + " > " + TimerFile)
+        self.store.set("timer", timerValue)
         return timerValue
 
     # Radio Alarm Functions
@@ -1376,19 +1396,11 @@ class Radio:
 
     # Get the stored alarm value
     def getStoredAlarm(self):
-        alarmValue = ""
-        if os.path.isfile(AlarmFile):
-            try:
-                alarmValue = self.execCommand("cat " + AlarmFile)
-            except ValueError:
-                alarmValue = "0:7:00"
-        else:
-            log.message("Error reading " + AlarmFile, log.ERROR)
-        return alarmValue
+        return self.store.get("alarm")
 
     # Store alarm time in alarm file
     def storeAlarm(self, alarmString):
-        self.execCommand("echo " + alarmString + " > " + AlarmFile)
+        self.store.set("alarm", alarmString)
         return
 
     # Get the actual alarm time
@@ -1419,16 +1431,7 @@ class Radio:
 
     # Get the stored streaming value
     def getStoredStreaming(self):
-        streamValue = "off"
-        streaming = False
-        if os.path.isfile(StreamFile):
-            try:
-                streamValue = self.execCommand("cat " + StreamFile)
-            except ValueError:
-                streamValue = "off"
-        else:
-            log.message("Error reading " + StreamFile, log.ERROR)
-
+        streamValue = self.store.get("streaming")
         if streamValue == "on":
             streaming = True
         else:
@@ -1455,8 +1458,8 @@ class Radio:
         output_id = 2
         self.streaming = False
         if os.path.isfile(Icecast):
-            self.execCommand("service icecast2 start")
-            self.execMpcCommand("enable " + str(output_id))
+            self.execCommand("service icecast2 start", wait=False)
+            self.client.enableoutput(output_id)
             self.storeStreaming("on")
             self.streaming = True
             self.streamingStatus()
@@ -1467,16 +1470,22 @@ class Radio:
         output_id = 2
         self.streaming = False
         if os.path.isfile(Icecast):
-            self.execMpcCommand("disable " + str(output_id))
-            self.execCommand("service icecast2 stop")
+            self.client.disableoutput(output_id)
+            self.execCommand("service icecast2 stop", wait=False)
             self.storeStreaming("off")
             self.streamingStatus()
         return self.streaming
 
     # Display streaming status
     def streamingStatus(self):
-        status = self.execCommand("mpc outputs|grep -i stream|grep -i enabled")
-        if len(status) > 1:
+        enabled = False
+        try:
+            for output in self.client.outputs():
+                if "stream" in output.get("outputname", "").lower():
+                    enabled = enabled or output.get("outputenabled") == "1"
+        except Exception as e:
+            log.message("radio.streamingStatus " + str(e), log.ERROR)
+        if enabled:
             msg = "Icecast streaming enabled"
         else:
             msg = "Icecast streaming disabled"
@@ -1490,7 +1499,7 @@ class Radio:
 
     # Store stram on or off in streaming file
     def storeStreaming(self, onoff):
-        self.execCommand("echo " + onoff + " > " + StreamFile)
+        self.store.set("streaming", onoff)
         return
 
     # Get the streaming value
@@ -1511,19 +1520,10 @@ class Radio:
         self.option_changed = False
         return
 
-    # Execute system command
-    def execCommand(self, cmd):
-        try:
-            p = os.popen(cmd)
-            result = p.readline().rstrip("\n")
-        except Exception as e:
-            print(cmd)
-            msg = "radio.execCommand: " + str(cmd)
-            log.message(msg, log.ERROR)
-            print(str(e))
-            log.message(str(e), log.ERROR)
-            result = ""
-        return result
+    # Execute system command (See command_runner_class)
+    # wait=False runs the command in the background when the output is not used
+    def execCommand(self, cmd, wait=True):
+        return runner.execCommand(cmd, wait=wait)
 
     # Execute MPC comnmand via OS
     # Some commands are easier using mpc and don't have
@@ -1533,6 +1533,12 @@ class Radio:
 
     # Get the ID  of the currently playing track or station ID
     def getCurrentID(self):
+        # While tuning, the display shows the selected station
+        if self.tune_target is not None:
+            return self.tune_target
+        # While resuming, the station is alone in the MPD queue
+        if self.resume_id is not None:
+            return self.resume_id
         try:
             currentsong = self.getCurrentSong()
             pos = currentsong.get("pos")
@@ -1550,15 +1556,14 @@ class Radio:
             # Only update if the Current ID has changed by another client
             if self.current_id != currentid:
                 log.message(
-                    "radio.getCurrentID New ID "
-                    + str(currentid)
-                    + " id:"
-                    + str(self.current_id),
+                    "radio.getCurrentID New ID %s id:%s",
                     log.DEBUG,
+                    currentid,
+                    self.current_id,
                 )
                 self.current_id = currentid
                 # Write to current ID file
-                self.execCommand("echo " + str(currentid) + " > " + self.current_file)
+                self.storeIntegerValue(currentid, self.current_file)
                 self.search_index = self.current_id - 1
                 self.getIdError = False
                 self.event.set(self.event.MPD_CLIENT_CHANGE)
@@ -1594,7 +1599,7 @@ class Radio:
             return self.error
 
         try:
-            status = self.client.status()
+            status = self.state.status()
             errorStr = str(status.get("error"))
             if errorStr != "None":
                 if not self.error:
@@ -1620,7 +1625,7 @@ class Radio:
         percentage = None
 
         try:
-            status = self.client.status()
+            status = self.state.status()
             playtime = status.get("time")
             if playtime != None:
                 elapsed, duration = playtime.split(":")
@@ -1664,11 +1669,10 @@ class Radio:
     def setCurrentID(self, new_id):
         connectError = False
         log.message(
-            "radio.setCurrentID newid="
-            + str(new_id)
-            + " current_id="
-            + str(self.current_id),
+            "radio.setCurrentID newid=%s current_id=%s",
             log.DEBUG,
+            new_id,
+            self.current_id,
         )
 
         # Validity checks
@@ -1683,15 +1687,15 @@ class Radio:
         self.search_index = self.current_id - 1
 
         # Save the new ID in /var/lib/radiod
-        log.message("radio.setCurrentID set to " + str(self.current_id), log.DEBUG)
-        self.execCommand("echo " + str(self.current_id) + " > " + self.current_file)
+        log.message("radio.setCurrentID set to %s", log.DEBUG, self.current_id)
+        self.storeIntegerValue(self.current_id, self.current_file)
 
         return self.current_id
 
     # Get stats array
     def getStats(self):
         try:
-            stats = self.client.status()
+            stats = self.state.status()
             self.stats = stats  # Only if above call works
             self.getMpdOptions(self.stats)  # Get options
 
@@ -1703,12 +1707,12 @@ class Radio:
     # Get current song information (Only for use within this module)
     def getCurrentSong(self):
         try:
-            currentsong = self.client.currentsong()
+            currentsong = self.state.currentsong()
             self.currentsong = currentsong
         except:
             # Try re-connect and status
             try:
-                currentsong = self.client.currentsong()
+                currentsong = self.state.currentsong()
                 self.currentsong = currentsong
             except Exception as e:
                 log.message("radio.getCurrentSong failed: " + str(e), log.ERROR)
@@ -1847,7 +1851,7 @@ class Radio:
     # Get bit rate - aways returns 0 in diagnostic mode
     def getBitRate(self):
         try:
-            status = self.client.status()
+            status = self.state.status()
             bitrate = int(status.get("bitrate"))
         except:
             bitrate = -1
@@ -1861,8 +1865,12 @@ class Radio:
             current_id = 1
         return current_id
 
-    # Store integer value in file
+    # Store integer value in file (in the state store for its files)
     def storeIntegerValue(self, value, sFile):
+        key = self.store.keyOf(sFile)
+        if key is not None:
+            self.store.set(key, value)
+            return value
         fp = open(sFile, "w")
         fp.write(str(value))
         fp.flush()
@@ -1877,6 +1885,12 @@ class Radio:
     # filename is the name any file in the lib directory
     # default_value is the value to be returned if the file read fails
     def getStoredInteger(self, filename, default_value, loggit=True):
+        key = None if self.store is None else self.store.keyOf(filename)
+        if key is not None:
+            try:
+                return int(self.store.get(key))
+            except ValueError:
+                return int(default_value)
         if os.path.isfile(filename):
             try:
                 fp = open(filename, "r")
@@ -1903,6 +1917,8 @@ class Radio:
         return self.current_id
 
     # Change radio station up
+    # With a tuner settle time, only the target is updated here; the station
+    # is played by commitTuning once the tuner has been still long enough
     def _changeChannel(self, direction):
         new_id = self.getCurrentID()
         skip_value = 1  # Skip increment decrement
@@ -1918,8 +1934,22 @@ class Radio:
             log.message(mesg + "clearError " + str(self.error), log.DEBUG)
             self.clearError()
 
-        log.message(mesg + str(new_id), log.DEBUG)
-        self.current_id = self.play(new_id)
+        settle_time = self.config.tuner_settle_time
+        if settle_time > 0 and self.source.getType() == self.source.RADIO:
+            size = len(self.searchlist)
+            if new_id > size:
+                new_id = 1
+            elif new_id < 1:
+                new_id = size
+            log.message("%stuning %s", log.DEBUG, mesg, new_id)
+            self.tune_target = new_id
+            self.tune_deadline = time.monotonic() + settle_time
+            self.current_id = new_id
+            self.search_index = new_id - 1
+            self.setInterrupt()
+        else:
+            log.message(mesg + str(new_id), log.DEBUG)
+            self.current_id = self.play(new_id)
         self.channelChanged = True
 
         if self.volume.muted():
@@ -1927,6 +1957,22 @@ class Radio:
 
         return self.current_id
 
+    # Is a tuner target waiting to be played
+    def isTuning(self):
+        return self.tune_target is not None
+
+    # Play the tuner target once the settle time has passed (scheduler task)
+    # Returns the delay before the next check
+    def commitTuning(self):
+        if self.tune_target is None:
+            return None
+        remaining = self.tune_deadline - time.monotonic()
+        if remaining > 0:
+            return remaining
+        log.message("radio.commitTuning " + str(self.tune_target), log.DEBUG)
+        self.play(self.tune_target)
+        return None
+
     # Cycle the input source and/or playlist (Reload is done when Reload requested)
     def cycleSource(self, direction):
 
@@ -1960,32 +2006,40 @@ class Radio:
         source_name = self.source.getNewName()
 
         log.message("radio.loadSource " + source_name + " " + type_name, log.DEBUG)
+        if self.deferResumed(self.loadSource):
+            return
+        resumed = False
 
         # Stop the currently playing source
         if source_type == self.source.RADIO or source_type == self.source.MEDIA:
 
-            if self.airplay.isRunning():
+            if self._airplay is not None and self._airplay.isRunning():
                 self.stopAirplay()
 
-            if self.spotify.isRunning():
+            if self._spotify is not None and self._spotify.isRunning():
                 self.stopSpotify()
 
         else:
             self.stopMpdClient()
 
         if source_type == self.source.RADIO:
+            # Options and playlist are sent in one MPD command list
             self.current_file = CurrentStationFile
-            self.setRandom(False, store=False)
-            self.setConsume(False)
-            self.setRepeat(False)
-            self.setSingle(False)
-            self.loadPlaylist()
+            batch = CommandList(self.client)
+            self.setRandom(False, store=False, batch=batch)
+            self.setConsume(False, batch=batch)
+            self.setRepeat(False, batch=batch)
+            self.setSingle(False, batch=batch)
+            resumed = self.resumePlaylist(batch)
+            if not resumed:
+                self.loadPlaylist(batch=batch)
 
         elif source_type == self.source.MEDIA:
             self.current_file = CurrentTrackFile
             self.mountAll()
-            self.loadPlaylist()
-            self.execMpcCommand("update &")
+            batch = CommandList(self.client)
+            batch.add("update")  # Runs in the background in MPD
+            self.loadPlaylist(batch=batch)
 
             # If the playlist is empty then load media
             # Else simply load the playlist
@@ -2002,7 +2056,11 @@ class Radio:
             if not self.spotify.isRunning():
                 self.startSpotify()
 
-        if source_type == self.source.RADIO or source_type == self.source.MEDIA:
+        if resumed:
+            # Already playing, the playlist is loaded in the background
+            self.searchlist = self.PL.searchlist
+
+        elif source_type == self.source.RADIO or source_type == self.source.MEDIA:
             # Create a list for search
             self.searchlist = self.PL.searchlist
             self.current_id = self.getStoredID(self.current_file)
@@ -2017,7 +2075,124 @@ class Radio:
         self.storeSource(self.source_index)
         return
 
-    def loadPlaylist(self):
+    # Play the stored station of the radio playlist from the resume cache,
+    # once at start-up, with the options in batch, before the playlist is
+    # loaded. The playlist is then loaded behind the station and checked in
+    # the background
+    # Returns True if the station is playing
+    def resumePlaylist(self, batch):
+        pname = self.source.getNewName()
+        if self.resume_done or not self.config.instant_resume or self.relay is not None:
+            return False
+        self.resume_done = True
+        cached = self.resume_cache.get(pname)
+        if cached is None:
+            return False
+        entries, searchlist = cached
+        current_id = self.getStoredID(CurrentStationFile)
+        if current_id > len(entries):
+            return False
+
+        batch.add("clear")
+        batch.add("add", entries[current_id - 1])
+        batch.add("play", 0)
+        try:
+            batch.send()
+        except Exception as e:
+            log.message("radio.resumePlaylist " + str(e), log.ERROR)
+            return False
+
+        log.message("radio.resumePlaylist %s station %s", log.INFO, pname, current_id)
+        self.PL.resume(pname, entries, searchlist)
+        self.current_id = current_id
+        self.search_index = current_id - 1
+        self.resume_id = current_id
+        self.state.changed()
+        profiler.mark("first play")
+
+        self.resume_thread = threading.Thread(
+            target=self.completeResume,
+            args=(pname, entries, current_id),
+            name="resume",
+            daemon=True,
+        )
+        self.resume_thread.start()
+        return True
+
+    # Load the playlist around the resumed station (resume thread)
+    # If the playlist has changed since it was cached, it is loaded again
+    # and the stored station is to be played from it. The rest is done by
+    # the main loop on the RESUMED event (handleResumed)
+    def completeResume(self, pname, entries, current_id):
+        valid = False
+        try:
+            if self.client.listplaylist(pname) == entries:
+                # The copy of the station in the playlist replaces the
+                # playing one without interrupting it
+                batch = CommandList(self.client)
+                batch.add("load", pname)
+                batch.add("delete", current_id)
+                batch.add("move", 0, current_id - 1)
+                index = batch.add("playlist")
+                status = batch.add("status")
+                results = batch.send()
+                self.PL.resumed(self.client, results[index], results[status])
+                self.saveResumeCache()
+                valid = True
+            else:
+                log.message("radio.completeResume " + pname + " has changed", log.INFO)
+        except Exception as e:
+            log.message("radio.completeResume " + str(e), log.ERROR)
+
+        try:
+            if not valid:
+                self.resume_cache.clear()
+                self.PL.load(self.client, pname)
+                self.saveResumeCache()
+                self.resume_replay = current_id
+        except Exception as e:
+            log.message("radio.completeResume " + str(e), log.ERROR)
+        finally:
+            self.resume_id = None
+            self.state.changed()
+            self.event.post(self.event.RESUMED)
+
+    # Handle the RESUMED event (main thread): use the loaded playlist, then
+    # do the play or source change asked for meanwhile, or play the station
+    # again if the playlist had to be loaded again
+    def handleResumed(self):
+        self.resume_thread = None
+        self.searchlist = self.PL.searchlist
+        self.checkStations()
+        pending = self.resume_pending
+        replay = self.resume_replay
+        self.resume_pending = None
+        self.resume_replay = 0
+        if pending is not None:
+            command, args = pending
+            command(*args)
+        elif replay > 0:
+            self.play(replay)
+
+    # While the playlist of the resumed station loads, keep a play or source
+    # change for the RESUMED event instead of waiting for the load
+    # Returns True if the command is kept (the latest one wins)
+    def deferResumed(self, command, *args):
+        if self.resume_thread is None:
+            return False
+        log.message("radio.deferResumed " + command.__name__, log.DEBUG)
+        self.resume_pending = (command, args)
+        return True
+
+    # Keep the loaded radio playlist for the next start
+    def saveResumeCache(self):
+        if self.relay is not None or self.PL.type != self.source.RADIO:
+            return
+        if self.PL.size > 0 and len(self.PL.list) == self.PL.size:
+            self.resume_cache.save(self.PL.name, self.PL.entries, self.PL.searchlist)
+
+    # The optional batch (CommandList) is sent with the playlist commands
+    def loadPlaylist(self, batch=None):
         source_type = self.source.getNewType()
         type_name = self.source.getNewTypeName()
         pname = self.source.getNewName()
@@ -2026,10 +2201,13 @@ class Radio:
         log.message(msg, log.DEBUG)
 
         try:
-            self.PL.load(self.client, pname)
+            self.PL.load(self.client, pname, batch=batch)
+            self.state.changed()
             if self.PL.size < 1:
                 log.message("Playlist " + pname + " is empty", log.ERROR)
                 self.current_id = 0
+            self.saveResumeCache()
+            self.checkStations()
         except:
             log.message("radio.loadPlaylist failed to load " + pname, log.ERROR)
         return
@@ -2045,8 +2223,8 @@ class Radio:
     # Update music library
     def updateLibrary(self, force=False):
         try:
-            if len(self.client.playlist()) < 1 or force:
-                status = self.client.status()
+            status = self.client.status()
+            if int(status.get("playlistlength", 0)) < 1 or force:
                 try:
                     update_id = int(status.get("updating_db"))
                     self.loading_DB = True
@@ -2055,10 +2233,12 @@ class Radio:
                 if update_id < 1:
                     self.mountAll()
                     log.message("Updating MPD database ", log.INFO)
-                    self.execMpcCommand("update")
                     playlist = self.source.getName()
                     log.message("Loading playlist " + playlist, log.INFO)
-                    self.execMpcCommand("load " + playlist)
+                    batch = CommandList(self.client)
+                    batch.add("update")
+                    batch.add("load", playlist)
+                    batch.send()
             else:
                 self.loading_DB = False
             self.setUpdateLibOff()  # Check TO DO
@@ -2075,50 +2255,96 @@ class Radio:
         self.play(index + 1)
         return
 
-    # Check if there is an internet connection by checking Google
-    # Typically this is a reliable service such as Google
-    def checkInternet(self):
-        success = False
-        iTime = time.time()
-        host = self.config.internet_check_url
-        port = self.config.internet_check_port
-        timeout = self.config.internet_timeout
-
-        # Disable if no Internet URL defined
-        if len(host) < 1:
-            return True
-
-        if iTime > self.internet_check_delay + 1.5:
-            self.internet_check_delay = iTime
-            try:
-                socket.setdefaulttimeout(timeout)
-                socket.socket(socket.AF_INET, socket.SOCK_STREAM).connect((host, port))
-                if self.gotError() and self.errorCode == INTERNET_ERROR:
-                    self.setInterrupt()
-                    log.message("Internet reconnected", log.INFO)
-                    time.sleep(0.5)
-                    self.clearError()
-                    if not self.connected:
-                        self.connect(self.udpport)
-                        self.volume.setClient(self.client)
+    # Start the Internet connectivity monitor. It probes internet_check_url
+    # in the background and raises a NETWORK_CHANGED event after the first
+    # probe (an error set before a restart is cleared) and on changes
+    def startNetworkMonitor(self):
+        self.network = NetworkMonitor(
+            self.config.internet_check_url,
+            port=self.config.internet_check_port,
+            timeout=self.config.internet_timeout,
+            callback=self.networkChange,
+        )
+        self.network.start()
+
+    # Apply the changes of a reloaded configuration (See Configuration.reload)
+    # Returns the set of changed options that have been applied
+    def applyConfig(self, changed):
+        applied = set()
+        internet = {"internet_check_url", "internet_check_port", "internet_timeout"}
+        if internet & set(changed):
+            if self.network is not None:
+                self.network.stop()
+            self.startNetworkMonitor()
+            if self.health is not None:
+                self.health.timeout = self.config.internet_timeout
+            applied |= internet
+        if "display_playlist_number" in changed:
+            self.display_playlist_number = self.config.display_playlist_number
+            applied.add("display_playlist_number")
+        return applied
+
+    # Network monitor callback (monitor thread)
+    def networkChange(self, online):
+        self.event.post(self.event.NETWORK_CHANGED)
+
+    # Handle the NETWORK_CHANGED event (main thread)
+    # replay is False in sleep mode, the station is played at wake-up
+    def handleNetworkChange(self, replay=True):
+        if self.checkInternet():
+            self.checkStations()
+            if self.gotError() and self.errorCode == INTERNET_ERROR:
+                self.setInterrupt()
+                self.clearError()
+                if replay:
                     self.play(self.current_id)
-                success = True
-            except socket.error as e:
-                if not self.gotError():
-                    log.message("No Internet connection: " + str(e), log.ERROR)
-                    log.message("Tried " + host + " port " + str(port), log.ERROR)
-                    self.setError(INTERNET_ERROR)
-                    self.ip_addr = ""
-                    self.setInterrupt()
-                time.sleep(1)
-        else:
-            success = True
+        elif not self.gotError():
+            self.setError(INTERNET_ERROR)
+            self.ip_addr = ""
+            self.setInterrupt()
 
-        return success
+    # Check if there is an internet connection (Typically to a reliable
+    # service such as Google). Returns the value cached by the network
+    # monitor, this never blocks
+    def checkInternet(self):
+        if self.network is None:
+            return True
+        return self.network.isOnline()
+
+    # Probe the stations of the RADIO playlist in the background. Only the
+    # stations without a recent result are probed; called at playlist load
+    # and periodically from the scheduler
+    def checkStations(self):
+        if self.health is None or self.PL.type != self.source.RADIO:
+            return
+        if self.checkInternet():
+            self.health.probeAll(self.PL.urls)
+
+    # Skip the stations known to be dead in the direction of the last move
+    # Returns id unchanged if all stations are dead or none was probed
+    def skipDeadStations(self, id, skip_value):
+        if self.health is None:
+            return id
+        size = len(self.searchlist)
+        new_id = id
+        for _ in range(size):
+            url = self.PL.getUrl(new_id - 1)
+            if not self.health.isDead(url):
+                return new_id
+            log.message("radio.play_radio: skipping dead station " + url, log.INFO)
+            new_id += skip_value
+            if new_id > size:
+                new_id = 1
+            elif new_id < 1:
+                new_id = size
+        return id
 
     # Play a track or station id  (Starts at 1)
     def play(self, id):
         log.message("radio.play " + str(id), log.DEBUG)
+        self.tune_target = None  # Cancels a pending tuner change
+        if self.deferResumed(self.play, id):
+            return self.current_id
 
         new_id = id
         if new_id > len(self.searchlist):
@@ -2132,6 +2358,8 @@ class Radio:
             self.current_id = self.play_radio(new_id)
         elif sourceType == self.source.MEDIA:
             self.current_id = self.play_media(new_id)
+        self.state.changed()  # The player state has changed
+        profiler.mark("first play")
 
         # Update current file and search index
         self.storeIntegerValue(self.current_id, self.current_file)
@@ -2167,10 +2395,17 @@ class Radio:
         retry = 3
         msg = ""
 
+        # Do not even try the stations that failed their last probe
+        new_id = self.skipDeadStations(new_id, skip_value)
+
         # If Internet OK skip bad channel otherwise stay on current station
         while self.checkInternet():
 
             try:
+                # Connect the relay to the station and its neighbours
+                if self.relay is not None:
+                    self.relay.select(self.PL.getUrl(new_id - 1))
+
                 # Client play starts from 0
                 self.client.play(new_id - 1)
                 success = True
@@ -2185,12 +2420,23 @@ class Radio:
                     "radio.play_radio error id=" + str(new_id) + " :" + str(e),
                     log.ERROR,
                 )
+                # Check the station itself in the background; a lost MPD
+                # connection says nothing about it
+                if self.health is not None and not isinstance(
+                    e, (mpd.ConnectionError, OSError)
+                ):
+                    self.health.recheck(self.PL.getUrl(new_id - 1))
+
+                # The Internet may be down rather than the station
+                if self.network is not None:
+                    self.network.check()
                 retry -= 1
                 if retry < 0:
                     break
                 new_id += skip_value
                 log.message("radio.play: Skipping to station " + str(new_id), log.DEBUG)
-                self.reconnect(self.client)
+                # A broken connection has already been dropped and is being
+                # re-established in the background by MpdConnection
 
                 # If error we want to display this on the screen
                 errMsg = self.parseError(str(e))
@@ -2225,26 +2471,15 @@ class Radio:
 
     # Timeouts due to a bad URL cause corruption of the client
     # stats and status dictionaries. Disconnect and reconnect to
-    # reset the client
-    def reconnect(self, client):
+    # reset the client. The connection is re-established in the
+    # background (MpdConnection); wait for it at most timeout seconds
+    # (client_timeout) as the callers use MPD straight after
+    def reconnect(self, client, timeout=None):
         log.message("radio.reconnect", log.DEBUG)
-        try:
-            self.client.disconnect()
-        except:
-            pass
-
-        # Re-connect
-        self.client = mpd.MPDClient()  # Create the MPD client
-        try:
-            time.sleep(0.5)
-            self.client.connect("localhost", self.mpdport)
-            self.connected = True
-        except Exception as e:
-            log.message("radio.disconnect connect error: " + str(e), log.ERROR)
-            self.connected = False
-
-        # Pass new client to volume class
-        self.volume.setClient(self.client)
+        self.client.reconnect()
+        if timeout is None:
+            timeout = self.config.client_timeout
+        self.connected = self.client.waitConnected(timeout)
         return self.connected
 
     # Clear error and set NO_ERROR
@@ -2329,12 +2564,7 @@ class Radio:
         if len(self.searchlist) < 1:
             artist = "No playlists"
         else:
-            sections = self.searchlist[index].split(" - ")
-            leng = len(sections)
-            if leng > 1:
-                artist = sections[0]
-            else:
-                artist = "Unknown artist"
+            artist = artistName(self.searchlist[index])
         return artist
 
     # Version number
@@ -2356,18 +2586,44 @@ class Radio:
 
     # See if interrupt received from IR remote control
     def getInterrupt(self):
-        interrupt = self.interrupt or self.airplay.getInterrupt()
+        interrupt = self.interrupt
+        if self._airplay is not None and self._airplay.getInterrupt():
+            interrupt = True
         self.interrupt = False
         return interrupt
 
+    # The Airplay and Spotify receivers are only imported and created when
+    # first used, most radios never use them
+    @property
+    def airplay(self):
+        if self._airplay is None:
+            from airplay_class import AirplayReceiver
+
+            self._airplay = AirplayReceiver(self.translate)
+        return self._airplay
+
+    @property
+    def spotify(self):
+        if self._spotify is None:
+            from spotify_class import SpotifyReceiver
+
+            self._spotify = SpotifyReceiver(self.translate)
+        return self._spotify
+
+    # Is Airplay or Spotify playing (False if they have never been used)
+    def receiverRunning(self):
+        airplay = self._airplay is not None and self._airplay.isRunning()
+        spotify = self._spotify is not None and self._spotify.isRunning()
+        return airplay or spotify
+
     # Start Airplay
     def startAirplay(self):
-        self.execMpcCommand("stop")
+        self.stopMpdClient()
         started = self.airplay.start()
         log.message("radio.startAirplay " + str(started), log.DEBUG)
         if not started:
             log.message("radio.startAirplay FAILED", log.ERROR)
-            self.execMpcCommand("play")
+            self.startMpdClient()
         return started
 
     # Stop Airplay
@@ -2381,12 +2637,12 @@ class Radio:
 
     # Start Spotify
     def startSpotify(self):
-        self.execMpcCommand("stop")
+        self.stopMpdClient()
         log.message("radio.startSpotify ", log.DEBUG)
         started = self.spotify.start()
         if not started:
             log.message("radio.startSpotify FAILED", log.ERROR)
-            self.execMpcCommand("play")
+            self.startMpdClient()
         return started
 
     # Stop Spotify
@@ -2611,18 +2867,29 @@ class Radio:
 
         return value
 
-    # Setup the playlist callback
-    def setupPlaylistCallback(self):
-        # Cannot use existing MPD client in a thread so create new
-        newclient = mpd.MPDClient()  # Create the MPD client
-        newclient.connect("localhost", self.mpdport)
-        self.PL.callback(self.playlistChange, newclient)
-
-    # This is the actual playlist callback to update changed playlists
-    # It raises a PLAYLIST_CHANGE event if enabled by update_playlists
-    def playlistChange(self):
-        if self.config.update_playlists:
-            self.event.set(self.event.PLAYLIST_CHANGED)
+    # Start the MPD idle listener. It has its own connection (the main
+    # client must never block in idle) and feeds the player state
+    def startIdleListener(self):
+        self.idle_listener = IdleListener(
+            self.mpdport,
+            self.event,
+            playlist_callback=self.playlistChange,
+            timeout=self.config.client_timeout,
+        )
+        self.state.setListener(self.idle_listener)
+        self.idle_listener.start()
+
+    # This is the playlist callback (idle listener thread) to update changed
+    # playlists. It raises a PLAYLIST_CHANGE event if enabled by update_playlists
+    # The listener has just fetched the status with the queue version
+    def playlistChange(self, client, notify=True):
+        if self.resume_id is not None:
+            return  # The queue is being filled behind the resumed station
+        status = None
+        if self.idle_listener is not None:
+            status = self.idle_listener.model.status()
+        if self.PL.changed(client, status) and notify and self.config.update_playlists:
+            self.event.post(self.event.PLAYLIST_CHANGED)
             print("event.PLAYLIST_CHANGED sent!")
 
     # def handleOffButton(self, gpio, state):
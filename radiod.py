@@ -21,7 +21,15 @@ import sys
 import time
 import traceback
 
+# Imported first, to time the import of the other modules
+from startup_profiler_class import profiler
+
+if "--profile-startup" in sys.argv:
+    sys.argv.remove("--profile-startup")
+    profiler.enable()
+
 import RPi.GPIO as GPIO
+from command_runner_class import runner
 from config_class import Configuration
 from constants import *
 from disco_light import DiscoLight
@@ -32,11 +40,14 @@ from menu_class import Menu
 from message_class import Message
 from radio_class import Radio
 from radio_daemon import Daemon
-from rss_class import Rss
+from scheduler_class import Scheduler
 # For retro radio only
 from status_led_class import StatusLed
 from translate_class import Translate
 
+# The images (images/*.png) are found relative to the radio directory
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
 config = Configuration()
 translate = Translate()
 
@@ -47,7 +58,8 @@ statusLed = None
 log = Log()
 display = Display(translate)
 menu = Menu()
-rss = Rss(translate)
+rss = None  # RSS feed, created when the RSS menu is first displayed
+scheduler = Scheduler()
 _connecting = False
 newMenu = True  # Speed up initial display if new menu entered
 ignoreEvent = False  # Ignore up/down button after double button menu press
@@ -55,6 +67,26 @@ pidfile = "/var/run/radiod.pid"
 _volume = -1
 save_rss_line = ""
 
+# Options of radiod.conf that are read each time they are used, so that a
+# reloaded configuration applies at once. The colours are added from the
+# configuration, see checkConfig for the options applied by radiod
+LIVE_OPTIONS = {
+    "volume_range",
+    "dateformat",
+    "tuner_settle_time",
+    "mute_action",
+    "verbose",
+    "speak_info",
+    "speech_volume",
+    "update_playlists",
+    "letter_search",
+    "instant_resume",
+    "station_names",
+    "shutdown_command",
+    "display_blocks",
+}
+LOG_OPTIONS = {"loglevel", "log_buffer_size", "log_buffer_level"}
+
 
 # Signal SEGV and ABRT handler - Try to dump core
 def signalCrash(signal, frame):
@@ -126,8 +158,7 @@ def interrupt():
         event_name = event.getName()
         if event_type > 0:
             log.message(
-                "radiod.py Event detected " + event_name + " type " + str(event_type),
-                log.DEBUG,
+                "radiod.py Event detected %s type %s", log.DEBUG, event_name, event_type
             )
         else:
             interrupt = False
@@ -171,14 +202,16 @@ class MyDaemon(Daemon):
         global statusLed
         global newMenu
 
-        event = Event(config)  # Must be initialised here
+        with profiler.phase("event"):
+            event = Event(config)  # Must be initialised here
 
         # Set up radio
         if config.log_creation_mode:
             log.truncate()
         log.message("===== Starting radio =====", log.INFO)
-        radio = Radio(menu, event, translate, config, log)
-        message = Message(radio, display, translate)
+        with profiler.phase("radio"):
+            radio = Radio(menu, event, translate, config, log)
+            message = Message(radio, display, translate)
 
         log.message("Python version " + str(sys.version_info[0]), log.INFO)
 
@@ -187,9 +220,10 @@ class MyDaemon(Daemon):
 
         # Initialise display. The Adafruit RGB plate needs the
         # event routine to be passed to it to handle its buttons
-        display.init(callback=event)
-        nlines = display.getLines()
-        displayStartup(display, radio)
+        with profiler.phase("display"):
+            display.init(callback=event)
+            nlines = display.getLines()
+            displayStartup(display, radio)
 
         # LCDs option to switch translation on/off. Switch off for OLEDs
         if display.isOLED():
@@ -201,10 +235,11 @@ class MyDaemon(Daemon):
             romanize = radio.config.romanize
             radio.setRomanize(romanize)  # Switch Romanisation on/off
 
-        ipaddr = radio.waitForNetwork()
         # Start radio and load source (radio, media or airplay)
+        # The network is waited for during the start of MPD
         display.out(2, "Starting MPD")
-        radio.start()
+        with profiler.phase("radio.start"):
+            ipaddr = radio.start(network=True)
 
         # Wait for network
         if nlines > 2:
@@ -221,7 +256,8 @@ class MyDaemon(Daemon):
             log.message(msg, log.INFO)
             display.out(line, msg)
 
-        time.sleep(1.25)  # Allow time to display IP address
+        with profiler.phase("display IP"):
+            time.sleep(1.25)  # Allow time to display IP address
 
         # loadSource(display, radio)
         # current_id = radio.getCurrentID()
@@ -234,80 +270,47 @@ class MyDaemon(Daemon):
         statusLed.set(StatusLed.NORMAL)
         display.refreshVolumeBar()
 
+        # Periodic jobs. In between, the main loop sleeps until an event
+        # is signalled or the next job is due
+        scheduler.add("display", 1.0, refreshDisplay)
+        scheduler.add("timers", 1.0, checkTimers)
+        scheduler.add("mpdstats", 300.0, radio.state.logStats, delay=300.0)
+        scheduler.add("cmdstats", 3600.0, runner.logMetrics, delay=3600.0)
+        scheduler.add("stations", 3600.0, radio.checkStations, delay=3600.0)
+        scheduler.add("config", 5.0, checkConfig, delay=5.0)
+        scheduler.add("buttons", 0.025, display.checkButton, active=display.hasButtons)
+        scheduler.add(
+            "vumeter", 0.05, radio.displayVuMeter, active=lambda: config.pivumeter
+        )
+        scheduler.add(
+            "delay", 0.025, countdownDelay, active=lambda: display.getDelay() > 0
+        )
+        scheduler.add(
+            "tuner",
+            radio.config.tuner_settle_time,
+            radio.commitTuning,
+            active=radio.isTuning,
+        )
+        profiler.mark("main loop")
+        profiler.report(log)
+
         # Main processing loop
         while True:
 
             try:
-                menu_mode = menu.mode()
-
-                if radio.doUpdateLib():
-                    updateLibrary(display, radio, message)
-                    radio.play(1)
-
-                elif menu_mode == menu.MENU_TIME:
-                    displayTimeDate(display, radio, message)
-                    if radio.muted():
-                        displayVolume(display, radio)
-                    else:
-                        displayCurrent(display, radio, message)
-
-                elif menu_mode == menu.MENU_SEARCH:
-                    displaySearch(display, menu, message)
-
-                elif menu_mode == menu.MENU_SOURCE:
-                    displaySource(display, radio, menu, message)
-
-                elif menu_mode == menu.MENU_OPTIONS:
-                    displayOptions(display, radio, menu, message)
-
-                elif menu_mode == menu.MENU_RSS:
-                    if display.hasScreen():
-                        displayRss(display, radio, message, rss)
-                        displayVolume(display, radio)
-                    else:
-                        menu.set(menu.MENU_TIME)  # Skip RSS
-
-                elif menu_mode == menu.MENU_INFO:
-                    if display.getDelay() > 0:
-                        displayVolume(display, radio)
-                    else:
-                        displayInfo(display, radio, message)
-
-                elif menu_mode == menu.MENU_SLEEP:
-                    displaySleep(display, radio)
-
-                # Check if the timer has expired (if so it sets an event)
-                radio.checkTimer()
-
-                # Check if the alarm has triggered (if so it sets an event)
-                radio.checkAlarm()
-
-                # If the display has buttons check if pressed (Generates an event)
-                if display.hasButtons():
-                    display.checkButton()
-
                 # If an event was detected go handle it
-                if event.detected():
+                if event.wait(scheduler.timeout()):
+                    radio.state.invalidate()
                     handleEvent(event, display, radio, menu)
+                    if display.getDelay() < 1:
+                        display.noScrolling(False)
 
-                radio.displayVuMeter()
-
-                # Keep MPD connection alive
-                radio.ping()
-
-                # When volume switches or rotary encoder operated display
-                # message scrolling is suppressed for a few seconds to speed
-                # up the volume change operation.
-                d = display.decrementDelay()
-                if d < 1:
-                    display.noScrolling(False)
-                else:
-                    display.noScrolling(True)
-
-                displayBacklight(radio, menu, display)
+                    # Show the result of the event straight away
+                    scheduler.reschedule("display")
 
-                # This delay is important and should be more than switch bounce times
-                time.sleep(0.025)
+                # All the getters of this pass share one MPD status/currentsong
+                radio.state.invalidate()
+                scheduler.run_due()
 
             except KeyboardInterrupt:
                 print("Stopped")
@@ -351,6 +354,106 @@ class MyDaemon(Daemon):
 # End of class overrides
 
 
+# Refresh the display for the current menu. Returns the delay in seconds
+# before the next refresh (scheduler task)
+def refreshDisplay():
+    menu_mode = menu.mode()
+
+    if radio.doUpdateLib():
+        updateLibrary(display, radio, message)
+        radio.play(1)
+
+    elif menu_mode == menu.MENU_TIME:
+        displayTimeDate(display, radio, message)
+        if radio.muted():
+            displayVolume(display, radio)
+        else:
+            displayCurrent(display, radio, message)
+
+    elif menu_mode == menu.MENU_SEARCH:
+        displaySearch(display, menu, message)
+
+    elif menu_mode == menu.MENU_SOURCE:
+        displaySource(display, radio, menu, message)
+
+    elif menu_mode == menu.MENU_OPTIONS:
+        displayOptions(display, radio, menu, message)
+
+    elif menu_mode == menu.MENU_RSS:
+        if display.hasScreen():
+            displayRss(display, radio, message, getRss())
+            displayVolume(display, radio)
+        else:
+            menu.set(menu.MENU_TIME)  # Skip RSS
+
+    elif menu_mode == menu.MENU_INFO:
+        if display.getDelay() > 0:
+            displayVolume(display, radio)
+        else:
+            displayInfo(display, radio, message)
+
+    elif menu_mode == menu.MENU_SLEEP:
+        displaySleep(display, radio)
+
+    displayBacklight(radio, menu, display)
+
+    # A scrolling line is redrawn straight away (scrolling blocks until done
+    # or interrupted), otherwise refresh just after the next second boundary
+    # for the clock and the media progress
+    if display.scrolled():
+        return 0
+    return 1.01 - time.time() % 1
+
+
+# Check if the timer has expired or the alarm has triggered (if so they set an event)
+def checkTimers():
+    radio.checkTimer()
+    radio.checkAlarm()
+
+
+# Reload /etc/radiod.conf if it has been modified and apply the changes
+# in place. Options used when the radio starts need a restart of radiod
+def checkConfig():
+    if not config.modified():
+        return
+    changed = config.reload()
+    if len(changed) < 1:
+        return
+    applied = (LIVE_OPTIONS | set(config.colors)) & set(changed)
+
+    if LOG_OPTIONS & set(changed):
+        log.reload()
+        applied |= LOG_OPTIONS & set(changed)
+
+    if "scroll_speed" in changed:
+        display.setScrollSpeed(config.scroll_speed)
+        applied.add("scroll_speed")
+
+    if set(config.colors) & set(changed):
+        displayBacklight(radio, menu, display)
+
+    applied |= radio.applyConfig(changed)
+
+    for option in sorted(applied):
+        old, new = changed[option]
+        log.message("radiod.conf %s changed from %s to %s" % (option, old, new), log.INFO)
+    restart = sorted(set(changed) - applied)
+    if len(restart) > 0:
+        msg = "radiod.conf changes applied after a restart: " + ", ".join(restart)
+        log.message(msg, log.WARNING)
+
+
+# When volume switches or rotary encoder operated display
+# message scrolling is suppressed for a few seconds to speed
+# up the volume change operation.
+def countdownDelay():
+    if display.decrementDelay() < 1:
+        display.noScrolling(False)
+        scheduler.reschedule("display")
+    else:
+        display.noScrolling(True)
+
+
 # Pass events to the appropriate event handler
 def handleEvent(event, display, radio, menu):
     global ignoreEvent
@@ -363,7 +466,7 @@ def handleEvent(event, display, radio, menu):
     statusLed.set(StatusLed.BUSY)
 
     if event_type != event.NO_EVENT:
-        log.message("Event type " + str(event_type) + " " + event_name, log.DEBUG)
+        log.message("Event type %s %s", log.DEBUG, event_type, event_name)
 
     # Used when double button menu pressed to prevent extraneous events
     if ignoreEvent:
@@ -390,8 +493,16 @@ def handleEvent(event, display, radio, menu):
                 time.sleep(0.2)
                 break
 
+    # Also in sleep mode: the monitor only posts the changes
+    if event_type == event.NETWORK_CHANGED:
+        radio.handleNetworkChange(replay=menu_mode != menu.MENU_SLEEP)
+
+    # Playlist of the station resumed at start-up loaded in the background
+    elif event_type == event.RESUMED:
+        radio.handleResumed()
+
     # Exit from sleep if  menu button pressed
-    if menu_mode == menu.MENU_SLEEP:
+    elif menu_mode == menu.MENU_SLEEP:
         if event_type == event.MENU_BUTTON_DOWN:
             wakeup(radio, menu)
 
@@ -410,6 +521,10 @@ def handleEvent(event, display, radio, menu):
     ):
         handleUdpEvent(event, display, radio, message)
 
+    # Not passed on to the menu handlers, which take it for a key press
+    elif event_type == event.MPD_CLIENT_CHANGE:
+        log.message("handleEvent Client Change", log.DEBUG)
+
     elif menu_mode == menu.MENU_SOURCE:
         handleSourceEvent(event, display, radio, menu)
 
@@ -419,9 +534,6 @@ def handleEvent(event, display, radio, menu):
     elif menu_mode == menu.MENU_OPTIONS:
         handleOptionEvent(event, display, radio, menu)
 
-    elif event_type == event.MPD_CLIENT_CHANGE:
-        log.message("handleEvent Client Change", log.DEBUG)
-
     elif event_type == event.PLAY:
         play_number = event.getPlayNumber()
         log.message("handleEvent Play " + str(play_number), log.DEBUG)
@@ -457,7 +569,7 @@ def handleRadioEvent(event, display, radio, menu):
     # if display.isOLED():
     #   vDelay = 4
 
-    log.message("handleRadioEvent " + str(event_type) + " " + event_name, log.DEBUG)
+    log.message("handleRadioEvent %s %s", log.DEBUG, event_type, event_name)
 
     if event_type == event.VOLUME_UP:
 
@@ -649,11 +761,17 @@ def handleSearchEvent(event, display, radio, menu):
     source_type = radio.getSourceType()
 
     if event_type == event.UP_SWITCH:
-        radio.getNext(UP)
+        if menu.getSearchMode() == menu.SEARCH_LETTERS:
+            radio.findNextLetter(UP)
+        else:
+            radio.getNext(UP)
         radio.setLoadNew(True)
 
     elif event_type == event.DOWN_SWITCH:
-        radio.getNext(DOWN)
+        if menu.getSearchMode() == menu.SEARCH_LETTERS:
+            radio.findNextLetter(DOWN)
+        else:
+            radio.getNext(DOWN)
         radio.setLoadNew(True)
 
     elif event_type == event.LEFT_SWITCH and source_type == radio.source.MEDIA:
@@ -683,6 +801,19 @@ def handleMenuChange(display, radio, menu, message):
     global newMenu, _volume
     newMenu = True
     current_menu = menu.get()  # Needed for alarm check
+
+    # In the search menu the tuner knob first switches to jumps by letter
+    if (
+        current_menu == menu.MENU_SEARCH
+        and menu.getSearchMode() == menu.SEARCH_TRACKS
+        and radio.config.letter_search
+        and radio.getPlayListLength() > 0
+    ):
+        menu.setSearchMode(menu.SEARCH_LETTERS)
+        message.speak(radio.getSearchLetter(radio.getSearchIndex()))
+        time.sleep(0.2)  # Prevent skipping next menu
+        return current_menu
+
     menu_mode = menu.cycle()
     menu_name = menu.getName()
 
@@ -835,7 +966,7 @@ def handleUdpEvent(event, display, radio, message):
         radio.cycleWebSource(radio.source.SPOTIFY)
     else:
         valid_event = False
-        log.message("radio.handleUdpEvent invalid event:", str(event_type), log.ERROR)
+        log.message("radio.handleUdpEvent invalid event: %s", log.ERROR, event_type)
 
     if valid_event:
         loadSource(display, radio)
@@ -990,7 +1121,11 @@ def displaySearch(display, menu, message):
     if display.getWidth() < 16:
         sSearch = "menu_find"
 
-    display.out(1, message.get(sSearch) + ":" + str(index + 1), interrupt)
+    if menu.getSearchMode() == menu.SEARCH_LETTERS:
+        letter = radio.getSearchLetter(index)
+        display.out(1, message.get(sSearch) + " " + letter + ":" + str(index + 1), interrupt)
+    else:
+        display.out(1, message.get(sSearch) + ":" + str(index + 1), interrupt)
 
     if source_type == radio.source.MEDIA:
         current_artist = radio.getArtistName(index)
@@ -1137,6 +1272,16 @@ def displayOptions(display, radio, menu, message):
     newMenu = False
 
 
+# Get the RSS feed, its class is only imported when first used
+def getRss():
+    global rss
+    if rss is None:
+        from rss_class import Rss
+
+        rss = Rss(translate)
+    return rss
+
+
 # Display the RSS feed
 def displayRss(display, radio, message, rss):
     global newMenu, save_rss_line
@@ -1580,13 +1725,14 @@ def statusLedInitialise(statuLed):
 
 # Execute system command
 def execCommand(cmd):
-    p = os.popen(cmd)
-    result = p.readline().rstrip("\n")
-    return result
+    return runner.execCommand(cmd)
 
 
 def usage():
-    print("usage: %s start|stop|restart|status|version|build|nodaemon" % sys.argv[0])
+    print(
+        "usage: %s [--profile-startup] start|stop|restart|status|version|build|nodaemon"
+        % sys.argv[0]
+    )
 
 
 # End of class
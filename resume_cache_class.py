@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""Define the cache used to resume the last radio playlist at once.
+
+At start-up, :meth:`.Radio.loadSource` had to clear the MPD queue, load the
+whole playlist, fetch it back and build the search list before playing the
+last station, and that takes a while with a large playlist.
+:class:`ResumeCache` keeps the entries (resolved stream URLs) and the search
+list of the last loaded radio playlist in one compact JSON file. The radio
+plays the entry of the stored station straight away, shows the cached search
+list, then loads and checks the full playlist in the background.
+
+The cache is only written when a playlist is loaded with a different content,
+not at each station change: the last station is the ``current_station`` of
+the state store.
+
+"""
+import json
+import os
+import threading
+
+from log_class import Log
+
+log = Log()
+
+RADIO_LIB_DIR = "/var/lib/radiod"
+RESUME_FILE = "resume_cache.json"
+
+
+class ResumeCache:
+    """Keep the entries and search list of the last radio playlist."""
+
+    def __init__(self, directory: str = RADIO_LIB_DIR) -> None:
+        """Create the cache; the file is read at the first :meth:`get`.
+
+        Parameters
+        ----------
+        directory : str, optional
+            Directory of the cache file.
+
+        """
+        if len(log.getName()) < 1:
+            log.init("radio")
+        self.path = os.path.join(directory, RESUME_FILE)
+        self._lock = threading.Lock()
+        self._data: dict | None = None
+
+    def get(self, name: str) -> tuple[list[str], list[str]] | None:
+        """Give the entries and search list of playlist ``name``.
+
+        Returns
+        -------
+        tuple[list[str], list[str]] | None
+            The stream URLs as given by ``listplaylist`` and the station
+            names; None if the cache is missing, invalid or for another
+            playlist.
+
+        """
+        with self._lock:
+            data = self._read()
+        if data.get("name") != name:
+            return None
+        entries = data.get("entries")
+        searchlist = data.get("searchlist")
+        if (
+            not isinstance(entries, list)
+            or not isinstance(searchlist, list)
+            or not entries
+            or len(entries) != len(searchlist)
+        ):
+            return None
+        return entries, searchlist
+
+    def save(self, name: str, entries: list[str], searchlist: list[str]) -> bool:
+        """Store playlist ``name``; give False if it was already stored."""
+        data = {"name": name, "entries": list(entries), "searchlist": list(searchlist)}
+        with self._lock:
+            if self._read() == data:
+                return False
+            self._data = data
+            tmp = self.path + ".tmp"
+            try:
+                with open(tmp, "w") as f:
+                    json.dump(data, f, separators=(",", ":"))
+                os.replace(tmp, self.path)
+            except OSError as e:
+                log.message(f"resume_cache: cannot write {self.path}: {e}", log.ERROR)
+                return False
+        log.message(
+            "resume_cache: %s saved, %d entries", log.DEBUG, name, len(entries)
+        )
+        return True
+
+    def clear(self) -> None:
+        """Forget the cache, eg when its playlist has been edited."""
+        with self._lock:
+            self._data = {}
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def _read(self) -> dict:
+        """Give the content of the cache, read once from the file."""
+        if self._data is None:
+            try:
+                with open(self.path) as f:
+                    self._data = json.load(f)
+            except FileNotFoundError:
+                self._data = {}
+            except (OSError, ValueError) as e:
+                log.message(f"resume_cache: cannot read {self.path}: {e}", log.ERROR)
+                self._data = {}
+            if not isinstance(self._data, dict):
+                self._data = {}
+        return self._data
+
+
+if __name__ == "__main__":
+    import tempfile
+    import time
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ResumeCache(directory)
+        assert cache.get("Radio") is None
+
+        size = 2000
+        entries = [f"http://stream{n}.example.org/live#Station {n}" for n in range(size)]
+        names = [f"Station {n}" for n in range(size)]
+        assert cache.save("Radio", entries, names)
+        assert not cache.save("Radio", entries, names)
+
+        start = time.perf_counter()
+        cached = ResumeCache(directory).get("Radio")
+        elapsed = time.perf_counter() - start
+        assert cached == (entries, names)
+        assert ResumeCache(directory).get("Jazz") is None
+        print(
+            f"{size} stations: {os.path.getsize(cache.path) // 1024} KB, "
+            f"read in {elapsed * 1000:.1f}ms"
+        )
+
+        cache.clear()
+        assert ResumeCache(directory).get("Radio") is None
@@ -22,6 +22,7 @@ import pdb
 
 from xml.dom.minidom import parseString
 from log_class import Log
+from command_runner_class import runner
 
 log = Log()
 url = "/var/lib/radiod/rss"
@@ -183,10 +184,8 @@ class Rss:
         return s    
 
     # Execute system command
-    def execCommand(self,cmd):
-        p = os.popen(cmd)
-        result = p.readline().rstrip('\n')
-        return result
+    def execCommand(self,cmd,wait=True):
+        return runner.execCommand(cmd, wait=wait)
 
     # Strip string (between tags)
     def _strip_string(self, text, s_start, s_end):
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""Define a scheduler for the periodic jobs of the radio daemon.
+
+The main loop of :file:`radiod.py` used to wake up every 25 ms and poll every
+subsystem, whether or not anything had changed. Instead, every periodic job is
+registered here with its own interval; the main loop blocks in
+:meth:`.Event.wait` until either an event is signalled or the next job is due.
+
+"""
+import time
+from collections.abc import Callable
+
+from log_class import Log
+
+log = Log()
+
+
+class Task:
+    """A periodic job of the :class:`Scheduler`."""
+
+    def __init__(
+        self,
+        name: str,
+        interval: float,
+        callback: Callable[[], float | None],
+        active: Callable[[], bool] | None = None,
+        due: float = 0.0,
+    ) -> None:
+        """Create the task.
+
+        Parameters
+        ----------
+        name : str
+            Unique name of the task.
+        interval : float
+            Default delay in seconds between two runs.
+        callback : Callable[[], float | None]
+            Function to run. If it returns a number, it is used as the delay
+            before the next run instead of ``interval``.
+        active : Callable[[], bool] | None, optional
+            If given, the task is only run, and only wakes up the main loop,
+            while this returns True. A task that becomes active after being
+            overdue runs at the next wake-up.
+        due : float, optional
+            Monotonic time at which the task must run next.
+
+        """
+        self.name = name
+        self.interval = interval
+        self.callback = callback
+        self.active = active
+        self.due = due
+
+    def is_active(self) -> bool:
+        """Tell if the task should currently run."""
+        return self.active is None or bool(self.active())
+
+
+class Scheduler:
+    """Keep track of the periodic tasks and of when they are due."""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic) -> None:
+        """Create an empty scheduler.
+
+        Parameters
+        ----------
+        clock : Callable[[], float], optional
+            Monotonic clock, in seconds.
+
+        """
+        if len(log.getName()) < 1:
+            log.init("radio")
+        self._clock = clock
+        self._tasks: dict[str, Task] = {}
+
+    def add(
+        self,
+        name: str,
+        interval: float,
+        callback: Callable[[], float | None],
+        active: Callable[[], bool] | None = None,
+        delay: float = 0.0,
+    ) -> Task:
+        """Register a new task; see :class:`Task` for the parameters.
+
+        The task first runs ``delay`` seconds from now.
+
+        """
+        task = Task(name, interval, callback, active, self._clock() + delay)
+        self._tasks[name] = task
+        log.message(f"scheduler.add {name} every {interval}s", log.DEBUG)
+        return task
+
+    def remove(self, name: str) -> None:
+        """Unregister a task, if it exists."""
+        self._tasks.pop(name, None)
+
+    def reschedule(self, name: str, delay: float = 0.0) -> None:
+        """Make the task ``name`` due in ``delay`` seconds."""
+        task = self._tasks.get(name)
+        if task is not None:
+            task.due = self._clock() + delay
+
+    def timeout(self) -> float | None:
+        """Give the time in seconds until the next task is due.
+
+        Returns
+        -------
+        float | None
+            Zero if a task is already overdue. None if there is no active task
+            at all, in which case the caller can block until the next event.
+
+        """
+        dues = [task.due for task in self._tasks.values() if task.is_active()]
+        if not dues:
+            return None
+        return max(0.0, min(dues) - self._clock())
+
+    def run_due(self) -> int:
+        """Run all the tasks that are due.
+
+        Returns
+        -------
+        int
+            Number of tasks that were actually run.
+
+        """
+        now = self._clock()
+        ran = 0
+        for task in list(self._tasks.values()):
+            if task.due > now or not task.is_active():
+                continue
+
+            delay = task.callback()
+            ran += 1
+            if delay is None:
+                delay = task.interval
+            task.due = self._clock() + max(0.0, delay)
+        return ran
+
+
+if __name__ == "__main__":
+    scheduler = Scheduler()
+    counts = {"fast": 0, "slow": 0}
+
+    def fast() -> None:
+        counts["fast"] += 1
+
+    def slow() -> float:
+        counts["slow"] += 1
+        return 0.5
+
+    scheduler.add("fast", 0.1, fast)
+    scheduler.add("slow", 10.0, slow)
+    scheduler.add("never", 0.05, fast, active=lambda: False)
+
+    end = time.monotonic() + 2.0
+    wakeups = 0
+    while time.monotonic() < end:
+        timeout = scheduler.timeout()
+        assert timeout is not None
+        time.sleep(timeout)
+        scheduler.run_due()
+        wakeups += 1
+
+    print(f"{counts = } in {wakeups} wake-ups")
+    assert 15 <= counts["fast"] <= 21, counts
+    assert 3 <= counts["slow"] <= 5, counts
@@ -26,6 +26,7 @@ import subprocess
 import pdb
 import threading
 import select
+from command_runner_class import runner
 
 args = ['journalctl', '--lines', '0', '--follow', '_SYSTEMD_UNIT=raspotify.service']
 
@@ -48,7 +49,7 @@ class SpotifyReceiver:
     # Stop Spotify
     def stop(self):
         self.execCommand("sudo systemctl stop raspotify.service")
-        self.execCommand("killall journalctl")
+        self.execCommand("killall journalctl", wait=False)
         self.running = False
         return self.running
 
@@ -57,9 +58,8 @@ class SpotifyReceiver:
         return self.running
 
     # Simple execute command
-    def execCommand(self,cmd):
-        p = os.popen(cmd)
-        return  p.readline().rstrip('\n')
+    def execCommand(self,cmd,wait=True):
+        return runner.execCommand(cmd, wait=wait)
 
     # Return playing title information
     def getInfo(self):
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""Define the start-up timeline of the radio.
+
+The time from power on to the first station is spent in imports of the radio
+modules, in the display initialisation, in the network wait and in
+:meth:`.Radio.start`, and nothing told which one was slow.
+``radiod.py --profile-startup nodaemon`` enables :data:`profiler`, which
+records:
+
+* the time to import each module, including and excluding the modules it
+  imports itself;
+* the start and the duration of the phases marked with :meth:`phase`;
+* the instants marked with :meth:`mark`, such as the first play.
+
+:meth:`StartupProfiler.report` writes the timeline to the log (and to the
+console in ``nodaemon`` mode). When the profiler is not enabled, the phases
+and marks cost a function call.
+
+This module only uses the standard library, so that it can be imported before
+the radio modules whose import it times.
+
+"""
+import importlib.abc
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+class _TimedLoader(importlib.abc.Loader):
+    """Wrap the loader of a module to time the execution of the module."""
+
+    def __init__(self, loader, name: str, timer: "_ImportTimer") -> None:
+        self._loader = loader
+        self._name = name
+        self._timer = timer
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module) -> None:
+        self._timer.enter(self._name)
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._timer.leave(self._name)
+
+    def __getattr__(self, name: str):
+        # get_data, is_package, get_resource_reader... of the real loader
+        return getattr(self._loader, name)
+
+
+class _ImportTimer(importlib.abc.MetaPathFinder):
+    """Find the modules with the other finders and time their loading."""
+
+    def __init__(self, profiler: "StartupProfiler") -> None:
+        self._profiler = profiler
+        self._local = threading.local()
+
+    def find_spec(self, fullname: str, path, target=None):
+        if getattr(self._local, "finding", False):
+            return None
+        self._local.finding = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(fullname, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self._local.finding = False
+        if spec.loader is None or not hasattr(spec.loader, "exec_module"):
+            return spec
+        spec.loader = _TimedLoader(spec.loader, fullname, self)
+        return spec
+
+    def enter(self, name: str) -> None:
+        """Start timing a module; its parent's own time is paused."""
+        stack = self._stack()
+        stack.append([name, time.perf_counter(), 0.0])
+
+    def leave(self, name: str) -> None:
+        """Stop timing a module and record it."""
+        stack = self._stack()
+        name, start, children = stack.pop()
+        total = time.perf_counter() - start
+        if stack:
+            stack[-1][2] += total
+        self._profiler.recordImport(name, start, total, total - children)
+
+    def _stack(self) -> list:
+        """Give the stack of the modules being imported by this thread."""
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+
+class StartupProfiler:
+    """Record the imports, phases and marks of the radio start-up."""
+
+    def __init__(self) -> None:
+        """Create a disabled profiler."""
+        self.enabled = False
+        self.start = time.perf_counter()
+        self._lock = threading.Lock()
+        # (start, duration, name) of the phases and marks, in seconds
+        self.phases: list[tuple[float, float, str]] = []
+        self.marks: list[tuple[float, str]] = []
+        # name -> (start, total, own) of the imported modules
+        self.imports: dict[str, tuple[float, float, float]] = {}
+        self._timer: _ImportTimer | None = None
+        self._reported = False
+
+    def enable(self) -> None:
+        """Start recording; call before importing the modules to time."""
+        if self.enabled:
+            return
+        self.enabled = True
+        self.start = time.perf_counter()
+        self._timer = _ImportTimer(self)
+        sys.meta_path.insert(0, self._timer)
+
+    def disable(self) -> None:
+        """Stop timing the imports."""
+        if self._timer in sys.meta_path:
+            sys.meta_path.remove(self._timer)
+        self._timer = None
+        self.enabled = False
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time the block of a ``with`` statement as the phase ``name``."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases.append((start, time.perf_counter() - start, name))
+
+    def mark(self, name: str, once: bool = True) -> None:
+        """Record the instant of an event, such as the first play.
+
+        Parameters
+        ----------
+        name : str
+            Name of the event.
+        once : bool, optional
+            Only record the first occurrence of the event.
+
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if once and any(mark == name for _, mark in self.marks):
+                return
+            self.marks.append((time.perf_counter(), name))
+
+    def recordImport(self, name: str, start: float, total: float, own: float) -> None:
+        """Record the import of a module (import hook)."""
+        with self._lock:
+            self.imports[name] = (start, total, own)
+
+    def lines(self, count: int = 15) -> list[str]:
+        """Give the timeline as text lines.
+
+        Parameters
+        ----------
+        count : int, optional
+            Number of the slowest imports listed.
+
+        """
+        with self._lock:
+            phases = sorted(self.phases)
+            marks = sorted(self.marks)
+            imports = dict(self.imports)
+
+        lines = ["Startup timeline (seconds from start):"]
+        events = [(start, f"{duration:7.3f}s  {name}") for start, duration, name in phases]
+        events += [(instant, f"{'':8s}  * {name}") for instant, name in marks]
+        for instant, text in sorted(events):
+            lines.append(f"{instant - self.start:8.3f}  {text}")
+
+        total = sum(own for _, _, own in imports.values())
+        lines.append(f"Imports: {len(imports)} modules, {total:.3f}s")
+        slowest = sorted(imports.items(), key=lambda item: -item[1][2])[:count]
+        for name, (start, inclusive, own) in slowest:
+            lines.append(f"{own:8.3f}s own {inclusive:8.3f}s total  {name}")
+        return lines
+
+    def report(self, log=None) -> None:
+        """Write the timeline once, to ``log`` if given and to stdout if a tty.
+
+        Parameters
+        ----------
+        log : Log | None, optional
+            Log of the radio.
+
+        """
+        if not self.enabled or self._reported:
+            return
+        self._reported = True
+        self.disable()
+        for line in self.lines():
+            if log is not None:
+                log.message(line, log.INFO)
+            if sys.stdout.isatty():
+                print(line)
+
+
+# Shared by all the modules
+profiler = StartupProfiler()
+
+
+if __name__ == "__main__":
+    profiler.enable()
+    with profiler.phase("imports"):
+        import json
+        import xml.dom.minidom
+    with profiler.phase("work"):
+        time.sleep(0.05)
+        profiler.mark("first play")
+        profiler.mark("first play")
+    assert len(profiler.marks) == 1
+    assert "xml.dom.minidom" in profiler.imports
+    for line in profiler.lines(5):
+        print(line)
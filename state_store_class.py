@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""Define the store of the radio state kept in ``/var/lib/radiod``.
+
+The state (current station and track, source, volume, timer, alarm...) used
+to be kept in one small file per value, most of them written with
+``execCommand("echo N > file")``: a ``/bin/sh`` fork per change, some of them
+at every station change. :class:`StateStore` holds the state in memory and
+writes it behind, at most once per ``interval``, in a single JSON file
+replaced atomically; it never forks.
+
+The old files are still written at every flush, as the shell scripts and the
+web interface read them. They are also read at start-up when they are newer
+than the JSON file (first run, or edited while the radio was stopped), and
+while the radio runs when their modification time is no longer the one of
+the last flush (written by a script or the web interface).
+``mixer_volume_id`` belongs to ``set_mixer_id.sh`` and is left alone.
+
+"""
+import atexit
+import json
+import os
+import threading
+
+from log_class import Log
+
+log = Log()
+
+RADIO_LIB_DIR = "/var/lib/radiod"
+STATE_FILE = "radiod_state.json"
+
+# Values kept in the store, with their default and the type of the value;
+# the key is also the name of the legacy file in the lib directory
+DEFAULTS = {
+    "current_station": 1,
+    "current_track": 1,
+    "source": 0,
+    "source_name": "Radio",
+    "volume": 75,
+    "mixer_volume": 90,
+    "timer": 30,
+    "alarm": "0:07:00",
+    "streaming": "off",
+    "random": 0,
+}
+
+
+class StateStore:
+    """Keep the radio state in memory and write it behind."""
+
+    def __init__(self, directory: str = RADIO_LIB_DIR, interval: float = 2.0) -> None:
+        """Load the state and start the writer thread.
+
+        Parameters
+        ----------
+        directory : str, optional
+            Directory of the JSON file and of the legacy files.
+        interval : float, optional
+            The changes are written this number of seconds after the first
+            of them, all together.
+
+        """
+        if len(log.getName()) < 1:
+            log.init("radio")
+        self.directory = directory
+        self.interval = interval
+        self.path = os.path.join(directory, STATE_FILE)
+
+        self._lock = threading.Lock()
+        self._values: dict = dict(DEFAULTS)
+        self._dirty: set[str] = set()
+        # Modification times of the legacy files as last read or written
+        self._mtimes: dict[str, int] = {}
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self.flushes = 0
+
+        self.load()
+        self._thread = threading.Thread(
+            target=self._run, name="state_store", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def keyOf(self, filename: str) -> str | None:
+        """Give the key of a legacy file path, None if not in the store."""
+        directory, name = os.path.split(filename)
+        if os.path.normpath(directory) != os.path.normpath(self.directory):
+            return None
+        return name if name in DEFAULTS else None
+
+    def get(self, key: str, default=None):
+        """Give a value; ``default`` is only used for unknown keys.
+
+        The legacy file is read again if another program has written it
+        since the last flush, unless the value has a change to write.
+
+        """
+        with self._lock:
+            if key in DEFAULTS and key not in self._dirty:
+                self._reload(key)
+            return self._values.get(key, default)
+
+    def _reload(self, key: str) -> None:
+        """Read the legacy file of ``key`` if changed, with the lock held."""
+        legacy = os.path.join(self.directory, key)
+        try:
+            mtime = os.stat(legacy).st_mtime_ns
+            if mtime == self._mtimes.get(key):
+                return
+            self._mtimes[key] = mtime
+            value = self._read(key)
+        except FileNotFoundError:
+            return  # Written again at the next change
+        except (OSError, ValueError) as e:
+            log.message(f"state_store: cannot read {legacy}: {e}", log.ERROR)
+            return
+        if value is not None and value != self._values[key]:
+            log.message(f"state_store: {legacy} changed to {value}", log.INFO)
+            self._values[key] = value
+            self._dirty.add(key)  # Into the JSON file
+            self._wakeup.set()
+
+    def _read(self, key: str):
+        """Give the value of a legacy file, None if the file is empty."""
+        with open(os.path.join(self.directory, key)) as f:
+            text = f.read().strip()
+        if not text:
+            return None
+        return int(text) if isinstance(DEFAULTS[key], int) else text
+
+    def set(self, key: str, value) -> None:
+        """Change a value; it is written within ``interval`` seconds."""
+        with self._lock:
+            if self._values.get(key) == value:
+                return
+            self._values[key] = value
+            self._dirty.add(key)
+        self._wakeup.set()
+
+    def load(self) -> None:
+        """Read the JSON file, then the legacy files newer than it."""
+        stored = {}
+        stored_time = 0.0
+        try:
+            with open(self.path) as f:
+                stored = json.load(f)
+            stored_time = os.path.getmtime(self.path)
+        except FileNotFoundError:
+            log.message(f"state_store: no {self.path}, migrating legacy files", log.INFO)
+        except (OSError, ValueError) as e:
+            log.message(f"state_store: cannot read {self.path}: {e}", log.ERROR)
+
+        for key, default in DEFAULTS.items():
+            value = stored.get(key, default)
+            legacy = os.path.join(self.directory, key)
+            try:
+                mtime = os.stat(legacy).st_mtime_ns
+                self._mtimes[key] = mtime
+                if mtime / 1e9 > stored_time:
+                    text = self._read(key)
+                    if text is not None:
+                        value = text
+                    else:
+                        self._dirty.add(key)  # Rewrite an empty file
+            except FileNotFoundError:
+                self._dirty.add(key)  # Create the missing file
+            except (OSError, ValueError) as e:
+                log.message(f"state_store: cannot read {legacy}: {e}", log.ERROR)
+            self._values[key] = value
+
+        if stored_time == 0.0:
+            self._dirty.update(DEFAULTS)
+        self.flush()
+
+    def flush(self) -> None:
+        """Write the pending changes now: JSON file and legacy files."""
+        with self._lock:
+            if not self._dirty:
+                return
+            dirty = self._dirty
+            self._dirty = set()
+            values = dict(self._values)
+
+        try:
+            for key in dirty:
+                legacy = os.path.join(self.directory, key)
+                with open(legacy + ".tmp", "w") as f:
+                    f.write(f"{values[key]}\n")
+                os.replace(legacy + ".tmp", legacy)
+                with self._lock:
+                    self._mtimes[key] = os.stat(legacy).st_mtime_ns
+
+            # Written last, so that the legacy files are not newer at start-up
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(values, f, indent=1, sort_keys=True)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            self.flushes += 1
+        except OSError as e:
+            log.message(f"state_store: cannot write {self.directory}: {e}", log.ERROR)
+            with self._lock:
+                self._dirty.update(dirty)  # Try again at the next flush
+
+    def close(self) -> None:
+        """Stop the writer thread and write the pending changes."""
+        self._stopping.set()
+        self._wakeup.set()
+        self._thread.join(1.0)
+        self.flush()
+
+    def _run(self) -> None:
+        """Wait for a change, let the next ones gather, then flush."""
+        while not self._stopping.is_set():
+            self._wakeup.wait()
+            self._wakeup.clear()
+            # Changes made during this wait are written by the same flush
+            self._stopping.wait(self.interval)
+            self.flush()
+
+
+if __name__ == "__main__":
+    import tempfile
+    import time
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Legacy files as written by the previous versions
+        with open(os.path.join(directory, "current_station"), "w") as f:
+            f.write("12\n")
+        with open(os.path.join(directory, "alarm"), "w") as f:
+            f.write("1:07:30\n")
+
+        store = StateStore(directory, interval=0.2)
+        assert store.get("current_station") == 12
+        assert store.get("alarm") == "1:07:30"
+        assert store.get("volume") == 75
+        assert store.keyOf(os.path.join(directory, "volume")) == "volume"
+        assert store.keyOf(os.path.join(directory, "mixer_volume_id")) is None
+
+        flushes = store.flushes
+        start = time.perf_counter()
+        for station in range(1, 101):
+            store.set("current_station", station)
+        elapsed = time.perf_counter() - start
+        time.sleep(0.5)
+        print(f"100 changes in {elapsed * 1e6:.0f}us, {store.flushes - flushes} flush")
+        assert store.flushes - flushes == 1
+
+        with open(os.path.join(directory, "current_station")) as f:
+            assert f.read() == "100\n"
+
+        # A legacy file written by the web interface while the radio runs
+        time.sleep(0.01)
+        with open(os.path.join(directory, "volume"), "w") as f:
+            f.write("40\n")
+        assert store.get("volume") == 40
+        time.sleep(0.5)
+        with open(os.path.join(directory, STATE_FILE)) as f:
+            assert json.load(f)["volume"] == 40
+
+        store.set("streaming", "on")
+        store.close()
+        assert StateStore(directory).get("streaming") == "on"
+        print(open(os.path.join(directory, STATE_FILE)).read())
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""Define a background health check of the radio stations.
+
+:meth:`.Radio.play_radio` only finds out that a station is dead after MPD
+failed to open it, which takes seconds per station when zapping through a
+list with a few broken URLs. :class:`StationHealth` probes all the URLs of
+the RADIO playlist concurrently in a background thread: it sends a ``GET``
+and reads the first bytes of the stream. The status, latency and codec of
+every station are kept in a JSON cache in ``/var/lib/radiod``, so that
+:meth:`StationHealth.isDead` answers instantly, even right after a restart.
+
+"""
+import http.client
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from log_class import Log
+
+log = Log()
+
+HEALTH_FILE = "/var/lib/radiod/station_health.json"
+
+# Bytes read from a stream to check that audio is really coming
+PROBE_BYTES = 1024
+
+# Content-Type of the common stream formats
+CODECS = {
+    "audio/mpeg": "mp3",
+    "audio/mp3": "mp3",
+    "audio/aac": "aac",
+    "audio/aacp": "aac",
+    "audio/x-aac": "aac",
+    "audio/ogg": "ogg",
+    "application/ogg": "ogg",
+    "audio/opus": "opus",
+    "audio/flac": "flac",
+    "audio/x-mpegurl": "m3u",
+    "application/vnd.apple.mpegurl": "hls",
+    "application/x-mpegurl": "hls",
+    "audio/x-scpls": "pls",
+}
+
+
+def _codec(content_type: str | None) -> str:
+    """Give the codec name of a Content-Type header."""
+    if not content_type:
+        return ""
+    mime = content_type.split(";")[0].strip().lower()
+    return CODECS.get(mime, mime)
+
+
+class StationHealth:
+    """Probe the stations in the background and cache the results."""
+
+    def __init__(
+        self,
+        cache_file: str = HEALTH_FILE,
+        timeout: float = 5.0,
+        workers: int = 8,
+        max_age: float = 3600.0,
+    ) -> None:
+        """Create the checker and load the previous results.
+
+        Parameters
+        ----------
+        cache_file : str, optional
+            JSON file where the results are kept between two runs.
+        timeout : float, optional
+            Timeout of one probe in seconds.
+        workers : int, optional
+            Number of stations probed at the same time.
+        max_age : float, optional
+            Results older than this (in seconds) are not trusted any more: a
+            station is not skipped on the basis of an old failure, and
+            :meth:`probeAll` probes it again.
+
+        """
+        if len(log.getName()) < 1:
+            log.init("radio")
+        self.cache_file = cache_file
+        self.timeout = timeout
+        self.workers = workers
+        self.max_age = max_age
+
+        self._lock = threading.Lock()
+        self._stations: dict[str, dict] = {}
+        self._thread: threading.Thread | None = None
+        self.load()
+
+    def load(self) -> None:
+        """Read the results of the previous run, if any."""
+        try:
+            with open(self.cache_file) as f:
+                stations = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            log.message(f"station_health: cannot read {self.cache_file}: {e}", log.ERROR)
+            return
+        with self._lock:
+            self._stations = stations
+
+    def save(self) -> None:
+        """Write the results; the file is replaced atomically."""
+        with self._lock:
+            data = json.dumps(self._stations, indent=1, sort_keys=True)
+        tmp = self.cache_file + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                f.write(data)
+            os.replace(tmp, self.cache_file)
+        except OSError as e:
+            log.message(f"station_health: cannot write {self.cache_file}: {e}", log.ERROR)
+
+    def get(self, url: str) -> dict | None:
+        """Give the last result for ``url``, or None if never probed."""
+        with self._lock:
+            result = self._stations.get(url)
+            return None if result is None else dict(result)
+
+    def isDead(self, url: str) -> bool:
+        """Tell if ``url`` failed its last (recent enough) probe."""
+        result = self._stations.get(url)
+        if result is None or result["alive"]:
+            return False
+        return time.time() - result["checked"] < self.max_age
+
+    def isRunning(self) -> bool:
+        """Tell if a sweep is in progress."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Wait for the end of the current sweep; False on timeout."""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        return not self.isRunning()
+
+    def probeAll(self, urls: list[str], force: bool = False) -> bool:
+        """Probe ``urls`` in a background thread.
+
+        Parameters
+        ----------
+        urls : list[str]
+            Stream URLs; duplicates and non HTTP URLs are ignored.
+        force : bool, optional
+            Probe all the stations, not only the ones without a recent result.
+
+        Returns
+        -------
+        bool
+            False if a sweep is already in progress and nothing was started.
+
+        """
+        if self.isRunning():
+            return False
+
+        now = time.time()
+        todo = []
+        for url in dict.fromkeys(urls):
+            if not url.startswith(("http://", "https://")):
+                continue
+            result = self._stations.get(url)
+            if force or result is None or now - result["checked"] >= self.max_age:
+                todo.append(url)
+        if not todo:
+            return True
+
+        self._thread = threading.Thread(
+            target=self._sweep, args=(todo,), name="station_health", daemon=True
+        )
+        self._thread.start()
+        return True
+
+    def probe(self, url: str) -> dict:
+        """Open ``url`` and read the first bytes of the stream.
+
+        Returns
+        -------
+        dict
+            ``alive``, HTTP ``status`` (None if there was no HTTP answer),
+            ``latency`` to the first bytes in ms, ``codec``, ``error`` and
+            ``checked`` time.
+
+        """
+        result = {"alive": False, "status": None, "latency": None, "codec": "", "error": ""}
+        request = urllib.request.Request(
+            url, headers={"Icy-MetaData": "0", "User-Agent": "radiod"}
+        )
+        start = time.monotonic()
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                data = response.read(PROBE_BYTES)
+                result["status"] = response.status
+                result["codec"] = _codec(response.headers.get("Content-Type"))
+                result["alive"] = len(data) > 0
+                if not data:
+                    result["error"] = "Empty stream"
+        except urllib.error.HTTPError as e:
+            result["status"] = e.code
+            result["error"] = str(e.reason)
+        except http.client.BadStatusLine as e:
+            # Old SHOUTcast servers answer "ICY 200 OK", which MPD plays fine
+            if str(e).startswith("ICY 200"):
+                result["status"] = 200
+                result["alive"] = True
+            else:
+                result["error"] = f"Bad status line {e}"
+        except (urllib.error.URLError, http.client.HTTPException, OSError) as e:
+            result["error"] = str(getattr(e, "reason", e))
+        result["latency"] = round((time.monotonic() - start) * 1000)
+        result["checked"] = time.time()
+        return result
+
+    def recheck(self, url: str) -> threading.Thread | None:
+        """Probe ``url`` again in a background thread, eg after MPD failed.
+
+        MPD mostly fails to play because of the local connection, not the
+        station, so the failure itself is not stored. The result of the
+        probe is stored if the station answered: with no answer at all, the
+        Internet may be down rather than the station.
+
+        Returns
+        -------
+        threading.Thread | None
+            The probe thread, None if ``url`` is not an HTTP URL.
+
+        """
+        if not url.startswith(("http://", "https://")):
+            return None
+
+        def run() -> None:
+            result = self.probe(url)
+            if result["status"] is None and not result["alive"]:
+                log.message(f"station_health: no answer from {url}, not stored", log.DEBUG)
+                return
+            with self._lock:
+                self._stations[url] = result
+            log.message(f"station_health: {url} alive={result['alive']}", log.DEBUG)
+
+        thread = threading.Thread(target=run, name="station_recheck", daemon=True)
+        thread.start()
+        return thread
+
+    def _sweep(self, urls: list[str]) -> None:
+        """Probe all the URLs concurrently and save the results."""
+        start = time.monotonic()
+        with ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="station_probe"
+        ) as executor:
+            results = dict(zip(urls, executor.map(self.probe, urls)))
+
+        # No HTTP answer at all: the Internet is down, not the stations
+        if not any(result["status"] is not None for result in results.values()):
+            log.message(
+                "station_health: no station answered, results discarded", log.ERROR
+            )
+            return
+
+        with self._lock:
+            self._stations.update(results)
+        self.save()
+
+        dead = [url for url, result in results.items() if not result["alive"]]
+        log.message(
+            f"station_health: probed {len(urls)} stations in "
+            f"{time.monotonic() - start:.1f}s, {len(dead)} dead",
+            log.INFO,
+        )
+        for url in dead:
+            log.message(f"station_health: dead {url} {results[url]['error']}", log.DEBUG)
+
+
+if __name__ == "__main__":
+    import tempfile
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _StandIn(BaseHTTPRequestHandler):
+        """Stand-in for a radio server: /ok streams, /empty and /gone fail."""
+
+        def do_GET(self) -> None:
+            if self.path == "/gone":
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "audio/mpeg")
+            self.end_headers()
+            if self.path == "/ok":
+                self.wfile.write(b"\xff\xfb" * PROBE_BYTES)
+
+        def log_message(self, *args) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = os.path.join(directory, "station_health.json")
+        health = StationHealth(cache, timeout=2)
+        urls = [f"{base}/ok", f"{base}/empty", f"{base}/gone", "http://127.0.0.1:1/"]
+        health.probeAll(urls)
+        health.wait()
+        for url in urls:
+            print(f"{url}: {health.get(url)}")
+        assert not health.isDead(f"{base}/ok")
+        assert health.get(f"{base}/ok")["codec"] == "mp3"
+        assert health.isDead(f"{base}/empty")
+        assert health.isDead(f"{base}/gone")
+        assert health.isDead("http://127.0.0.1:1/")
+        assert not health.isDead("http://unknown/")
+
+        # The results survive a restart
+        assert StationHealth(cache).isDead(f"{base}/gone")
+
+        # A recheck stores the answer of the station, not a lack of answer
+        health.recheck(f"{base}/ok").join()
+        assert not health.isDead(f"{base}/ok")
+        health.recheck("http://127.0.0.1:1/new").join()
+        assert health.get("http://127.0.0.1:1/new") is None
+    server.shutdown()
@@ -0,0 +1,521 @@
+#!/usr/bin/env python3
+"""Define a local HTTP relay that keeps the neighbouring stations buffered.
+
+Switching station costs one to three seconds: MPD connects to the new server,
+then waits for its buffer to fill. When the relay is enabled, :class:`.Playlist`
+loads ``http://127.0.0.1:<port>/relay?url=<station>`` in the MPD queue instead
+of the station URLs. The relay keeps the current station and its two
+neighbours in the playlist connected, each one in a ring buffer of bounded
+size. When MPD switches to a neighbour, the relay answers at once with the
+buffered audio, and then follows the live stream. Playlist and HLS URLs
+(``.pls``, ``.m3u``, ``.m3u8``...) are left to MPD, which expands them with
+its own plugins: see :func:`isRelayable`.
+
+Streams that are neither played nor next to the current station are closed
+after ``idle_timeout`` seconds. The time between the request of MPD and the
+first bytes sent back is recorded, separately for warm and cold streams.
+
+"""
+import threading
+import time
+import urllib.parse
+import urllib.request
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from log_class import Log
+
+log = Log()
+
+RELAY_PATH = "/relay"
+
+# Bytes read from the upstream server at a time
+CHUNK = 8192
+
+# Audio bytes between two ICY metadata blocks sent to MPD
+METAINT = 16000
+
+# Headers of the upstream server passed on to MPD
+FORWARDED_HEADERS = ("Content-Type", "icy-name", "icy-genre", "icy-br", "icy-url")
+
+# Extensions of the playlists and HLS streams that MPD resolves itself
+PLAYLIST_EXTENSIONS = (".pls", ".m3u", ".m3u8", ".asx", ".xspf")
+
+
+def isRelayable(url: str) -> bool:
+    """Tell if ``url`` is a plain HTTP stream that can be relayed."""
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ("http", "https"):
+        return False
+    return not parts.path.lower().endswith(PLAYLIST_EXTENSIONS)
+
+
+def upstreamUrl(url: str) -> str:
+    """Give the station URL of a relay URL; other URLs are unchanged."""
+    parts = urllib.parse.urlsplit(url)
+    if parts.hostname != "127.0.0.1" or parts.path != RELAY_PATH:
+        return url
+    query = urllib.parse.parse_qs(parts.query)
+    return query.get("url", [url])[0]
+
+
+class _Stream:
+    """Connection to one station, buffered in a ring of chunks."""
+
+    def __init__(self, url: str, buffer_bytes: int, timeout: float) -> None:
+        self.url = url
+        self.buffer_bytes = buffer_bytes
+        self.timeout = timeout
+
+        self.headers: dict[str, str] = {}
+        self.metadata = b""  # Last ICY metadata block, eg StreamTitle='...';
+        self.error = ""
+        self.clients = 0
+        self.last_used = time.monotonic()
+
+        self._chunks: deque[tuple[int, bytes]] = deque()
+        self._size = 0
+        self._next_seq = 0
+        self._cond = threading.Condition()
+        self._response = None
+        self._closed = False
+        self._ready = threading.Event()  # Headers received, or failed
+        self._thread = threading.Thread(
+            target=self._run, name="stream_relay_upstream", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def closed(self) -> bool:
+        """Tell if the upstream connection is over."""
+        return self._closed
+
+    @property
+    def buffered(self) -> int:
+        """Number of audio bytes in the ring buffer."""
+        return self._size
+
+    def waitReady(self) -> bool:
+        """Wait for the upstream headers; False if the connection failed."""
+        self._ready.wait(self.timeout)
+        return bool(self.headers) and not self.error
+
+    def close(self) -> None:
+        """Disconnect from the upstream server and wake up the readers."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        response = self._response
+        if response is not None:
+            try:
+                response.close()
+            except Exception:
+                pass
+        self._ready.set()
+
+    def read(self, seq: int | None) -> tuple[int, list[bytes]]:
+        """Give the chunks from ``seq`` on, waiting for new ones if needed.
+
+        Parameters
+        ----------
+        seq : int | None
+            Sequence number of the next chunk the reader wants, None to start
+            from the oldest buffered chunk. A reader that fell behind the ring
+            buffer resumes from the oldest chunk.
+
+        Returns
+        -------
+        tuple[int, list[bytes]]
+            The sequence number to ask for next, and the chunks; the list is
+            empty when the stream is closed.
+
+        """
+        with self._cond:
+            while True:
+                if self._chunks:
+                    first = self._chunks[0][0]
+                    if seq is None or seq < first:
+                        seq = first
+                    if seq < self._next_seq:
+                        chunks = [data for number, data in self._chunks if number >= seq]
+                        return self._next_seq, chunks
+                elif seq is None:
+                    seq = self._next_seq
+                if self._closed:
+                    return seq, []
+                self._cond.wait(self.timeout)
+
+    def _append(self, data: bytes) -> None:
+        """Add a chunk, dropping the oldest ones beyond the memory cap."""
+        with self._cond:
+            self._chunks.append((self._next_seq, data))
+            self._next_seq += 1
+            self._size += len(data)
+            while self._size > self.buffer_bytes and len(self._chunks) > 1:
+                self._size -= len(self._chunks.popleft()[1])
+            self._cond.notify_all()
+
+    def _run(self) -> None:
+        """Read the upstream stream, splitting out the ICY metadata."""
+        request = urllib.request.Request(
+            self.url, headers={"Icy-MetaData": "1", "User-Agent": "radiod"}
+        )
+        try:
+            self._response = urllib.request.urlopen(request, timeout=self.timeout)
+            response = self._response
+            for name in FORWARDED_HEADERS:
+                value = response.headers.get(name)
+                if value is not None:
+                    self.headers[name] = value
+            self.headers.setdefault("Content-Type", "audio/mpeg")
+            metaint = int(response.headers.get("icy-metaint", 0))
+            self._ready.set()
+
+            remaining = metaint
+            while not self._closed:
+                size = min(CHUNK, remaining) if metaint else CHUNK
+                data = response.read1(size)
+                if not data:
+                    raise EOFError("End of stream")
+                self._append(data)
+                if metaint:
+                    remaining -= len(data)
+                    if remaining == 0:
+                        length = response.read(1)[0] * 16
+                        if length:
+                            self.metadata = response.read(length)
+                        remaining = metaint
+
+        except Exception as e:
+            if not self._closed:
+                self.error = str(e)
+                log.message(f"stream_relay: {self.url}: {e}", log.DEBUG)
+        finally:
+            self.close()
+
+
+class _RelayHandler(BaseHTTPRequestHandler):
+    """Serve one relayed stream to MPD."""
+
+    protocol_version = "HTTP/1.0"
+
+    def do_GET(self) -> None:
+        relay: StreamRelay = self.server.relay
+        request_time = time.monotonic()
+        parts = urllib.parse.urlsplit(self.path)
+        url = urllib.parse.parse_qs(parts.query).get("url", [""])[0]
+        if parts.path != RELAY_PATH or not url:
+            self.send_error(404)
+            return
+
+        stream, warm = relay.open(url)
+        if not stream.waitReady():
+            relay.release(stream)
+            self.send_error(502, stream.error or "No answer")
+            return
+
+        send_metadata = self.headers.get("Icy-MetaData") == "1"
+        try:
+            self.send_response(200)
+            for name, value in stream.headers.items():
+                self.send_header(name, value)
+            if send_metadata:
+                self.send_header("icy-metaint", str(METAINT))
+            self.end_headers()
+            self._copy(stream, send_metadata, relay, request_time, warm)
+        except (BrokenPipeError, ConnectionResetError, TimeoutError):
+            pass  # MPD switched to another station
+        finally:
+            relay.release(stream)
+
+    def _copy(self, stream, send_metadata, relay, request_time, warm) -> None:
+        """Send the buffered audio then the live stream, with ICY metadata."""
+        seq = None
+        to_metadata = METAINT
+        sent_metadata = None
+        first = True
+        while True:
+            seq, chunks = stream.read(seq)
+            if not chunks:
+                return
+            for data in chunks:
+                while send_metadata and len(data) >= to_metadata:
+                    self.wfile.write(data[:to_metadata])
+                    data = data[to_metadata:]
+                    metadata = stream.metadata
+                    if metadata != sent_metadata:
+                        self.wfile.write(bytes([len(metadata) // 16]) + metadata)
+                        sent_metadata = metadata
+                    else:
+                        self.wfile.write(b"\0")
+                    to_metadata = METAINT
+                self.wfile.write(data)
+                to_metadata -= len(data)
+            if first:
+                self.wfile.flush()
+                relay.recordSwitch(stream.url, time.monotonic() - request_time, warm)
+                first = False
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class StreamRelay:
+    """Relay the stations to MPD from local ring buffers."""
+
+    def __init__(
+        self,
+        port: int = 8765,
+        buffer_bytes: int = 256 * 1024,
+        idle_timeout: float = 60.0,
+        max_streams: int = 5,
+        timeout: float = 10.0,
+    ) -> None:
+        """Create the relay; call :meth:`start` to serve.
+
+        Parameters
+        ----------
+        port : int, optional
+            Port on 127.0.0.1.
+        buffer_bytes : int, optional
+            Memory cap of the ring buffer of each station.
+        idle_timeout : float, optional
+            Streams without a reader and not next to the current station are
+            closed after this time in seconds.
+        max_streams : int, optional
+            Maximum number of open streams; the idle streams are closed first,
+            oldest first.
+        timeout : float, optional
+            Timeout to connect to and read from a station.
+
+        """
+        if len(log.getName()) < 1:
+            log.init("radio")
+        self.port = port
+        self.buffer_bytes = buffer_bytes
+        self.idle_timeout = idle_timeout
+        self.max_streams = max_streams
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._streams: dict[str, _Stream] = {}
+        self._stations: list[str] = []
+        self._current = ""
+        self._server: ThreadingHTTPServer | None = None
+        self._stopping = threading.Event()
+        self._metrics = {"warm": [0, 0.0], "cold": [0, 0.0]}  # count, total s
+
+    def start(self) -> bool:
+        """Listen on the relay port; False if it cannot be opened."""
+        try:
+            self._server = ThreadingHTTPServer(("127.0.0.1", self.port), _RelayHandler)
+        except OSError as e:
+            log.message(f"stream_relay: cannot listen on port {self.port}: {e}", log.ERROR)
+            return False
+        self._server.daemon_threads = True
+        self._server.relay = self
+        self.port = self._server.server_address[1]
+        threading.Thread(
+            target=self._server.serve_forever, name="stream_relay", daemon=True
+        ).start()
+        threading.Thread(
+            target=self._housekeeping, name="stream_relay_evict", daemon=True
+        ).start()
+        log.message(f"stream_relay: listening on port {self.port}", log.INFO)
+        return True
+
+    def stop(self) -> None:
+        """Stop serving and close all the streams."""
+        self._stopping.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        with self._lock:
+            streams = list(self._streams.values())
+            self._streams.clear()
+        for stream in streams:
+            stream.close()
+
+    def isRunning(self) -> bool:
+        """Tell if the relay is serving."""
+        return self._server is not None and not self._stopping.is_set()
+
+    def url(self, url: str) -> str:
+        """Give the relay URL of a station URL."""
+        quoted = urllib.parse.quote(url, safe="")
+        return f"http://127.0.0.1:{self.port}{RELAY_PATH}?url={quoted}"
+
+    def setStations(self, urls: list[str]) -> None:
+        """Give the station URLs in playlist order, to find the neighbours.
+
+        The URLs that are not relayed are left out.
+
+        """
+        with self._lock:
+            self._stations = [url for url in urls if isRelayable(url)]
+
+    def select(self, url: str) -> bool:
+        """Make ``url`` the current station and warm up its neighbours.
+
+        Called just before MPD is asked to play the station. Gives True if
+        the station was already buffered. Nothing is done for a URL that is
+        not relayed.
+
+        """
+        if not isRelayable(url):
+            return False
+        with self._lock:
+            self._current = url
+            warm = url in self._streams and not self._streams[url].closed
+            self._get(url)
+            for neighbour in self._neighbours(url):
+                self._get(neighbour)
+        return warm
+
+    def open(self, url: str) -> tuple[_Stream, bool]:
+        """Give the stream of ``url`` for a new reader, and if it was warm."""
+        with self._lock:
+            stream = self._streams.get(url)
+            warm = stream is not None and not stream.closed and stream.buffered > 0
+            stream = self._get(url)
+            stream.clients += 1
+            stream.last_used = time.monotonic()
+            if url != self._current:
+                self._current = url
+                for neighbour in self._neighbours(url):
+                    self._get(neighbour)
+            return stream, warm
+
+    def release(self, stream: _Stream) -> None:
+        """Called when a reader is gone."""
+        with self._lock:
+            stream.clients -= 1
+            stream.last_used = time.monotonic()
+
+    def recordSwitch(self, url: str, latency: float, warm: bool) -> None:
+        """Record the time to the first bytes sent to MPD."""
+        kind = "warm" if warm else "cold"
+        with self._lock:
+            self._metrics[kind][0] += 1
+            self._metrics[kind][1] += latency
+        log.message(f"stream_relay: {kind} switch in {latency * 1000:.0f}ms {url}", log.INFO)
+
+    def metrics(self) -> dict:
+        """Give the switch counts, average latencies in ms and open streams."""
+        with self._lock:
+            result = {"streams": len(self._streams)}
+            for kind, (count, total) in self._metrics.items():
+                result[f"{kind}_switches"] = count
+                result[f"{kind}_latency"] = total / count * 1000 if count else 0.0
+            result["buffered"] = sum(s.buffered for s in self._streams.values())
+        return result
+
+    def _neighbours(self, url: str) -> list[str]:
+        """Give the stations before and after ``url`` in the playlist."""
+        if url not in self._stations:
+            return []
+        index = self._stations.index(url)
+        size = len(self._stations)
+        return [self._stations[(index + step) % size] for step in (-1, 1) if size > 1]
+
+    def _get(self, url: str) -> _Stream:
+        """Give the open stream of ``url``, connecting it if needed."""
+        stream = self._streams.get(url)
+        if stream is None or stream.closed:
+            stream = _Stream(url, self.buffer_bytes, self.timeout)
+            self._streams[url] = stream
+            self._evict(keep=url)
+        return stream
+
+    def _evict(self, keep: str = "") -> None:
+        """Close the idle and failed streams; keep at most max_streams."""
+        now = time.monotonic()
+        wanted = {self._current, keep, *self._neighbours(self._current)}
+        idle = []
+        for url, stream in list(self._streams.items()):
+            if stream.clients > 0 or url in wanted:
+                continue
+            if stream.closed or now - stream.last_used > self.idle_timeout:
+                del self._streams[url]
+                stream.close()
+            else:
+                idle.append(stream)
+        idle.sort(key=lambda stream: stream.last_used)
+        while len(self._streams) > self.max_streams and idle:
+            stream = idle.pop(0)
+            del self._streams[stream.url]
+            stream.close()
+
+    def _housekeeping(self) -> None:
+        """Evict the idle streams periodically."""
+        while not self._stopping.wait(min(self.idle_timeout, 5.0)):
+            with self._lock:
+                self._evict()
+
+
+if __name__ == "__main__":
+    import urllib.request as client
+
+    class _StandIn(BaseHTTPRequestHandler):
+        """Stand-in for a radio server, with ICY metadata and a slow connect."""
+
+        protocol_version = "HTTP/1.0"
+
+        def do_GET(self) -> None:
+            time.sleep(0.5)  # Connection and buffering time of a real server
+            metaint = 1000
+            self.send_response(200)
+            self.send_header("Content-Type", "audio/mpeg")
+            self.send_header("icy-name", self.path)
+            self.send_header("icy-metaint", str(metaint))
+            self.end_headers()
+            title = f"StreamTitle='{self.path}';".encode()
+            title += b"\0" * (-len(title) % 16)
+            try:
+                while True:
+                    self.wfile.write(b"\xff" * metaint)
+                    self.wfile.write(bytes([len(title) // 16]) + title)
+                    time.sleep(0.01)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, *args) -> None:
+            pass
+
+    upstream = ThreadingHTTPServer(("127.0.0.1", 0), _StandIn)
+    upstream.daemon_threads = True
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    stations = [f"http://127.0.0.1:{upstream.server_address[1]}/{n}" for n in range(5)]
+
+    relay = StreamRelay(port=0, buffer_bytes=64 * 1024, idle_timeout=1.0)
+    relay.start()
+    relay.setStations(stations)
+    assert upstreamUrl(relay.url(stations[2])) == stations[2]
+    assert not isRelayable("http://example.com/live.M3U8?token=1")
+    assert not isRelayable("https://example.com/radio.pls")
+    assert isRelayable("https://example.com/live.mp3")
+
+    def listen(url: str) -> tuple[float, bytes]:
+        """Read the first bytes of a relayed station, as MPD would."""
+        start = time.monotonic()
+        request = client.Request(relay.url(url), headers={"Icy-MetaData": "1"})
+        with client.urlopen(request, timeout=5) as response:
+            assert response.headers["icy-metaint"] == str(METAINT)
+            data = response.read(METAINT + 200)
+        return time.monotonic() - start, data
+
+    latency, data = listen(stations[2])
+    print(f"Cold switch: {latency * 1000:.0f}ms")
+    assert f"StreamTitle='/2';".encode() in data
+
+    time.sleep(1)  # Neighbours 1 and 3 are buffering
+    relay.select(stations[3])
+    latency, data = listen(stations[3])
+    print(f"Warm switch: {latency * 1000:.0f}ms")
+    assert latency < 0.3
+
+    time.sleep(2.5)  # Station 1 is not a neighbour of 3 any more
+    print(relay.metrics())
+    assert stations[1] not in relay._streams
+    assert relay.metrics()["buffered"] <= 3 * 64 * 1024 + 3 * CHUNK
+    relay.stop()
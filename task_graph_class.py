@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""Define a graph of start-up steps run concurrently.
+
+:meth:`.Radio.start` ran a dozen blocking steps one after the other (MPD
+socket and connection, ``alsactl restore``, ``configure_audio_device.sh``,
+Bluetooth, mixer id...), although most of them do not depend on each other.
+:class:`TaskGraph` runs each step on a thread pool as soon as the steps it
+depends on are done. When more steps are ready than there are workers, the
+ones with the lowest priority value go first, so that the steps leading to
+the first sound (MPD connection, source, volume) are never queued behind a
+slow optional one.
+
+"""
+import heapq
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from log_class import Log
+from startup_profiler_class import profiler
+
+log = Log()
+
+# Priorities of the steps, lowest first
+CRITICAL = 0
+NORMAL = 1
+BACKGROUND = 2
+
+
+class TaskGraph:
+    """Run named steps in the order of their dependencies, in parallel."""
+
+    def __init__(self, name: str = "tasks", workers: int = 4) -> None:
+        """Create an empty graph.
+
+        Parameters
+        ----------
+        name : str, optional
+            Prefix of the threads and of the log messages.
+        workers : int, optional
+            Number of steps that can run at the same time.
+
+        """
+        if len(log.getName()) < 1:
+            log.init("radio")
+        self.name = name
+        self.workers = workers
+        self._steps: dict[str, tuple[Callable[[], object], tuple[str, ...], int]] = {}
+        self._order: list[str] = []
+        self.results: dict[str, object] = {}
+        self.errors: dict[str, BaseException] = {}
+        self.durations: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(
+        self,
+        name: str,
+        function: Callable[[], object],
+        after: tuple[str, ...] = (),
+        priority: int = NORMAL,
+    ) -> None:
+        """Add a step.
+
+        Parameters
+        ----------
+        name : str
+            Unique name of the step.
+        function : Callable[[], object]
+            Work of the step; its result is kept in :attr:`results`.
+        after : tuple[str, ...], optional
+            Steps that must be finished before this one starts. Unknown
+            names are ignored, so that optional steps can be left out.
+        priority : int, optional
+            :data:`CRITICAL`, :data:`NORMAL` or :data:`BACKGROUND`.
+
+        """
+        self._steps[name] = (function, tuple(after), priority)
+        self._order.append(name)
+
+    def run(self) -> None:
+        """Run all the steps and wait for them.
+
+        A step whose dependency failed is skipped. The first exception is
+        raised again once every other step has finished.
+
+        """
+        waiting = {
+            name: {dep for dep in after if dep in self._steps}
+            for name, (_, after, _) in self._steps.items()
+        }
+        dependents: dict[str, list[str]] = {name: [] for name in self._steps}
+        for name, deps in waiting.items():
+            for dep in deps:
+                dependents[dep].append(name)
+        ready: list[tuple[int, int, str]] = []
+        for name in self._order:
+            if not waiting[name]:
+                self._push(ready, name)
+
+        start = time.monotonic()
+        running: dict[Future, str] = {}
+        with ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix=self.name
+        ) as executor:
+            while ready or running:
+                while ready and len(running) < self.workers:
+                    _, _, name = heapq.heappop(ready)
+                    running[executor.submit(self._runStep, name)] = name
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    for dependent in dependents[name]:
+                        if name in self.errors:
+                            self._skip(dependent, name, waiting, dependents)
+                            continue
+                        waiting[dependent].discard(name)
+                        if not waiting[dependent] and dependent not in self.errors:
+                            self._push(ready, dependent)
+
+        log.message(
+            "%s: %d steps in %.2fs, %.2fs if run in sequence",
+            log.INFO,
+            self.name,
+            len(self.durations),
+            time.monotonic() - start,
+            sum(self.durations.values()),
+        )
+        for name in self._order:
+            if name in self.errors and name in self.durations:
+                raise self.errors[name]
+
+    def _push(self, ready: list, name: str) -> None:
+        """Put a step in the ready queue, by priority then order of addition."""
+        heapq.heappush(ready, (self._steps[name][2], self._order.index(name), name))
+
+    def _skip(self, name: str, cause: str, waiting: dict, dependents: dict) -> None:
+        """Skip a step and its dependents because ``cause`` failed."""
+        if name in self.errors:
+            return
+        log.message("%s: %s skipped, %s failed", log.ERROR, self.name, name, cause)
+        self.errors[name] = RuntimeError(f"{cause} failed")
+        for dependent in dependents[name]:
+            self._skip(dependent, name, waiting, dependents)
+
+    def _runStep(self, name: str) -> None:
+        """Run one step in a worker thread and record its outcome."""
+        function = self._steps[name][0]
+        start = time.monotonic()
+        try:
+            with profiler.phase(f"{self.name}.{name}"):
+                result = function()
+            with self._lock:
+                self.results[name] = result
+        except Exception as e:
+            log.message("%s: %s failed: %s", log.ERROR, self.name, name, e)
+            with self._lock:
+                self.errors[name] = e
+        finally:
+            elapsed = time.monotonic() - start
+            with self._lock:
+                self.durations[name] = elapsed
+            log.message("%s: %s done in %.3fs", log.DEBUG, self.name, name, elapsed)
+
+
+if __name__ == "__main__":
+    order = []
+
+    def step(name: str, delay: float) -> Callable[[], str]:
+        def run() -> str:
+            time.sleep(delay)
+            order.append(name)
+            return name
+
+        return run
+
+    graph = TaskGraph("test", workers=2)
+    graph.add("socket", step("socket", 0.05), priority=CRITICAL)
+    graph.add("connect", step("connect", 0.1), after=("socket",), priority=CRITICAL)
+    graph.add("bluetooth", step("bluetooth", 0.2), priority=BACKGROUND)
+    graph.add("audio", step("audio", 0.1))
+    graph.add("play", step("play", 0.01), after=("connect", "missing"), priority=CRITICAL)
+    start = time.monotonic()
+    graph.run()
+    elapsed = time.monotonic() - start
+    print(f"{order} in {elapsed:.2f}s, {sum(graph.durations.values()):.2f}s in sequence")
+    assert order.index("play") > order.index("connect") > order.index("socket")
+    assert order.index("play") < order.index("bluetooth")
+    assert elapsed < 0.35
+
+    failing = TaskGraph("failing", workers=2)
+    failing.add("broken", lambda: 1 / 0)
+    failing.add("after", step("after", 0), after=("broken",))
+    failing.add("other", step("other", 0))
+    try:
+        failing.run()
+    except ZeroDivisionError:
+        pass
+    else:
+        raise AssertionError("The error of the step was not raised")
+    assert "after" in failing.errors and failing.results["other"] == "other"
@@ -23,9 +23,12 @@
 import os,sys
 import unicodedata
 import pdb
-import glob
 import importlib
+import threading
+from collections import OrderedDict
 
+from code_page_cache_class import CODES_DIR, CodePage, code_page_cache
+from code_table_class import CodeTable
 from config_class import Configuration
 config = Configuration()
 
@@ -41,17 +44,30 @@ class Translate:
 
     code_pages = []
     English = None  # English font table set up in _import routine
+    _tables = None  # Compiled code tables (code_table_class) by table id
+    _english = None # Compiled English table without the code page codes
+
+    # Cache of the last translated texts (least recently used dropped)
+    cache_size = 256
+    cache_hits = 0
+    cache_misses = 0
+    _cache = None
 
     def __init__(self):
         # Import font table according to language
         self._language = config.language
         self._controller = config.controller
-        self.code_pages = self._import_codes(self._language)
+        self._tables = {}
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._loadCodePages()
         if len(self.code_pages) < 1:
             print ("No code tables found for controller",self._controller)
             print ("and language",self._language, "Check /etc/radiod.conf")
             sys.exit(1)
 
+        self._pages_key = tuple(code_page.__name__ for code_page in self.code_pages)
+
     # Import all language font modules in the codes directory
     # Process the <font>.codes for the selected language first
     # Then import romanized codes in the rest and 
@@ -61,10 +77,8 @@ class Translate:
         translated  = False
         primary = False
 
-        # Get all font tables inn the codes sub-directory
-        dir = os.path.dirname(__file__)
-        os.chdir(dir)
-        font_files = sorted(glob.glob('codes/*.py'))
+        # Get all font tables in the codes sub-directory
+        font_files = sorted(f for f in os.listdir(CODES_DIR) if f.endswith('.py'))
         code_pages = []     # List of font translation tables
         count = 20
     
@@ -122,17 +136,33 @@ class Translate:
         return code_pages
 
     # Main conversion routine
+    # The same texts (station, title, menu) are shown many times a second,
+    # the last ones are kept in a cache
     def all(self,text):
-        if self._translate:
-            # Convert escape codes to font ordinals using imported codes
-            s = self._convert(text,self.code_pages)
-
-            # Strip quotes
-            if len(s) > 0:
-                s = s.lstrip('"')
-                s = s.rstrip('"')
-        else:
-            s = text
+        if not self._translate:
+            return text
+
+        key = (text, self._romanized, self._pages_key)
+        with self._cache_lock:
+            s = self._cache.get(key)
+            if s is not None:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                return s
+            self.cache_misses += 1
+
+        # Convert escape codes to font ordinals using imported codes
+        s = self._convert(text,self.code_pages)
+
+        # Strip quotes
+        if len(s) > 0:
+            s = s.lstrip('"')
+            s = s.rstrip('"')
+
+        with self._cache_lock:
+            self._cache[key] = s
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
         return s
 
     # Translate unicode for RSS feeds
@@ -150,16 +180,23 @@ class Translate:
     # to the font table ordinal of the LCD
     def _convert(self,text,code_pages):
         s = self._convert2escape(text)
+        for codes in self._pageCodes(code_pages):
+            s = self._compiled(codes).translate(s)
+
+            # Finally process English font table
+            s = self._english.translate(s)
+        return s
+
+    # Get the code table used for each code page
+    def _pageCodes(self,code_pages):
+        tables = []
         for i in range(0,len(code_pages)):
             code_page = code_pages[i]
             if not self._romanized and i==0:
-                s = self._translate_unicode(code_page.codes,s)
+                tables.append(code_page.codes)
             else:
-                s = self._translate_unicode(code_page.romanized,s)
-
-            # Finally process English font table
-            s = self._translate_unicode(self.English.romanized,s,delete=False)
-        return s
+                tables.append(code_page.romanized)
+        return tables
 
     # Convert unicode to escape codes
     def _convert2escape(self,text):
@@ -169,31 +206,78 @@ class Translate:
             s = s.rstrip('\'')
         return s
 
-    # Do translation using supplied translation table
-    # and delete the already translated code from code/font table
-    def _translate_unicode(self, codes, text, delete=True):
-        s = text
-        for code in codes:
-            l1 =  len(s)
-            s = s.replace(code, codes[code])
-
-            if delete:
-                # Prevent double conversion
-                l2 = len(s)
-                if l1 != l2:
-                    try:
-                        del self.English.codes[code] 
-                    except:
-                        pass
-        return s
+    # Load the code pages and their compiled tables for the language,
+    # controller and romanize setting from the code page cache
+    # (code_page_cache_class). If missing or out of date, import and
+    # compile them and update the cache
+    def _loadCodePages(self):
+        key = (self._language, self._controller, self._romanized)
+        cached = code_page_cache.get(*key)
+        if cached is None:
+            modules = self._import_codes(self._language)
+            pages = [CodePage.fromModule(module) for module in modules]
+            english = CodePage.fromModule(self.English)
+            tables = [CodeTable(codes) for codes in self._pageCodes(pages)]
+            cached = (pages, english, tables, self._englishTable(pages, english))
+            if len(pages) > 0:
+                sources = [module.__file__ for module in modules + [self.English]]
+                code_page_cache.put(*key, cached, sources)
+
+        pages, english, tables, english_table = cached
+        self.code_pages = pages
+        self.English = english
+        self._english = english_table
+        for codes, table in zip(self._pageCodes(pages), tables):
+            self._tables[id(codes)] = (codes, table)
+
+    # Compile the English table for the code pages
+    # The English table leaves out the codes translated by the primary code
+    # page to prevent double conversion. The codes of the other pages are
+    # translated by the English table first. The code pages are not changed
+    def _englishTable(self, code_pages, english_page):
+        translated = set()
+        if len(code_pages) > 0:
+            codes = self._pageCodes(code_pages)[0]
+            for code in codes:
+                if len(code) != len(codes[code]):
+                    translated.add(code)
+
+        english = {}
+        for code in english_page.romanized:
+            if code not in translated:
+                english[code] = english_page.romanized[code]
+        return CodeTable(english)
+
+    # Get the compiled form of a code table, compiled once
+    def _compiled(self, codes):
+        compiled = self._tables.get(id(codes))
+        if compiled is None or compiled[0] is not codes:
+            compiled = (codes, CodeTable(codes))
+            self._tables[id(codes)] = compiled
+        return compiled[1]
+
+    # Empty the cache of translated texts
+    def clearCache(self):
+        with self._cache_lock:
+            self._cache.clear()
+
+    # Get the cache hits, misses and number of texts
+    def getCacheStats(self):
+        with self._cache_lock:
+            return self.cache_hits, self.cache_misses, len(self._cache)
 
     # Translation on off (See translate_lcd in /etc/radiod.conf)
     def setTranslate(self,true_false):
-        self._translate = true_false
+        if true_false != self._translate:
+            self._translate = true_false
+            self.clearCache()
 
     # Translation on off (See romanize in /etc/radiod.conf)
     def setRomanize(self,true_false):
-        self._romanized = true_false
+        if true_false != self._romanized:
+            self._romanized = true_false
+            self._loadCodePages()
+            self.clearCache()
 
     # Get the code page from the primary font table 
     def getPrimaryCodePage(self):
@@ -203,12 +287,8 @@ class Translate:
     def getFontFiles(self):
         font_files = []
         for cp in self.code_pages:
-            x = str(cp)
-            files = x.split(' ')
-            font_files.append(files[1])
-        x = str(self.English)   
-        files = x.split(' ')
-        font_files.append(files[1])
+            font_files.append("'%s'" % cp.__name__)
+        font_files.append("'%s'" % self.English.__name__)
         return font_files
 
         
@@ -232,6 +312,11 @@ if __name__ == '__main__':
     # Complete text
     print (translate.all(text))
     print('')
+
+    # Cache of translated texts
+    for i in range(40):
+        translate.all(text)
+    print ("Cache hits %d misses %d size %d" % translate.getCacheStats())
     sys.exit(0)
 # End of file
 # set tabstop=4 shiftwidth=4 expandtab
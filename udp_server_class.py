@@ -17,6 +17,9 @@
 # This class can be tested with the remote_control.py program.
 # sudo ./remote_control.py send TEST
 #
+# The last log records kept in memory by the radio can be read with:
+# echo -n LOG_DUMP | nc -u -w1 localhost 5100
+#
 # When running it can be checked to see if it is listening on port 5100
 # netstat -an | grep 5100
 # udp        0      0 0.0.0.0:5100            0.0.0.0:*
@@ -34,6 +37,7 @@ log = Log()
 
 PORT = 5100
 HOST = '0.0.0.0'
+MAX_REPLY = 65507   # Largest UDP reply (IPv4 datagram payload)
 callback = None
 client_data = ""
 
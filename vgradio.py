@@ -42,6 +42,9 @@ from graphic_display import GraphicDisplay
 from translate_class import Translate
 import traceback
 
+# The images (images/*.png) are found relative to the radio directory
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
 translate = Translate()
 config = Configuration()
 log = Log()
@@ -228,6 +231,14 @@ def handleEvent(radio,radioEvent):
         log.message('PLAYLIST_CHANGED event received', log.DEBUG)
         radio.handlePlaylistChange()
 
+    elif event_type == event.RESUMED:
+        log.message('RESUMED event received', log.DEBUG)
+        radio.handleResumed()
+
+    elif event_type == event.NETWORK_CHANGED:
+        log.message('NETWORK_CHANGED event received', log.DEBUG)
+        radio.handleNetworkChange()
+
     # Finally clear the event
     radioEvent.clear()
     return
@@ -25,6 +25,8 @@ import os,sys
 import time
 import pdb
 from constants import *
+from command_runner_class import runner
+from alsa_mixer_class import AlsaMixer, VolumeRamp
 
 # Volume control files
 RadioLibDir = "/var/lib/radiod"
@@ -45,16 +47,22 @@ class Volume:
     ERROR=1         # Error status
     status = OK     # Volume get status
     mpd_client = None   # MPD client interface object
+    state = None    # Shared MPD player state snapshot (PlayerState)
+    store = None    # State store of /var/lib/radiod (StateStore)
     audio_device = "headphones"     # Audio device headphones, DAC, bluetooth etc
     mixer_device = ""           # Default "" or "-D bluealsa"
+    mixer = None    # Alsa mixer control (AlsaMixer)
+    ramp = None     # Applies the volume changes at a bounded rate (VolumeRamp)
 
-    def __init__(self, mpd_client,source,spotify,airplay,config,logging):
+    # receiverRunning tells if Airplay or Spotify is playing (mixer volume)
+    def __init__(self, mpd_client,source,receiverRunning,config,logging,state=None,store=None):
         global log
         self.mpd_client = mpd_client
+        self.state = state
+        self.store = store
         self.source = source
         self.config = config
-        self.spotify = spotify
-        self.airplay = airplay
+        self.receiverRunning = receiverRunning
         log = logging
         self.mixer_volume_id = self.getMixerVolumeID()
         self.mixer_preset = config.mixer_preset
@@ -68,13 +76,20 @@ class Volume:
         # Are we using bluetooth?
         if self.audio_device == "bluetooth":
             self.mixer_device  = "-D bluealsa"
+
+        # Keep the mixer control open and write volume changes in the background
+        self.mixer = AlsaMixer(self.mixer_volume_id, self.mixer_device)
+        self.ramp = VolumeRamp(self._applyVolume)
         return
 
     # Get either the mpd volume or mixer volume
     def get(self):
-        if self.spotify.isRunning() or self.airplay.isRunning():
+        if self.receiverRunning():
             self.mixer_volume = self._getMixerVolume()
             volume = self.mixer_volume
+        elif self.ramp.pending():
+            # The knob is ahead of MPD, the ramp will catch up
+            volume = self.volume
         else:
             volume = self._getMpdVolume(self.mpd_client)
 
@@ -97,7 +112,10 @@ class Volume:
     # Get the MPD volume 
     def _getMpdVolume(self,mpd_client):
         try:
-            status = mpd_client.status()
+            if self.state is not None:
+                status = self.state.status()
+            else:
+                status = mpd_client.status()
             vol = int(status.get("volume"))
             self.volume = vol   # Won't be reached if exception
             self.status = self.OK
@@ -120,9 +138,12 @@ class Volume:
 
     # Set the volume depending upon the source
     # Store volume setting if not muting (store=True/False)
+    # The new level is returned at once; the volume ramp writes it to the
+    # mixer or MPD in the background, coalescing fast knob steps
     def set(self,volume,store=True):
         new_volume = 0
-        log.message("volume.set " + str(volume) + ' store ' + str(store), log.DEBUG)
+        log.message("volume.set %s store %s", log.DEBUG, volume, store)
+        volume = int(volume)
         if volume > 100:
             volume = 100
         elif volume < 0:
@@ -130,35 +151,43 @@ class Volume:
         source_type = self.source.getType()
 
         if source_type == self.source.AIRPLAY or source_type == self.source.SPOTIFY:
-            self.mixer_volume = self._setMixerVolume(volume,store)
+            if self.mixer_volume_id > 0: 
+                self.mixer_volume = volume
+                if store:
+                    self._storeMixerVolume(volume)  
             new_volume = self.mixer_volume  
         else:
-            # If MPD set mixer back to preset (usually 100%) amd set MPD volume
-            self._setMixerVolume(self.mixer_preset,False)
-            self.volume = self._setMpdVolume(self.mpd_client,volume,store)
+            if self.volume != volume and store and volume > 0:
+                self.storeVolume(volume)
+            self.volume = volume
             new_volume = self.volume    
 
+        self.ramp.set(volume)
         return new_volume
 
-    # Set the MPD volume level
-    def _setMpdVolume(self,mpd_client,newvolume,store=True):
-        volume = int(newvolume) 
-        log.message("volume._setMpdVolume " + str(volume) + ' store ' + str(store), log.DEBUG)
-        if volume < 0:  
-            volume = 0
+    # Write the volume to the mixer or MPD (volume ramp thread)
+    def _applyVolume(self,volume):
+        source_type = self.source.getType()
+        if source_type == self.source.AIRPLAY or source_type == self.source.SPOTIFY:
+            self.mixer.setPercent(volume)
+        else:
+            # If MPD set mixer back to preset (usually 100%) amd set MPD volume
+            self.mixer.setPercent(self.mixer_preset)
+            self._setMpdVolume(self.mpd_client,volume)
 
-        if self.volume != volume and store and volume > 0:
-            log.message("volume._setMpdVolume " + str(volume), log.DEBUG)
-            self.storeVolume(self.volume)
+    # Set the MPD volume level
+    def _setMpdVolume(self,mpd_client,volume):
+        log.message("volume._setMpdVolume %s", log.DEBUG, volume)
         try:
             mpd_client.setvol(volume)
-            self.volume = volume
+            if self.state is not None:
+                self.state.changed()
 
         except Exception as e:
             log.message("volume._setMpdVolume error vol=" \
-                    + str(self.volume) + ': ' + str(e),log.ERROR)
+                    + str(volume) + ': ' + str(e),log.ERROR)
 
-        return self.volume
+        return volume
         
     # Set the Mixer volume level
     def _setMixerVolume(self,volume,store):
@@ -166,11 +195,8 @@ class Volume:
         # Restore alsamixer settings (Restore Waveshare DAC headphone mixer setting)
 
         if self.mixer_volume_id > 0: 
-            log.message("volume._setMixerVolume " + str(volume), log.DEBUG) 
-            cmd = "sudo amixer " + self.mixer_device + " cset numid=" + str(self.mixer_volume_id) \
-                                  + " " + str(volume) + "%"
-            log.message(cmd, log.DEBUG)
-            self.execCommand(cmd)
+            log.message("volume._setMixerVolume %s", log.DEBUG, volume)
+            self.mixer.setPercent(volume)
 
             self.mixer_volume = volume
             
@@ -194,6 +220,10 @@ class Volume:
         if volume < 0:
                 volume = 0
 
+        if self.store is not None:
+                self.store.set("volume", volume)
+                return volume
+
         try:
                 with open(VolumeFile, 'w') as f:
                     f.write(str(volume))
@@ -210,6 +240,10 @@ class Volume:
         if volume < 0:
                 volume = 0
 
+        if self.store is not None:
+                self.store.set("mixer_volume", volume)
+                return volume
+
         try:
                 self.execCommand("echo " + str(volume) + " > " + MixerVolumeFile)
         except:
@@ -273,6 +307,12 @@ class Volume:
     # filename is the name any file in the lib directory
     # default_value is the value to be returned if the file read fails
     def getStoredInteger(self,filename,default_value):
+        key = None if self.store is None else self.store.keyOf(filename)
+        if key is not None:
+            try:
+                return int(self.store.get(key))
+            except ValueError:
+                return int(default_value)
         if os.path.isfile(filename):
             try:
                     value = int(self.execCommand("cat " + filename) )
@@ -289,6 +329,7 @@ class Volume:
         mute_action = self.config.mute_action
 
         self.set(0,store=False)
+        self.ramp.flush()   # Silent before pausing
         if source_type == self.source.RADIO or source_type == self.source.MEDIA:
             try:
                 if mute_action == PAUSE or source_type == self.source.MEDIA:
@@ -340,10 +381,9 @@ class Volume:
         self.mpd_client = mpd_client
         return
 
-    # Execute system command
-    def execCommand(self,cmd):
-        p = os.popen(cmd)
-        return  p.readline().rstrip('\n')
+    # Execute system command (See command_runner_class)
+    def execCommand(self,cmd,wait=True):
+        return runner.execCommand(cmd, wait=wait)
 
 # End of class
 